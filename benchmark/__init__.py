@@ -0,0 +1,15 @@
+""" Micro-benchmarks, run a module with ``python -m benchmark.<name>`` from the repository root. """
+import json
+import sys
+import timeit
+
+
+def measure(func, number, repeat=5):
+    """ Best time of ``repeat`` runs, in seconds per single ``func`` call. """
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def report(results, stream=sys.stdout):
+    """ Prints results (list of dicts) as JSON lines, so runs can be compared with each other. """
+    for result in results:
+        stream.write(json.dumps(result, sort_keys=True) + "\n")
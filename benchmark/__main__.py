@@ -0,0 +1,84 @@
+"""
+Runs benchmark suites and saves the results for comparison between versions.
+
+    python -m benchmark --output before.json
+    python -m benchmark --output after.json --compare before.json
+    python -m benchmark dispatch filters
+"""
+import argparse
+import importlib
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import bot
+
+from . import report
+
+# Micro-benchmarks run by default, ``startup`` and ``e2e`` are left out as they run bots against the mock API.
+SUITES = ("events", "filters", "dispatch", "regexp", "parse_events", "wirelog")
+
+
+def result_key(result):
+    """ Fields identifying a benchmark case, everything except measured (float) values. """
+    return tuple(sorted((k, v) for (k, v) in result.items() if not isinstance(v, float)))
+
+
+def compare(baseline, results, stream=sys.stdout):
+    """ Prints change of every measured value against the baseline results, in percent. """
+    previous = {result_key(r): r for r in baseline}
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        for (name, value) in sorted(result.items()):
+            if isinstance(value, float) and isinstance(old.get(name), float) and old[name]:
+                stream.write("{:>+8.1f}%  {} {}: {:.6g} -> {:.6g}\n".format(
+                    (value - old[name]) * 100 / old[name], " ".join("{}={}".format(k, v) for (k, v) in result_key(result)),
+                    name, old[name], value
+                ))
+
+
+def _commit():
+    try:
+        return subprocess.check_output(("git", "rev-parse", "--short", "HEAD"), stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("suites", nargs="*", default=SUITES, help="benchmark modules to run, default: all")
+    parser.add_argument("--output", help="save results with run metadata to a JSON file")
+    parser.add_argument("--compare", help="JSON file saved by a previous run to compare with")
+    args = parser.parse_args(argv)
+
+    results = []
+    for suite in args.suites:
+        suite_results = importlib.import_module("{}.{}".format(__package__, suite)).run()
+        report(suite_results)
+        results.extend(suite_results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "version": bot.__version__,
+                "commit": _commit(),
+                "python": platform.python_version(),
+                "implementation": platform.python_implementation(),
+                "platform": platform.platform(),
+                "date": datetime.now(timezone.utc).isoformat(),
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        sys.stdout.write("\nCompared with {} ({}):\n".format(args.compare, baseline.get("commit") or baseline["version"]))
+        compare(baseline["results"], results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+""" ``Dispatcher.dispatch`` throughput with a growing number of mixed handlers: ``python -m benchmark.dispatch``. """
+from bot.dispatcher import Dispatcher
+from bot.event import Event, EventType
+from bot.filter import Filter
+from bot.handler import (
+    BotButtonCommandHandler, CommandHandler, DefaultHandler, LeftChatMembersHandler, MessageHandler,
+    NewChatMembersHandler, PinnedMessageHandler
+)
+
+from . import measure, report
+from .payloads import COMMANDS, events
+
+
+def callback(bot, event):
+    pass
+
+
+def handlers(count):
+    """ ``count`` handlers cycling through typical kinds of handlers and filters, plus a default handler. """
+    templates = (
+        lambda i: MessageHandler(filters=Filter.text, callback=callback),
+        lambda i: CommandHandler(command=COMMANDS[i % len(COMMANDS)], callback=callback),
+        lambda i: MessageHandler(filters=Filter.regexp(r"\bword{}\b".format(i)), callback=callback),
+        lambda i: BotButtonCommandHandler(filters=Filter.callback_data("call_back_id_{}".format(i)), callback=callback),
+        lambda i: MessageHandler(filters=Filter.image | Filter.sticker, callback=callback),
+        lambda i: NewChatMembersHandler(callback=callback),
+        lambda i: MessageHandler(filters=Filter.mention() & ~Filter.forward, callback=callback),
+        lambda i: CommandHandler(command="cmd{}".format(i), filters=Filter.sender("user{}".format(i))),
+        lambda i: LeftChatMembersHandler(callback=callback),
+        lambda i: PinnedMessageHandler(callback=callback),
+    )
+    return [templates[i % len(templates)](i) for i in range(count)] + [DefaultHandler(callback=callback)]
+
+
+def run(handler_counts=(1, 10, 100, 1000), event_count=200):
+    results = []
+    batch = [Event(type_=EventType(e["type"]), data=e["payload"]) for e in events(event_count)]
+
+    for count in handler_counts:
+        dispatcher = Dispatcher(bot=None)
+        for handler in handlers(count):
+            dispatcher.add_handler(handler)
+
+        def dispatch_all():
+            for event in batch:
+                dispatcher.dispatch(event)
+
+        seconds = measure(dispatch_all, number=max(1, 100 // count), repeat=3) / len(batch)
+        results.append({
+            "benchmark": "dispatch", "case": "mixed_events", "handlers": count,
+            "us_per_event": seconds * 1e6, "events_per_s": 1 / seconds
+        })
+    return results
+
+
+if __name__ == "__main__":
+    report(run())
@@ -0,0 +1,157 @@
+"""
+Events and sends per second a single ``Bot`` process sustains against the mock API: ``python -m benchmark.e2e``.
+
+The mock API runs in this process and the bot in a child process, so CPU time and memory are the bot's own. Every
+event gets at least one reply, event-to-reply latency is the time from serving the event in 'events/get' to receiving
+its first reply. With unlimited event rate it includes waiting in the event queue, pass ``--rate`` below the
+throughput to measure latency of a bot keeping up.
+"""
+import argparse
+import multiprocessing
+import resource
+import statistics
+from threading import Event, Lock
+from time import perf_counter, process_time, time
+
+from bot.bot import Bot
+from bot.filter import Filter
+from bot.handler import CommandHandler, DefaultHandler, MessageHandler
+from bot.testing import EventSource, FaultProfile, MockBotServer
+
+from . import report
+from .payloads import COMMANDS, command, media_message, new_message
+
+TOKEN = "001.0000000000.0000000000:000000000"
+
+
+def _echo_handlers(reply):
+    return [MessageHandler(filters=Filter.text, callback=reply), DefaultHandler(callback=reply)]
+
+
+def _command_handlers(reply):
+    names = COMMANDS + tuple("command{}".format(i) for i in range(50))
+    return [CommandHandler(command=name, callback=reply) for name in names] + [DefaultHandler(callback=reply)]
+
+
+def _media_handlers(reply):
+    filters = (
+        Filter.image, Filter.video, Filter.audio, Filter.sticker, Filter.mention(), Filter.forward, Filter.reply,
+        Filter.data, Filter.url, Filter.regexp(r"^/(?:start|help)\b"),
+    )
+    return [MessageHandler(filters=f, callback=reply) for f in filters] + [DefaultHandler(callback=reply)]
+
+
+# Handler set and matching events of each scenario.
+SCENARIOS = {
+    "echo": (_echo_handlers, new_message),
+    "commands": (_command_handlers, command),
+    "media": (_media_handlers, media_message),
+}
+
+
+def _run_bot(api_url, scenario, events, dispatch_workers, send_workers, results):
+    """ Child process: polls until every event is replied to, puts timings and resource usage to ``results``. """
+    (lock, replied, done) = (Lock(), set(), Event())
+
+    def reply(bot, event):
+        bot.send_text(chat_id=event.from_chat, text="reply", reply_msg_id=event.data["msgId"])
+        with lock:
+            replied.add(event.data["msgId"])
+            if len(replied) >= events:
+                done.set()
+
+    bot = Bot(
+        token=TOKEN, api_url_base=api_url, name="e2e_bot", poll_time_s=1, dispatch_workers=dispatch_workers,
+        send_workers=send_workers
+    )
+    for handler in SCENARIOS[scenario][0](reply):
+        bot.dispatcher.add_handler(handler)
+
+    (started_at, cpu_started_at) = (perf_counter(), process_time())
+    bot.start_polling()
+    completed = done.wait(120)
+    bot.flush()
+    (elapsed, cpu) = (perf_counter() - started_at, process_time() - cpu_started_at)
+    bot.stop()
+
+    results.put({
+        "completed": completed, "elapsed_s": elapsed, "cpu_s": cpu,
+        # Kilobytes on Linux.
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    })
+
+
+def measure_scenario(scenario, events=2000, rate=float("inf"), dispatch_workers=0, send_workers=0, api_latency=0.0):
+    served_at = {}
+    event_factory = SCENARIOS[scenario][1]
+
+    def factory(rnd):
+        (type_, payload) = event_factory(rnd)
+        served_at[payload["msgId"]] = time()
+        return type_, payload
+
+    profiles = {"*": FaultProfile(latency=api_latency)} if api_latency else None
+    source = EventSource(rate=rate, total=events, factory=factory)
+    with MockBotServer(token=TOKEN, events=source, profiles=profiles, max_calls=events * 2) as server:
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        process = context.Process(
+            target=_run_bot, args=(server.url, scenario, events, dispatch_workers, send_workers, results)
+        )
+        process.start()
+        usage = results.get(timeout=300)
+        process.join()
+
+        replies = server.calls("messages/sendText")
+
+    first_replies = {}
+    for call in replies:
+        first_replies.setdefault(call.params["replyMsgId"], call.received_at)
+    latencies = sorted(received_at - served_at[msg_id] for (msg_id, received_at) in first_replies.items())
+    return {
+        "benchmark": "e2e", "scenario": scenario, "events": events,
+        # Parameters aren't floats, so they are not taken for measured values by 'python -m benchmark --compare'.
+        "rate": "unlimited" if rate == float("inf") else int(rate), "api_latency_ms": int(round(api_latency * 1e3)),
+        "dispatch_workers": dispatch_workers, "send_workers": send_workers, "completed": usage["completed"],
+        "events_per_s": events / usage["elapsed_s"],
+        "sends_per_s": len(replies) / usage["elapsed_s"],
+        "latency_p50_ms": statistics.median(latencies) * 1e3 if latencies else None,
+        "latency_p99_ms": latencies[int(len(latencies) * 0.99)] * 1e3 if latencies else None,
+        "cpu_s": usage["cpu_s"],
+        "cpu_ms_per_event": usage["cpu_s"] * 1e3 / events,
+        "max_rss_mb": usage["max_rss_mb"],
+    }
+
+
+def run(scenarios=tuple(SCENARIOS), events=2000, rate=float("inf"), workers=((0, 0), (4, 4)), api_latency=0.0):
+    """
+    :param workers: Pairs of dispatch and send worker numbers to measure.
+    :param api_latency: Seconds added to every response of the mock API.
+    """
+    return [
+        measure_scenario(s, events, rate, dispatch_workers, send_workers, api_latency)
+        for s in scenarios for (dispatch_workers, send_workers) in workers
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark.e2e", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("scenarios", nargs="*", help="any of {}, default: all".format(", ".join(SCENARIOS)))
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=float("inf"), help="events per second, default: unlimited")
+    parser.add_argument("--dispatch-workers", type=int, default=0)
+    parser.add_argument("--send-workers", type=int, default=0)
+    parser.add_argument("--api-latency", type=float, default=0.0, help="seconds added to every API response")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error("unknown scenarios: {}".format(", ".join(sorted(unknown))))
+
+    report(run(
+        scenarios=args.scenarios or tuple(SCENARIOS), events=args.events, rate=args.rate,
+        workers=((args.dispatch_workers, args.send_workers),), api_latency=args.api_latency
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+""" ``Event`` construction and ``decode_file_id``: ``python -m benchmark.events``. """
+from bot.event import Event, EventType
+from bot.util import decode_file_id
+
+from . import measure, report
+from .payloads import FILE_IDS, GENERATORS, events
+
+
+def run(event_count=200, number=50):
+    results = []
+    for kind in GENERATORS:
+        raw = [(EventType(e["type"]), e["payload"]) for e in events(event_count, kinds=(kind,))]
+        cases = (
+            ("construct", lambda: [Event(type_=t, data=p) for (t, p) in raw]),
+            ("construct_and_read", lambda: [_read(Event(type_=t, data=p)) for (t, p) in raw]),
+        )
+        for (case, func) in cases:
+            seconds = measure(func, number=number)
+            results.append({"benchmark": "events", "kind": kind, "case": case, "us_per_event": seconds * 1e6 / len(raw)})
+
+    for file_id in FILE_IDS:
+        seconds = measure(lambda: decode_file_id(file_id), number=1000)
+        results.append({"benchmark": "decode_file_id", "file_id": file_id, "us_per_call": seconds * 1e6})
+    return results
+
+
+def _read(event):
+    """ Attributes handlers typically look at. """
+    return event.command, event.part_index, event.data.get("text")
+
+
+if __name__ == "__main__":
+    report(run())
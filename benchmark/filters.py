@@ -0,0 +1,57 @@
+""" Evaluation cost of each built-in filter: ``python -m benchmark.filters``. """
+from bot.event import Event, EventType
+from bot.filter import Filter
+
+from . import measure, report
+from .payloads import events
+
+FILTERS = (
+    ("message", Filter.message),
+    ("command", Filter.command),
+    ("file", Filter.file),
+    ("image", Filter.image),
+    ("media", Filter.media),
+    ("data", Filter.data),
+    ("sticker", Filter.sticker),
+    ("url", Filter.url),
+    ("text", Filter.text),
+    ("regexp", Filter.regexp(r"\bhow\b")),
+    ("mention", Filter.mention()),
+    ("mention_user", Filter.mention(user_id="100000000")),
+    ("forward", Filter.forward),
+    ("reply", Filter.reply),
+    ("sender", Filter.sender("100000000")),
+    ("callback_data", Filter.callback_data("call_back_id_1")),
+    ("callback_data_regexp", Filter.callback_data_regexp(r"^call_back_id_\d$")),
+)
+
+
+def run(event_count=200, number=20):
+    """
+    ``warm`` evaluates the filter on events whose lazy attributes are already computed, ``cold`` on new events, so it
+    includes computing them and the event construction.
+    """
+    results = []
+    raw = [(EventType(e["type"]), e["payload"]) for e in events(event_count)]
+    batch = [Event(type_=t, data=p) for (t, p) in raw]
+
+    for (name, filter_) in FILTERS:
+        compiled = filter_.compile()
+        for event in batch:
+            filter_(event)
+
+        cases = (
+            ("warm", lambda: [filter_(e) for e in batch]),
+            ("cold", lambda: [filter_(Event(type_=t, data=p)) for (t, p) in raw]),
+            ("compiled_cold", lambda: [compiled(Event(type_=t, data=p)) for (t, p) in raw]),
+        )
+        for (case, func) in cases:
+            seconds = measure(func, number=number)
+            results.append({
+                "benchmark": "filters", "filter": name, "case": case, "us_per_event": seconds * 1e6 / len(raw)
+            })
+    return results
+
+
+if __name__ == "__main__":
+    report(run())
@@ -0,0 +1,59 @@
+""" Cost of 'events/get' response ingestion per 1000 events: ``python -m benchmark.parse_events``. """
+import json
+
+from requests import Response
+
+from bot.event import Event, EventType, parse_events
+from bot.util import json_loads
+
+from . import measure, report
+from .payloads import events_response
+
+
+def _response(body):
+    response = Response()
+    response.status_code = 200
+    response._content = body
+    response.encoding = "utf-8"
+    return response
+
+
+def legacy_ingest(response):
+    """ Former Bot.events_get + Bot._start_polling: up to six decodes of the same body. """
+    last_event_id = None
+    if 'events' in response.json() and response.json()['events']:
+        last_event_id = max(response.json()['events'], key=lambda e: e['eventId'])['eventId']
+
+    if "description" in response.json() and response.json()["description"] == 'Invalid token':
+        raise ValueError(response.json())
+
+    events = []
+    if "events" in response.json():
+        for event in response.json()["events"]:
+            events.append(Event(type_=EventType(event["type"]), data=event["payload"]))
+
+    return events, last_event_id
+
+
+def run(batch_sizes=(10, 100, 1000)):
+    results = []
+    for size in batch_sizes:
+        body = events_response(size)
+        response = _response(body)
+        cases = (
+            ("legacy", lambda: legacy_ingest(response)),
+            ("single_pass", lambda: parse_events(body)),
+            ("json_loads_only[{}]".format(json_loads.__module__), lambda: json_loads(body)),
+            ("json_loads_only[json]", lambda: json.loads(body)),
+        )
+        for (name, func) in cases:
+            seconds = measure(func, number=max(1, 10000 // size))
+            results.append({
+                "benchmark": "parse_events", "case": name, "batch_size": size,
+                "ms_per_1k_events": seconds * 1000 * 1000 / size
+            })
+    return results
+
+
+if __name__ == "__main__":
+    report(run())
@@ -0,0 +1,92 @@
+""" Synthetic 'events/get' payloads. """
+import json
+import random
+
+CHAT_TYPES = ("private", "group", "channel")
+FILE_IDS = ("0dLYa000aKKIK2dDtkRxLB5c9a27b91ae", "I00007BDi4Sq9dSrLNJeI25c9a2e881ae", "2IWuJzaNWCJZxJWCvZhDYuJ5XDsr7hU")
+COMMANDS = ("start", "help", "test", "feedback", "pin", "unpin", "restart")
+
+
+def _chat(rnd):
+    chat_id = "{}@chat.agent".format(rnd.randint(1, 1000))
+    return {"chatId": chat_id, "type": rnd.choice(CHAT_TYPES), "title": "Chat " + chat_id}
+
+
+def _user(rnd):
+    return {"userId": str(rnd.randint(10 ** 8, 10 ** 9)), "firstName": "Name", "lastName": "Surname"}
+
+
+def new_message(rnd, text=None, parts=None):
+    payload = {
+        "msgId": str(rnd.randint(10 ** 16, 10 ** 17)),
+        "chat": _chat(rnd),
+        "from": _user(rnd),
+        "timestamp": 1546290000,
+        "text": rnd.choice(("Hello!", "How are you?", "1234", "https://mail.ru")) if text is None else text
+    }
+    if parts:
+        payload["parts"] = parts
+    return "newMessage", payload
+
+
+def command(rnd):
+    return new_message(rnd, text="/{} {}".format(rnd.choice(COMMANDS), "args" * rnd.randint(0, 3)))
+
+
+def media_message(rnd):
+    kind = rnd.choice(("file", "sticker", "mention", "forward", "reply"))
+    if kind == "file":
+        part = {"type": "file", "payload": {"fileId": rnd.choice(FILE_IDS), "type": rnd.choice(("image", "video", "audio"))}}
+    elif kind == "sticker":
+        part = {"type": "sticker", "payload": {"fileId": FILE_IDS[2]}}
+    elif kind == "mention":
+        part = {"type": "mention", "payload": _user(rnd)}
+    else:
+        part = {"type": kind, "payload": {"message": {"msgId": "1", "text": "quoted", "from": _user(rnd)}}}
+    return new_message(rnd, parts=[part])
+
+
+def callback_query(rnd):
+    return "callbackQuery", {
+        "queryId": "SVR:{}:{}".format(rnd.randint(10 ** 8, 10 ** 9), rnd.randint(1, 10 ** 6)),
+        "from": _user(rnd),
+        "message": new_message(rnd)[1],
+        "callbackData": "call_back_id_{}".format(rnd.randint(1, 3))
+    }
+
+
+def member_event(rnd):
+    type_ = rnd.choice(("newChatMembers", "leftChatMembers"))
+    key = "newMembers" if type_ == "newChatMembers" else "leftMembers"
+    return type_, {"chat": _chat(rnd), key: [_user(rnd) for _ in range(rnd.randint(1, 3))], "addedBy": _user(rnd)}
+
+
+def pin_event(rnd):
+    return rnd.choice(("pinnedMessage", "unpinnedMessage")), {
+        "chat": _chat(rnd), "msgId": str(rnd.randint(10 ** 16, 10 ** 17)), "from": _user(rnd), "timestamp": 1546290000
+    }
+
+
+GENERATORS = {
+    "message": new_message,
+    "command": command,
+    "media": media_message,
+    "callback": callback_query,
+    "member": member_event,
+    "pin": pin_event,
+}
+
+
+def events(count, kinds=tuple(GENERATORS), seed=0, first_event_id=1):
+    """ List of ``count`` raw events (as in 'events/get' response) of the given kinds. """
+    rnd = random.Random(seed)
+    result = []
+    for event_id in range(first_event_id, first_event_id + count):
+        type_, payload = GENERATORS[rnd.choice(kinds)](rnd)
+        result.append({"eventId": event_id, "type": type_, "payload": payload})
+    return result
+
+
+def events_response(count, **kwargs):
+    """ Encoded 'events/get' response body with ``count`` events. """
+    return json.dumps({"ok": True, "events": events(count, **kwargs)}).encode("utf-8")
@@ -0,0 +1,78 @@
+""" Many regexp filter handlers, one search per pattern vs merged scan: ``python -m benchmark.regexp``. """
+import random
+import re
+
+from bot.dispatcher import Dispatcher
+from bot.event import Event, EventType
+from bot.filter import Filter, PatternSet
+from bot.handler import MessageHandler
+
+from . import measure, report
+from .payloads import new_message
+
+WORDS = ("spam", "casino", "bonus", "crypto", "free", "viagra", "loan", "winner", "click", "offer")
+
+
+def patterns(count, seed=0):
+    rnd = random.Random(seed)
+    result = []
+    for i in range(count):
+        word = "{}{}".format(rnd.choice(WORDS), i)
+        result.append(rnd.choice((
+            r"\b{}\b".format(word), r"^{}".format(word), r"{}\s+\d+".format(word), r"(?:buy|get) {}".format(word)
+        )))
+    return result
+
+
+def texts(count=50, seed=0):
+    rnd = random.Random(seed)
+    return [
+        " ".join(rnd.choice(WORDS + ("hello", "world", "how", "are", "you")) + str(rnd.randint(0, 1000))
+                 for _ in range(rnd.randint(3, 30)))
+        for _ in range(count)
+    ]
+
+
+def _dispatcher(expressions):
+    dispatcher = Dispatcher(bot=None)
+    for expression in expressions:
+        dispatcher.add_handler(MessageHandler(filters=Filter.regexp(expression)))
+    return dispatcher
+
+
+def run(counts=(10, 100, 1000)):
+    results = []
+    samples = texts()
+    rnd = random.Random(0)
+    events = [Event(type_=EventType(t), data=p) for (t, p) in (new_message(rnd, text=text) for text in samples)]
+
+    for count in counts:
+        expressions = patterns(count)
+        compiled = [re.compile(e) for e in expressions]
+        pattern_set = PatternSet(compiled)
+        dispatcher = _dispatcher(expressions)
+
+        def check_every_handler():
+            # What dispatching did before pattern sets: every handler filter searches the text.
+            for event in events:
+                for handler in dispatcher.handlers:
+                    if handler.filters(event):
+                        handler.handle(event, dispatcher)
+
+        cases = (
+            ("separate_search", lambda: [[p.search(t) for p in compiled] for t in samples]),
+            ("pattern_set", lambda: [pattern_set.search(t) for t in samples]),
+            ("check_every_handler", check_every_handler),
+            ("dispatch", lambda: [dispatcher.dispatch(e) for e in events]),
+        )
+        for (name, func) in cases:
+            seconds = measure(func, number=max(1, 200 // count), repeat=3)
+            results.append({
+                "benchmark": "regexp", "case": name, "patterns": count,
+                "us_per_event": seconds * 1e6 / len(samples), "fallback_patterns": len(pattern_set.fallback)
+            })
+    return results
+
+
+if __name__ == "__main__":
+    report(run())
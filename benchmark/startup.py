@@ -0,0 +1,52 @@
+""" Time from ``Bot`` construction to the first dispatched event: ``python -m benchmark.startup``. """
+import random
+import statistics
+from threading import Event
+from time import perf_counter
+
+from bot.bot import Bot
+from bot.handler import MessageHandler
+from bot.testing import FaultProfile, MockBotServer
+
+from . import report
+from .payloads import new_message
+
+TOKEN = "001.0000000000.0000000000:000000000"
+# Simulated API round trip.
+LATENCY_S = 0.05
+
+
+def startup(explicit_identity):
+    """ Seconds from constructing the bot to the first dispatched event. """
+    server = MockBotServer(token=TOKEN, profiles={"*": FaultProfile(latency=LATENCY_S)}).start()
+    server.events.push(*new_message(random.Random(0)))
+    dispatched = Event()
+    started_at = perf_counter()
+
+    bot = Bot(token=TOKEN, api_url_base=server.url, poll_time_s=1)
+    bot.dispatcher.add_handler(MessageHandler(callback=lambda bot, event: dispatched.set()))
+    if explicit_identity:
+        # Same round trip as the former hidden 'self/get' call made before the first request.
+        bot.resolve_identity()
+    bot.start_polling()
+    dispatched.wait(10)
+
+    elapsed = perf_counter() - started_at
+    bot.stop()
+    server.stop()
+    return elapsed
+
+
+def run(repeat=5):
+    results = []
+    for (case, explicit_identity) in (("blocking_identity", True), ("background_identity", False)):
+        times = [startup(explicit_identity) for _ in range(repeat)]
+        results.append({
+            "benchmark": "startup", "case": case, "api_latency_ms": LATENCY_S * 1e3,
+            "first_dispatch_ms": statistics.median(times) * 1e3,
+        })
+    return results
+
+
+if __name__ == "__main__":
+    report(run())
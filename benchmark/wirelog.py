@@ -0,0 +1,94 @@
+""" Adapter throughput with wire logging off, sampled and on: ``python -m benchmark.wirelog``. """
+import logging
+import os
+
+from requests import Request, Response
+from requests.adapters import HTTPAdapter
+
+from bot.bot import LoggingHTTPAdapter
+from bot.wirelog import WireLog
+
+from . import measure, report
+from .payloads import events_response
+
+URL = "https://api.icq.net/bot/v1/events/get?token=001.0000000000.0000000000:000000000&pollTime=60&lastEventId=0"
+
+
+class _Transport(HTTPAdapter):
+    """ Returns the same response without network, so only adapter overhead is measured. """
+    body = b""
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        response = Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers["Content-Type"] = "application/json"
+        response.encoding = "utf-8"
+        response._content = self.body
+        return response
+
+
+class _Adapter(LoggingHTTPAdapter, _Transport):
+    pass
+
+
+class _LegacyAdapter(_Transport):
+    """ Former LoggingHTTPAdapter.send: whole response text at DEBUG. """
+
+    def __init__(self, *args, **kwargs):
+        super(_LegacyAdapter, self).__init__(*args, **kwargs)
+
+        self.log = logging.getLogger("bot.bot")
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug(u"{} {}\n{}".format(
+                request.method, request.url, "\n".join(u"{}: {}".format(k, v) for (k, v) in request.headers.items())
+            ))
+        response = super(_LegacyAdapter, self).send(request, stream, timeout, verify, cert, proxies)
+        if self.log.isEnabledFor(logging.DEBUG):
+            loggable = LoggingHTTPAdapter._is_loggable(response.headers)
+            self.log.debug(u"{} {}\n{}\n\n{}".format(
+                response.status_code, response.reason,
+                "\n".join(u"{}: {}".format(k, v) for (k, v) in response.headers.items()),
+                response.text if loggable else "[binary data]"
+            ))
+        return response
+
+
+def run(events=(1, 1000), number=2000):
+    log = logging.getLogger("bot.bot")
+    handler = logging.StreamHandler(open(os.devnull, "w"))
+    (level, propagate) = (log.level, log.propagate)
+    log.addHandler(handler)
+    log.propagate = False
+
+    request = Request(method="GET", url=URL).prepare()
+    results = []
+    try:
+        for count in events:
+            _Transport.body = events_response(count)
+            cases = (
+                ("off", logging.INFO, _Adapter()),
+                ("legacy_debug", logging.DEBUG, _LegacyAdapter()),
+                ("debug_every_100th", logging.DEBUG, _Adapter(wire_log=WireLog(sample_every=100))),
+                ("debug_1_percent", logging.DEBUG, _Adapter(wire_log=WireLog(sample_rate=0.01))),
+                ("debug_all", logging.DEBUG, _Adapter()),
+            )
+            for (case, case_level, adapter) in cases:
+                log.setLevel(case_level)
+                seconds = measure(lambda: adapter.send(request), number=number)
+                results.append({
+                    "benchmark": "wirelog", "case": case, "response_bytes": len(_Transport.body),
+                    "us_per_request": seconds * 1e6, "requests_per_s": 1 / seconds,
+                })
+    finally:
+        (log.level, log.propagate) = (level, propagate)
+        log.removeHandler(handler)
+        handler.stream.close()
+
+    return results
+
+
+if __name__ == "__main__":
+    report(run())
@@ -0,0 +1,483 @@
+import asyncio
+import inspect
+import logging
+from signal import SIGINT, SIGTERM, SIGABRT
+from time import perf_counter
+
+import requests
+from cached_property import cached_property
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+try:
+    import aiohttp
+    from yarl import URL
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from .bot import Bot, PoolConfig
+from .dedup import SENDING_ENDPOINTS
+from .dispatcher import Dispatcher, StopDispatching, _chat_key
+from .event import parse_events
+from .polling import OverloadPolicy
+from .ratelimit import _retry_after
+from .util import signal_name_by_code, request_endpoint
+
+
+class AsyncHTTPSession(object):
+    """
+    Small subset of :class:`requests.Session` on top of :mod:`aiohttp`.
+
+    ``get`` and ``send`` return awaitables resolving to regular :class:`requests.Response` objects, so every
+    :class:`bot.bot.Bot` method becomes a coroutine when called on :class:`AsyncBot`.
+    """
+
+    def __init__(self, bot, pool=None, client=None):
+        """
+        :param pool: :class:`bot.bot.PoolConfig` of the connector, requests always wait for a free connection.
+        :param client: :class:`aiohttp.ClientSession` shared with other sessions, it's left open by :meth:`close`.
+        """
+        super(AsyncHTTPSession, self).__init__()
+
+        if aiohttp is None:
+            raise ImportError("AsyncBot requires 'aiohttp', install it with 'pip install mailru-im-bot[async]'.")
+
+        self.log = logging.getLogger(__name__)
+
+        self.bot = bot
+        self.pool = pool or PoolConfig()
+        self._session = client
+        self._shared = client is not None
+        self._in_flight = 0
+        self._requests = 0
+
+    def get(self, url, params=None, timeout=None):
+        return self.request(method="GET", url=url, params=params, timeout=timeout)
+
+    def send(self, request, timeout=None):
+        return self.request(
+            method=request.method, url=request.url, data=request.body, headers=dict(request.headers), timeout=timeout
+        )
+
+    async def request(self, method, url, params=None, data=None, headers=None, timeout=None):
+        headers = dict(headers or {})
+        headers["User-Agent"] = self.bot.user_agent
+
+        endpoint = request_endpoint(url)
+        (policy, breaker) = (self.bot.retry_policy, self.bot.circuit_breaker)
+        attempt = 0
+        while True:
+            retry_after = None
+            breaker.before(endpoint)
+            try:
+                response = await self._send(
+                    method=method, url=url, params=params, data=data, headers=headers, timeout=timeout
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                breaker.record(endpoint, success=False)
+                connect_error = isinstance(e, aiohttp.ClientConnectorError)
+                if not policy.should_retry(endpoint, attempt, connect_error=connect_error):
+                    raise
+                self.log.warning("Request '{}' failed: {!r}.".format(endpoint, e))
+            except BaseException:
+                # Cancelled or failed before sending, a trial of an open circuit mustn't keep it open.
+                breaker.release(endpoint)
+                raise
+            else:
+                # Throttled requests weren't processed, they are sent again after the time the server asked for.
+                retry_after = _retry_after(response.headers)
+                failed = response.status_code >= 500
+                breaker.record(endpoint, success=not failed)
+                if not (
+                    (failed or response.status_code == policy.THROTTLED_STATUS) and
+                    policy.should_retry(endpoint, attempt, status_code=response.status_code, retry_after=retry_after)
+                ):
+                    return response
+                self.log.warning("Request '{}' failed with status {}.".format(endpoint, response.status_code))
+
+            await asyncio.sleep(policy.delay(attempt, retry_after))
+            attempt += 1
+
+    async def _send(self, method, url, params=None, data=None, headers=None, timeout=None):
+        limiter = self.bot.rate_limiter
+        key = limiter.request_key(url, params) if limiter is not None else None
+        if key is not None:
+            wait = limiter.reserve(*key)
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+        metrics = self.bot.metrics
+        endpoint = request_endpoint(url)
+        sent = len(data) if isinstance(data, (bytes, str)) else 0
+        started_at = perf_counter()
+        try:
+            response = await self._request(
+                method=method, url=url, params=params, data=data, headers=headers, timeout=timeout
+            )
+        except Exception as e:
+            metrics.observe_request(endpoint, perf_counter() - started_at, error=e, sent=sent)
+            raise
+        metrics.observe_request(
+            endpoint, perf_counter() - started_at, status=response.status_code, sent=sent,
+            received=len(response.content)
+        )
+
+        if key is not None:
+            limiter.update(key[0], key[1], response.status_code, response.headers)
+        if endpoint in SENDING_ENDPOINTS:
+            self.bot._remember_sent(url, params, response)
+
+        return response
+
+    async def _request(self, method, url, params=None, data=None, headers=None, timeout=None):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self.pool.size, force_close=not self.pool.keep_alive)
+            )
+
+        # Same as requests: parameters with None value are not sent.
+        params = {k: v for (k, v) in (params or {}).items() if v is not None}
+
+        wire_log = self.bot.wire_log
+        logged = self.log.isEnabledFor(logging.DEBUG) and wire_log.sampled(url)
+        if logged:
+            self.log.debug(u"{method} {url}{body}".format(
+                method=method, url=wire_log.text(str(URL(url).update_query(params))),
+                body="\n\n" + wire_log.body(data) if isinstance(data, (bytes, str)) else ""
+            ))
+
+        (self._in_flight, self._requests) = (self._in_flight + 1, self._requests + 1)
+        try:
+            async with self._session.request(
+                method=method, url=url, params=params, data=data, headers=headers,
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as r:
+                response = requests.Response()
+                response.status_code = r.status
+                response.reason = r.reason
+                response.headers = CaseInsensitiveDict(r.headers)
+                response.encoding = get_encoding_from_headers(response.headers)
+                response.url = str(r.url)
+                response._content = await r.read()
+        finally:
+            self._in_flight -= 1
+
+        if logged:
+            self.log.debug(u"{status_code} {reason}{body}".format(
+                status_code=response.status_code, reason=response.reason,
+                body="\n\n" + wire_log.body(response.content, response.encoding) if response.content else ""
+            ))
+
+        return response
+
+    def stats(self):
+        """
+        Pool size and requests counted by the session: ``in_flight`` includes requests waiting for a free connection.
+        Unlike :class:`bot.bot.Bot` idle connections aren't reported, aiohttp doesn't expose them.
+        """
+        return {"size": self.pool.size, "in_flight": self._in_flight, "requests": self._requests}
+
+    async def close(self):
+        if self._session is not None and not self._shared:
+            await self._session.close()
+            self._session = None
+
+
+class AsyncDispatcher(Dispatcher):
+    """ Dispatcher for :class:`AsyncBot`, awaits callbacks declared with ``async def``. """
+
+    def __init__(self, bot, workers=0, max_queue_size=0):
+        """
+        :param workers: Maximum number of events dispatched concurrently, ``0`` means no limit.
+        :param max_queue_size: Unused, tasks are queued by the event loop.
+        """
+        super(AsyncDispatcher, self).__init__(bot)
+
+        self.workers = workers
+        self._tails = {}
+        self._tasks = set()
+        # Tasks of events waiting for their turn -> events, in submission order.
+        self._waiting = {}
+        self._semaphore = asyncio.Semaphore(workers) if workers else None
+        self._busy = 0
+
+    async def dispatch(self, event):
+        # noinspection PyBroadException
+        try:
+            self.log.debug("Dispatching event '{}'.".format(event))
+            event.memo = self._new_memo()
+            try:
+                for handler in self.route(event):
+                    if self.check(handler, event):
+                        await self._handle(handler, event)
+            except StopDispatching as e:
+                self.log.debug("Caught '{}' exception, stopping dispatching.".format(StopDispatching.__name__))
+                await _resolve(e.result)
+        except Exception:
+            self.log.exception("Exception while dispatching event!")
+
+    async def _handle(self, handler, event):
+        profiler = self.profiler
+        if profiler is None:
+            return await self._measure(handler, event)
+        with profiler.timing("handle", handler):
+            return await self._measure(handler, event)
+
+    async def _measure(self, handler, event):
+        metrics = self.metrics
+        if metrics is None:
+            return await _resolve(handler.handle(event=event, dispatcher=self))
+
+        started_at = perf_counter()
+        try:
+            await _resolve(handler.handle(event=event, dispatcher=self))
+        except StopDispatching:
+            metrics.observe_handler(handler, perf_counter() - started_at)
+            raise
+        except Exception:
+            metrics.observe_handler(handler, perf_counter() - started_at, failed=True)
+            raise
+        metrics.observe_handler(handler, perf_counter() - started_at)
+
+    def submit(self, event):
+        """ Schedules dispatching as a task, events of the same chat are dispatched one after another. """
+        key = _chat_key(event)
+        task = asyncio.ensure_future(self._dispatch_after(self._tails.get(key), event))
+        self._tails[key] = task
+        self._tasks.add(task)
+        self._waiting[task] = event
+        task.add_done_callback(self._forget)
+        task.add_done_callback(lambda t: self._tails.pop(key) if self._tails.get(key) is t else None)
+        return task
+
+    @property
+    def pending(self):
+        """ Number of submitted events not dispatched yet, including ones being dispatched. """
+        return len(self._tasks)
+
+    def drop_waiting(self, event_types=None):
+        """
+        Cancels dispatching of the oldest submitted event still waiting for its turn.
+
+        :param event_types: Only events of these types may be dropped, ``None`` means any.
+        :return: The dropped event or ``None`` if there's no such.
+        """
+        task = next((t for (t, e) in self._waiting.items() if event_types is None or e.type in event_types), None)
+        if task is None:
+            return None
+
+        event = self._waiting[task]
+        self._forget(task)
+        task.cancel()
+        return event
+
+    async def wait_dispatched(self):
+        """ Waits until any submitted event is dispatched. """
+        if self._tasks:
+            await asyncio.wait(tuple(self._tasks), return_when=asyncio.FIRST_COMPLETED)
+
+    def _forget(self, task):
+        self._tasks.discard(task)
+        self._waiting.pop(task, None)
+
+    async def join(self):
+        """ Waits for submitted events to be dispatched, returns immediately when called from a handler. """
+        if self._tasks and asyncio.current_task() not in self._tasks:
+            await asyncio.wait(tuple(self._tasks))
+
+    async def _dispatch_after(self, previous, event):
+        if previous is not None:
+            await asyncio.wait((previous,))
+
+        if self._semaphore is not None:
+            await self._semaphore.acquire()
+
+        self._waiting.pop(asyncio.current_task(), None)
+        self._busy += 1
+        try:
+            await self.dispatch(event)
+        finally:
+            self._busy -= 1
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    def stats(self):
+        return {"workers": self.workers, "queue_depth": len(self._waiting), "busy_workers": self._busy}
+
+
+async def _resolve(result):
+    if inspect.isawaitable(result):
+        await result
+
+
+class AsyncBot(Bot):
+    """
+    Asyncio version of :class:`bot.bot.Bot`.
+
+    Every API method has the same signature as in :class:`bot.bot.Bot` and returns a coroutine resolving to
+    :class:`requests.Response`. Handlers may be declared with ``async def`` and await bot calls, polling runs as a
+    task in the current event loop and events of different chats are dispatched concurrently.
+
+    Fetched events are dispatched by tasks, ``event_queue_size`` bounds the number of events submitted but not
+    dispatched yet. When it's reached ``overload_policy`` applies to events still waiting for their turn, polling waits
+    for a dispatched event if there's none to drop.
+    """
+    dispatcher_class = AsyncDispatcher
+
+    def __init__(self, *args, **kwargs):
+        if kwargs.get("send_workers"):
+            raise ValueError("AsyncBot methods don't block already, 'send_workers' is not supported.")
+
+        super(AsyncBot, self).__init__(*args, **kwargs)
+
+        self.__polling_task = None
+        self.__identity_task = None
+        self.__stopped = None
+        self._dropped = {}
+
+    @cached_property
+    def http_session(self):
+        return AsyncHTTPSession(bot=self, pool=self.send_pool)
+
+    @cached_property
+    def polling_session(self):
+        return AsyncHTTPSession(bot=self, pool=self.polling_pool)
+
+    @cached_property
+    def upload_session(self):
+        return AsyncHTTPSession(bot=self, pool=self.upload_pool)
+
+    def pool_stats(self):
+        return {
+            name: self.__dict__[name].stats()
+            for name in ("polling_session", "http_session", "upload_session") if name in self.__dict__
+        }
+
+    async def close_sessions(self):
+        for name in ("polling_session", "http_session", "upload_session"):
+            if name in self.__dict__:
+                await self.__dict__[name].close()
+
+    async def resolve_identity(self):
+        if self._user_agent is None and self.name is None:
+            response = await self.self_get()
+            self._user_agent = self._format_user_agent(name=response.json().get("nick"))
+
+        return self.user_agent
+
+    async def _resolve_identity_in_background(self):
+        # noinspection PyBroadException
+        try:
+            await self.resolve_identity()
+        except Exception as e:
+            self.log.warning("Can't resolve bot nick, using '{}' in User-Agent: {}".format(self.FALLBACK_NAME, e))
+
+    async def _start_polling(self):
+        while self.running:
+            # Exceptions should not stop polling task.
+            # noinspection PyBroadException
+            try:
+                with self._polled(await self.fetch_events()) as events:
+                    for event in events:
+                        await self._submit(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await asyncio.sleep(self._polling_failed(e))
+
+    async def _submit(self, event):
+        """ Submits the event for dispatch applying the overload policy while the dispatcher has too many events. """
+        (dispatcher, options) = (self.dispatcher, self.event_queue_options)
+        while options["maxsize"] and dispatcher.pending >= options["maxsize"]:
+            (policy, shed_types) = (OverloadPolicy(options["policy"]), frozenset(options["shed_types"] or ()))
+            dropped = None
+            if policy is OverloadPolicy.DROP_OLDEST:
+                dropped = dispatcher.drop_waiting()
+            elif policy is OverloadPolicy.SHED:
+                dropped = dispatcher.drop_waiting(shed_types)
+                if dropped is None and event.type in shed_types:
+                    self._drop(event)
+                    return
+
+            if dropped is None:
+                await dispatcher.wait_dispatched()
+            else:
+                self._drop(dropped)
+
+        self._checkpoint_on_dispatch(event, dispatcher.submit(event))
+
+    def _drop(self, event):
+        self._dropped[event.type] = self._dropped.get(event.type, 0) + 1
+        self.log.warning("Too many events waiting for dispatch, dropping event '{}'.".format(event))
+        self._checkpoint_done(event)
+
+    def stats(self):
+        stats = super(AsyncBot, self).stats()
+        stats["event_queue"] = {
+            "queue_depth": self.dispatcher.pending,
+            "capacity": self.event_queue_options["maxsize"],
+            "policy": OverloadPolicy(self.event_queue_options["policy"]).value,
+            "dropped": sum(self._dropped.values()),
+            "dropped_by_type": {t.value: n for (t, n) in self._dropped.items()},
+        }
+        return stats
+
+    async def start_polling(self):
+        if not self.running:
+            self.log.info("Starting polling.")
+
+            self.running = True
+            self.__stopped = asyncio.Event()
+
+            if self.checkpointer is not None:
+                self._resume_from_checkpoint()
+            self.deduplicator.load()
+
+            self.__polling_task = asyncio.ensure_future(self._start_polling())
+            if self._user_agent is None and self.name is None:
+                self.__identity_task = asyncio.ensure_future(self._resolve_identity_in_background())
+
+    async def stop(self):
+        if self.running:
+            self.log.info("Stopping bot.")
+
+            self.running = False
+
+            tasks = tuple(t for t in (self.__polling_task, self.__identity_task) if t is not None)
+            for task in tasks:
+                task.cancel()
+            await asyncio.wait(tasks)
+            await self.dispatcher.join()
+            if self.checkpointer is not None:
+                self.checkpointer.commit()
+            self.deduplicator.save()
+            await self.close_sessions()
+
+            self.__stopped.set()
+
+    # noinspection PyUnusedLocal
+    def _signal_handler(self, sig: int):
+        if self.running:
+            self.log.debug("Stopping bot by signal '{name} ({code})'.".format(name=signal_name_by_code(sig), code=sig))
+            asyncio.ensure_future(self.stop())
+
+    async def idle(self):
+        loop = asyncio.get_event_loop()
+        for sig in (SIGINT, SIGTERM, SIGABRT):
+            try:
+                loop.add_signal_handler(sig, self._signal_handler, sig)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        if self.running:
+            await self.__stopped.wait()
+
+    async def events_get(self, poll_time_s: int = None, last_event_id: int = None):
+        response = await self._events_get(poll_time_s=poll_time_s, last_event_id=last_event_id)
+        self._update_last_event_id(parse_events(response.content))
+
+        return response
+
+    async def fetch_events(self, poll_time_s: int = None, last_event_id: int = None):
+        response = await self._events_get(poll_time_s=poll_time_s, last_event_id=last_event_id)
+        return self._update_last_event_id(parse_events(response.content))
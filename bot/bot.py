@@ -1,31 +1,44 @@
-import cgi
 import logging
 import sys
 import re
 from signal import signal, SIGINT, SIGTERM, SIGABRT
-from threading import Thread, Lock
-from time import sleep
+from threading import Thread, Lock, Event
+from time import sleep, perf_counter
 import types
 import json
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import wraps
 
 import requests
+import six
 from cached_property import cached_property
-from expiringdict import ExpiringDict
 from requests import Request
 from requests.adapters import HTTPAdapter
+from six.moves.urllib.parse import urlsplit, parse_qs
+from urllib3 import PoolManager
+from urllib3.exceptions import NewConnectionError
 
 from . import __version__ as version
+from .checkpoint import Checkpointer
+from .dedup import SENDING_ENDPOINTS, Deduplicator
 from .dispatcher import Dispatcher
-from .event import Event
-from .handler import EventType, DefaultHandler, \
+from .event import parse_events
+from .metrics import BotMetrics
+from .polling import EventQueue, OverloadPolicy
+from .ratelimit import RateLimiter, _retry_after
+from .retry import Backoff, CircuitBreaker, RetryPolicy
+from .handler import HandlerBase, DefaultHandler, \
     NewChatMembersHandler, LeftChatMembersHandler, \
     PinnedMessageHandler, MessageHandler, \
     EditedMessageHandler, DeletedMessageHandler, \
     CommandHandler, HelpCommandHandler, \
     StartCommandHandler, UnknownCommandHandler, \
     BotButtonCommandHandler, UnPinnedMessageHandler, \
-    Filter, StopDispatching
-from .util import signal_name_by_code
+    StopDispatching
+from .util import signal_name_by_code, request_endpoint, json_loads
+from .wirelog import WireLog
+from .worker import WorkerPool
 from .myteam import add_chat_members, create_chat
 from .types import InlineKeyboardMarkup, Format
 from .constant import ParseMode
@@ -49,9 +62,84 @@ def format_to_json(format_):
         return format_
 
 
+PoolConfig = namedtuple("PoolConfig", ("size", "block", "keep_alive"))
+PoolConfig.__new__.__defaults__ = (10, False, True)
+PoolConfig.__doc__ = """
+HTTP connection pool of a session: maximum number of kept connections per host, whether requests wait for a free
+connection when all of them are busy (otherwise an extra connection is opened and closed after the request) and
+whether connections are reused.
+"""
+
+
+def outbound(key_argument):
+    """
+    Marks a method sending something to a chat: when the bot has a sender pool, the call is queued there and
+    :class:`concurrent.futures.Future` of the response is returned instead. Calls with the same ``key_argument`` value
+    are sent in call order.
+    """
+    def decorate(method):
+        position = method.__code__.co_varnames.index(key_argument) - 1
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.sender is None:
+                return method(self, *args, **kwargs)
+
+            key = args[position] if position < len(args) else kwargs.get(key_argument)
+            return self.sender.submit(key, method, self, *args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
 class Bot(object):
+    dispatcher_class = Dispatcher
+
+    # Name in User-Agent until the bot nick is resolved.
+    FALLBACK_NAME = "bot"
+
     def __init__(self, token: str, api_url_base: str = None, name: str = None, version: str = None,
-                 timeout_s: int = 20, poll_time_s: int = 60, is_myteam: bool = False):
+                 timeout_s: int = 20, poll_time_s: int = 60, is_myteam: bool = False, dispatch_workers: int = 0,
+                 event_queue_size: int = 1000, overload_policy: OverloadPolicy = OverloadPolicy.BLOCK,
+                 shed_event_types=(), rate_limiter: RateLimiter = None, send_workers: int = 0,
+                 retry_policy: RetryPolicy = None, circuit_breaker: CircuitBreaker = None,
+                 polling_pool: PoolConfig = PoolConfig(size=1), send_pool: PoolConfig = None,
+                 upload_pool: PoolConfig = PoolConfig(size=4), wire_log: WireLog = None,
+                 metrics: BotMetrics = None, pool_manager: PoolManager = None, checkpointer: Checkpointer = None,
+                 deduplicator: Deduplicator = None):
+        """
+        :param dispatch_workers: Number of threads running handlers, see :class:`bot.dispatcher.Dispatcher`.
+        :param event_queue_size: Maximum number of fetched events waiting for dispatch, ``0`` means unbounded. Each
+            dispatch worker queues as many events at most, then events wait in the bounded queue.
+        :param overload_policy: What to do with fetched events when the queue is full, see
+            :class:`bot.polling.OverloadPolicy`.
+        :param shed_event_types: :class:`bot.event.EventType` values which may be dropped with
+            :attr:`bot.polling.OverloadPolicy.SHED`.
+        :param rate_limiter: :class:`bot.ratelimit.RateLimiter` delaying requests over the limits, ``None`` to send
+            requests immediately.
+        :param send_workers: Number of threads sending messages. With ``0`` sending methods block until response, with
+            more they queue the request and return :class:`concurrent.futures.Future` of the response at once, requests
+            to the same chat are sent in call order. Call :meth:`flush` to wait for queued requests.
+        :param retry_policy: :class:`bot.retry.RetryPolicy` of failed requests, ``RetryPolicy(retries=0)`` disables
+            retries.
+        :param circuit_breaker: :class:`bot.retry.CircuitBreaker` failing requests to degraded endpoints fast,
+            ``CircuitBreaker(failure_threshold=float("inf"))`` disables it.
+        :param polling_pool: :class:`PoolConfig` of :attr:`polling_session` used by 'events/get'.
+        :param send_pool: :class:`PoolConfig` of :attr:`http_session` used by all other methods, by default its size
+            is enough for every dispatch and send worker.
+        :param upload_pool: :class:`PoolConfig` of :attr:`upload_session` used to upload files.
+        :param wire_log: :class:`bot.wirelog.WireLog` settings of DEBUG logging of requests and responses: sampling,
+            logged methods, body size cap and token redaction.
+        :param metrics: :class:`bot.metrics.BotMetrics` collecting API, handler and polling metrics, serve them with
+            ``bot.metrics.serve(port)``.
+        :param pool_manager: :class:`urllib3.PoolManager` holding connections of all sessions, shared with other bots
+            (see :class:`bot.pool.BotPool`). Sizes of its pools replace the ones of ``PoolConfig`` parameters.
+        :param checkpointer: :class:`bot.checkpoint.Checkpointer` saving ``last_event_id`` of dispatched events, polling
+            resumes from the saved one after a restart instead of fetching events again.
+        :param deduplicator: :class:`bot.dedup.Deduplicator` skipping events delivered more than once and messages sent
+            by the bot, ``Deduplicator(capacity=0)`` disables it.
+        """
         super(Bot, self).__init__()
 
         self.log = logging.getLogger(__name__)
@@ -64,33 +152,94 @@ class Bot(object):
         self.poll_time_s = poll_time_s
         self.last_event_id = 0
         self.is_myteam = is_myteam
-
-        self.dispatcher = Dispatcher(self)
+        self.rate_limiter = rate_limiter
+        self.sender = WorkerPool(workers=send_workers, name="sender") if send_workers else None
+        self.retry_policy = RetryPolicy() if retry_policy is None else retry_policy
+        self.circuit_breaker = CircuitBreaker() if circuit_breaker is None else circuit_breaker
+        self.polling_pool = polling_pool
+        self.send_pool = PoolConfig(size=max(10, dispatch_workers + send_workers)) if send_pool is None else send_pool
+        self.upload_pool = upload_pool
+        self.wire_log = wire_log or WireLog()
+        self.pool_manager = pool_manager
+        self.checkpointer = checkpointer
+        self.deduplicator = Deduplicator() if deduplicator is None else deduplicator
+        # Delay before polling again after consecutive failures.
+        self.polling_backoff = Backoff(base=0.5, cap=30.0)
+        self._polling_failures = 0
+
+        self.metrics = BotMetrics() if metrics is None else metrics
+        self.dispatcher = self.dispatcher_class(self, workers=dispatch_workers, max_queue_size=event_queue_size)
+        self.event_queue_options = dict(maxsize=event_queue_size, policy=overload_policy, shed_types=shed_event_types)
+        self.event_queue = None
         self.running = False
 
         self._uin = token.split(":")[-1]
+        self._user_agent = None
 
         self.__lock = Lock()
+        self.__stopping = Event()
         self.__polling_thread = None
-        self.__sent_im_cache = ExpiringDict(max_len=2 ** 10, max_age_seconds=60)
-        self.dispatcher.add_handler(SkipDuplicateMessageHandler(self.__sent_im_cache))
+        self.__dispatching_thread = None
+        self.dispatcher.add_handler(SkipDuplicateMessageHandler(self.deduplicator))
+
+        self._register_gauges()
 
         if self.is_myteam:
             self.add_chat_members = types.MethodType(add_chat_members, self)
             self.create_chat = types.MethodType(create_chat, self)
 
+    def _register_gauges(self):
+        metrics = self.metrics
+        metrics.gauge(
+            "bot_event_queue_depth", "Fetched events waiting for dispatch.",
+            lambda: len(self.event_queue) if self.event_queue is not None else 0
+        )
+        metrics.gauge("bot_dispatcher_queue_depth", "Events waiting for a dispatch worker.",
+                      lambda: self.dispatcher.stats().get("queue_depth"))
+        metrics.gauge("bot_dispatcher_busy_workers", "Dispatch workers running handlers.",
+                      lambda: self.dispatcher.stats().get("busy_workers"))
+        metrics.gauge("bot_sender_queue_depth", "Requests waiting for a send worker.",
+                      lambda: self.sender.stats()["queue_depth"] if self.sender is not None else None)
+        metrics.gauge("bot_rate_limiter_waiting", "Requests waiting for the rate limiter.",
+                      lambda: self.rate_limiter.stats()["waiting"] if self.rate_limiter is not None else None)
+
     @property
     def uin(self):
         return self._uin
 
-    @cached_property
+    @property
     def user_agent(self):
-
+        """
+        User-Agent header value. Without ``name`` the bot nick is used once :meth:`resolve_identity` requested it, a
+        placeholder name is used until then: the API is never called from here.
+        """
+        if self._user_agent is None:
+            if self.name is None:
+                return self._format_user_agent(name=self.FALLBACK_NAME)
+            self._user_agent = self._format_user_agent(name=self.name)
+
+        return self._user_agent
+
+    def resolve_identity(self):
+        """
+        Requests the bot nick with 'self/get' for :attr:`user_agent` unless ``name`` was given. Polling does it in the
+        background at start, call it explicitly to have the nick in the first request.
+        """
+        if self._user_agent is None and self.name is None:
+            self._user_agent = self._format_user_agent(name=self.self_get().json().get("nick"))
+
+        return self.user_agent
+
+    def _resolve_identity_in_background(self):
+        # noinspection PyBroadException
+        try:
+            self.resolve_identity()
+        except Exception as e:
+            self.log.warning("Can't resolve bot nick, using '{}' in User-Agent: {}".format(self.FALLBACK_NAME, e))
+
+    def _format_user_agent(self, name):
         return "{name}/{version} (uin={uin}) bot-python/{library_version}".format(
-            name=self.name if self.name is not None else requests.get(url="{}/self/get".format(self.api_base_url),
-                                                                      params={"token": self.token}
-                                                                      ).json().get('nick'),
-            # name=self.name,
+            name=name,
             version=self.version if self.version is not None else 'base',
             uin="" if self.uin is None else self.uin,
             library_version=version
@@ -98,33 +247,127 @@ class Bot(object):
 
     @cached_property
     def http_session(self):
+        return self._create_session(self.send_pool)
+
+    @cached_property
+    def polling_session(self):
+        """ Session used by 'events/get', so the long poll connection is never taken by other requests. """
+        return self._create_session(self.polling_pool)
+
+    @cached_property
+    def upload_session(self):
+        """ Session used to upload files, so slow uploads don't hold connections needed for messages. """
+        return self._create_session(self.upload_pool)
+
+    def _create_session(self, pool):
         session = requests.Session()
+        if not pool.keep_alive:
+            session.headers["Connection"] = "close"
 
         for scheme in ("http://", "https://"):
-            session.mount(scheme, BotLoggingHTTPAdapter(bot=self))
+            adapter = BotLoggingHTTPAdapter(
+                bot=self, pool_maxsize=pool.size, pool_block=pool.block, wire_log=self.wire_log
+            )
+            if self.pool_manager is not None:
+                adapter.poolmanager = self.pool_manager
+            session.mount(scheme, adapter)
 
         return session
 
+    def pool_stats(self):
+        """ Connection pool usage of each session which has been used. """
+        return {
+            name: _session_pool_stats(self.__dict__[name])
+            for name in ("polling_session", "http_session", "upload_session") if name in self.__dict__
+        }
+
     def _start_polling(self):
         while self.running:
             # Exceptions should not stop polling thread.
             # noinspection PyBroadException
             try:
-                response = self.events_get()
-
-                if response:
-                    if "description" in response.json() and response.json()["description"] == 'Invalid token':
-                        raise InvalidToken(response.json())
-
-                if "events" in response.json():
-                    for event in response.json()["events"]:
-                        self.dispatcher.dispatch(Event(type_=EventType(event["type"]), data=event["payload"]))
-
-            except InvalidToken as e:
-                self.log.exception("InvalidToken: {e}".format(e=e))
-                sleep(5)
+                with self._polled(self.fetch_events()) as events:
+                    for event in events:
+                        self.event_queue.put(event)
             except Exception as e:
-                self.log.exception("Exception while polling: {e}".format(e=e))
+                self.__stopping.wait(self._polling_failed(e))
+
+    @contextmanager
+    def _polled(self, batch):
+        """
+        Checks and records a fetched batch around submitting its events, shared by all polling loops.
+
+        :raise InvalidToken: The API rejected the token.
+        """
+        if batch.data.get("description") == 'Invalid token':
+            raise InvalidToken(batch.data)
+
+        self._polling_failures = 0
+        self.metrics.observe_batch(len(batch.events))
+        if self.checkpointer is not None:
+            self.checkpointer.fetched(batch)
+        yield batch.events
+        if self.checkpointer is not None:
+            self.checkpointer.maybe_commit()
+
+    def _polling_failed(self, error):
+        """ Logs the error of polling, returns seconds to wait before polling again. """
+        if isinstance(error, InvalidToken):
+            self.log.exception("InvalidToken: {e}".format(e=error))
+            return 5
+
+        self.log.exception("Exception while polling: {e}".format(e=error))
+        self.metrics.polling_errors.inc()
+        # Don't hammer the API (and CPU) while it's failing.
+        delay = self.polling_backoff.delay(self._polling_failures)
+        self._polling_failures += 1
+        return delay
+
+    def _start_dispatching(self, event_queue):
+        while True:
+            event = event_queue.get()
+            if event is None:
+                return
+
+            # Exceptions should not stop dispatching thread.
+            # noinspection PyBroadException
+            try:
+                future = self.dispatcher.submit(event)
+            except Exception as e:
+                self.log.exception("Exception while dispatching: {e}".format(e=e))
+                self._checkpoint_done(event)
+            else:
+                self._checkpoint_on_dispatch(event, future)
+
+    def _checkpoint_done(self, event):
+        if self.checkpointer is not None:
+            self.checkpointer.done(event.event_id)
+
+    def _checkpoint_on_dispatch(self, event, future):
+        # Cancelled events weren't dispatched, they are fetched again after a restart.
+        if self.checkpointer is not None:
+            future.add_done_callback(lambda f: f.cancelled() or self.checkpointer.done(event.event_id))
+
+    def _remember_sent(self, url, params, response):
+        """ Passes a text message sent by the bot to the deduplicator, the API may deliver it back as an event. """
+        if response.status_code != 200:
+            return
+
+        # noinspection PyBroadException
+        try:
+            msg_id = json_loads(response.content).get("msgId")
+        except Exception:
+            return
+        if params is None:
+            params = {k: v[0] for (k, v) in parse_qs(urlsplit(url).query).items()}
+        if msg_id is not None and params.get("chatId") is not None:
+            self.deduplicator.sent(params["chatId"], msg_id, params.get("text"))
+
+    def _resume_from_checkpoint(self):
+        saved = self.checkpointer.resume(self.uin)
+        if saved is not None and saved > self.last_event_id:
+            self.log.info("Resuming polling from checkpoint, last event id {}.".format(saved))
+            self.last_event_id = saved
 
     def start_polling(self):
         with self.__lock:
@@ -132,18 +375,57 @@ class Bot(object):
                 self.log.info("Starting polling.")
 
                 self.running = True
+                self.__stopping.clear()
+
+                if self.checkpointer is not None:
+                    self._resume_from_checkpoint()
+                self.deduplicator.load()
+
+                self.event_queue = EventQueue(on_drop=self._checkpoint_done, **self.event_queue_options)
+                self.__dispatching_thread = Thread(target=self._start_dispatching, args=(self.event_queue,))
+                self.__dispatching_thread.start()
 
                 self.__polling_thread = Thread(target=self._start_polling)
                 self.__polling_thread.start()
 
+                if self._user_agent is None and self.name is None:
+                    Thread(target=self._resolve_identity_in_background, daemon=True).start()
+
     def stop(self):
         with self.__lock:
             if self.running:
                 self.log.info("Stopping bot.")
 
                 self.running = False
+                self.__stopping.set()
 
                 self.__polling_thread.join()
+                self.event_queue.close()
+                self.__dispatching_thread.join()
+                self.dispatcher.stop()
+                if self.checkpointer is not None:
+                    self.checkpointer.commit()
+                self.deduplicator.save()
+
+        if self.sender is not None:
+            self.sender.stop()
+
+    def flush(self):
+        """ Waits until every queued request of the sender pool is sent. """
+        if self.sender is not None:
+            self.sender.join()
+
+    def stats(self):
+        """ Event queue and dispatcher statistics: queue depth, fetch-to-dispatch latency, worker utilization. """
+        return {
+            "event_queue": self.event_queue.stats() if self.event_queue is not None else None,
+            "dispatcher": self.dispatcher.stats(),
+            "rate_limiter": self.rate_limiter.stats() if self.rate_limiter is not None else None,
+            "sender": self.sender.stats() if self.sender is not None else None,
+            "circuit_breaker": self.circuit_breaker.stats(),
+            "deduplicator": self.deduplicator.stats(),
+            "pools": self.pool_stats(),
+        }
 
     # noinspection PyUnusedLocal
     def _signal_handler(self, sig: int):
@@ -166,10 +448,22 @@ class Bot(object):
             sleep(1)
 
     def events_get(self, poll_time_s: int = None, last_event_id: int = None):
+        response = self._events_get(poll_time_s=poll_time_s, last_event_id=last_event_id)
+        self._update_last_event_id(parse_events(response.content))
+
+        return response
+
+    def fetch_events(self, poll_time_s: int = None, last_event_id: int = None):
+        """ Same as :meth:`events_get`, but returns :class:`bot.event.EventBatch` decoded in a single pass. """
+        return self._update_last_event_id(
+            parse_events(self._events_get(poll_time_s=poll_time_s, last_event_id=last_event_id).content)
+        )
+
+    def _events_get(self, poll_time_s=None, last_event_id=None):
         poll_time_s = self.poll_time_s if poll_time_s is None else poll_time_s
         last_event_id = self.last_event_id if last_event_id is None else last_event_id
 
-        response = self.http_session.get(
+        return self.polling_session.get(
             url="{}/events/get".format(self.api_base_url),
             params={
                 "token": self.token,
@@ -179,10 +473,11 @@ class Bot(object):
             timeout=poll_time_s + self.timeout_s
         )
 
-        if 'events' in response.json() and response.json()['events']:
-            self.last_event_id = max(response.json()['events'], key=lambda e: e['eventId'])['eventId']
+    def _update_last_event_id(self, batch):
+        if batch.last_event_id is not None:
+            self.last_event_id = batch.last_event_id
 
-        return response
+        return batch
 
     def self_get(self):
         return self.http_session.get(
@@ -249,9 +544,11 @@ class Bot(object):
 
         return decorate
 
-    def command_handler(self, command=None, filters=None):
+    def command_handler(self, command=None, filters=None, aliases=None):
         def decorate(handler):
-            self.dispatcher.add_handler(handler=CommandHandler(callback=handler, command=command, filters=filters))
+            self.dispatcher.add_handler(
+                handler=CommandHandler(callback=handler, command=command, filters=filters, aliases=aliases)
+            )
             return handler
 
         return decorate
@@ -284,6 +581,7 @@ class Bot(object):
 
         return decorate
 
+    @outbound("chat_id")
     def send_text(self, chat_id: str, text: str, reply_msg_id=None, forward_chat_id=None, forward_msg_id=None,
                   inline_keyboard_markup=None, parse_mode=None, format_=None):
         if parse_mode and format_:
@@ -306,6 +604,7 @@ class Bot(object):
             timeout=self.timeout_s
         )
 
+    @outbound("chat_id")
     def send_file(self, chat_id, file_id=None, file=None, caption=None, reply_msg_id=None, forward_chat_id=None,
                   forward_msg_id=None, inline_keyboard_markup=None, parse_mode=None, format_=None):
         if parse_mode and format_:
@@ -332,8 +631,10 @@ class Bot(object):
             request.method = "POST"
             request.files = {"file": file}
 
-        return self.http_session.send(request.prepare(), timeout=self.timeout_s)
+        session = self.upload_session if file else self.http_session
+        return session.send(request.prepare(), timeout=self.timeout_s)
 
+    @outbound("chat_id")
     def send_voice(self, chat_id, file_id=None, file=None, reply_msg_id=None, forward_chat_id=None,
                    forward_msg_id=None, inline_keyboard_markup=None):
         request = Request(
@@ -354,8 +655,10 @@ class Bot(object):
             request.method = "POST"
             request.files = {"file": file}
 
-        return self.http_session.send(request.prepare(), timeout=self.timeout_s)
+        session = self.upload_session if file else self.http_session
+        return session.send(request.prepare(), timeout=self.timeout_s)
 
+    @outbound("chat_id")
     def edit_text(self, chat_id, msg_id, text, inline_keyboard_markup=None, parse_mode=None, format_=None):
         if parse_mode and format_:
             raise Exception("Cannot use format and parseMode fields at one time")
@@ -375,6 +678,7 @@ class Bot(object):
             timeout=self.timeout_s
         )
 
+    @outbound("chat_id")
     def delete_messages(self, chat_id, msg_id):
         return self.http_session.get(
             url="{}/messages/deleteMessages".format(self.api_base_url),
@@ -386,6 +690,7 @@ class Bot(object):
             timeout=self.timeout_s
         )
 
+    @outbound("query_id")
     def answer_callback_query(self, query_id, text, show_alert=False, url=None):
         return self.http_session.get(
             url="{}/messages/answerCallbackQuery".format(self.api_base_url),
@@ -398,6 +703,7 @@ class Bot(object):
             }
         )
 
+    @outbound("chat_id")
     def send_actions(self, chat_id, actions):
         return self.http_session.get(
             url="{}/chats/sendActions".format(self.api_base_url),
@@ -579,44 +885,49 @@ class LoggingHTTPAdapter(HTTPAdapter):
 
     @staticmethod
     def _is_loggable(headers):
-        return LoggingHTTPAdapter._LOG_MIME_TYPE_REGEXP.search(cgi.parse_header(headers.get("Content-Type", ""))[0])
+        return LoggingHTTPAdapter._LOG_MIME_TYPE_REGEXP.search(
+            headers.get("Content-Type", "").partition(";")[0].strip()
+        )
 
     @staticmethod
     def _headers_to_string(headers):
         return "\n".join((u"{key}: {value}".format(key=key, value=value) for (key, value) in headers.items()))
 
-    @staticmethod
-    def _body_to_string(body):
-        return body.decode("utf-8") if isinstance(body, bytes) else body
-
     def __init__(self, *args, **kwargs):
+        """
+        :param wire_log: :class:`bot.wirelog.WireLog` settings of DEBUG logging of requests and responses.
+        """
+        self.wire_log = kwargs.pop("wire_log", None) or WireLog()
+
         super(LoggingHTTPAdapter, self).__init__(*args, **kwargs)
 
         self.log = logging.getLogger(__name__)
 
     def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
-        if self.log.isEnabledFor(logging.DEBUG):
-            self.log.debug(u"{method} {url}\n{headers}{body}".format(
-                method=request.method,
-                url=request.url,
-                headers=LoggingHTTPAdapter._headers_to_string(request.headers),
-                body="\n\n" + (
-                    LoggingHTTPAdapter._body_to_string(request.body) if
-                    LoggingHTTPAdapter._is_loggable(request.headers) else "[binary data]"
-                ) if request.body is not None else ""
-            ))
+        if not (self.log.isEnabledFor(logging.DEBUG) and self.wire_log.sampled(request.url)):
+            return super(LoggingHTTPAdapter, self).send(request, stream, timeout, verify, cert, proxies)
+
+        wire_log = self.wire_log
+        self.log.debug(u"{method} {url}\n{headers}{body}".format(
+            method=request.method,
+            url=wire_log.text(request.url),
+            headers=LoggingHTTPAdapter._headers_to_string(request.headers),
+            body="\n\n" + (
+                wire_log.body(request.body) if LoggingHTTPAdapter._is_loggable(request.headers) else "[binary data]"
+            ) if request.body is not None else ""
+        ))
 
         response = super(LoggingHTTPAdapter, self).send(request, stream, timeout, verify, cert, proxies)
 
-        if self.log.isEnabledFor(logging.DEBUG):
-            self.log.debug(u"{status_code} {reason}\n{headers}{body}".format(
-                status_code=response.status_code,
-                reason=response.reason,
-                headers=LoggingHTTPAdapter._headers_to_string(response.headers),
-                body="\n\n" + (
-                    response.text if LoggingHTTPAdapter._is_loggable(response.headers) else "[binary data]"
-                ) if response.content is not None else ""
-            ))
+        self.log.debug(u"{status_code} {reason}\n{headers}{body}".format(
+            status_code=response.status_code,
+            reason=response.reason,
+            headers=LoggingHTTPAdapter._headers_to_string(response.headers),
+            body="\n\n" + (
+                wire_log.body(response.content, response.encoding) if LoggingHTTPAdapter._is_loggable(response.headers)
+                else "[binary data]"
+            ) if not stream and response.content is not None else ""
+        ))
 
         return response
 
@@ -629,23 +940,118 @@ class BotLoggingHTTPAdapter(LoggingHTTPAdapter):
 
     def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
         request.headers["User-Agent"] = self.bot.user_agent
-        return super(BotLoggingHTTPAdapter, self).send(request, stream, timeout, verify, cert, proxies)
+
+        endpoint = request_endpoint(request.url)
+        (policy, breaker) = (self.bot.retry_policy, self.bot.circuit_breaker)
+        attempt = 0
+        while True:
+            retry_after = None
+            breaker.before(endpoint)
+            try:
+                response = self._send(endpoint, request, stream, timeout, verify, cert, proxies)
+            except Exception as e:
+                breaker.record(endpoint, success=False)
+                if not (
+                    isinstance(e, (requests.ConnectionError, requests.Timeout)) and
+                    policy.should_retry(endpoint, attempt, connect_error=_is_connect_error(e))
+                ):
+                    raise
+                self.log.warning("Request '{}' failed: {}.".format(endpoint, e))
+            except BaseException:
+                # Interrupted, a trial of an open circuit mustn't keep it open.
+                breaker.release(endpoint)
+                raise
+            else:
+                # Throttled requests weren't processed, they are sent again after the time the server asked for.
+                retry_after = _retry_after(response.headers)
+                failed = response.status_code >= 500
+                breaker.record(endpoint, success=not failed)
+                if not (
+                    (failed or response.status_code == policy.THROTTLED_STATUS) and
+                    policy.should_retry(endpoint, attempt, status_code=response.status_code, retry_after=retry_after)
+                ):
+                    return response
+                response.close()
+                self.log.warning("Request '{}' failed with status {}.".format(endpoint, response.status_code))
+
+            sleep(policy.delay(attempt, retry_after))
+            attempt += 1
+
+    def _send(self, endpoint, request, stream, timeout, verify, cert, proxies):
+        limiter = self.bot.rate_limiter
+        key = limiter.request_key(request.url) if limiter is not None else None
+        if key is not None:
+            limiter.acquire(*key)
+
+        metrics = self.bot.metrics
+        started_at = perf_counter()
+        try:
+            response = super(BotLoggingHTTPAdapter, self).send(request, stream, timeout, verify, cert, proxies)
+        except Exception as e:
+            metrics.observe_request(endpoint, perf_counter() - started_at, error=e, sent=_body_size(request.body))
+            raise
+        metrics.observe_request(
+            endpoint, perf_counter() - started_at, status=response.status_code, sent=_body_size(request.body),
+            received=len(response.content) if not stream else 0
+        )
+
+        if key is not None:
+            limiter.update(key[0], key[1], response.status_code, response.headers)
+        if endpoint in SENDING_ENDPOINTS and not stream:
+            self.bot._remember_sent(request.url, None, response)
+
+        return response
+
+
+def _body_size(body):
+    return len(body) if isinstance(body, (bytes, six.text_type)) else 0
+
+
+def _session_pool_stats(session):
+    (size, in_use, idle, opened, requests_) = (0, 0, 0, 0, 0)
+    # Adapters may share a pool manager, see 'pool_manager' of Bot.
+    for manager in {adapter.poolmanager for adapter in session.adapters.values()}:
+        for key in manager.pools.keys():
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            queued = list(pool.pool.queue) if pool.pool is not None else []
+            size += pool.pool.maxsize if pool.pool is not None else 0
+            in_use += pool.pool.maxsize - len(queued) if pool.pool is not None else 0
+            idle += sum(1 for connection in queued if connection is not None)
+            opened += pool.num_connections
+            requests_ += pool.num_requests
+
+    # More opened connections than the pool size means requests didn't find a free connection and opened new ones.
+    return {"size": size, "in_use": in_use, "idle": idle, "opened": opened, "requests": requests_}
+
+
+def _is_connect_error(e):
+    """ Connection to the API wasn't established, so the request surely wasn't received. """
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(e, requests.ConnectTimeout) or isinstance(reason, NewConnectionError)
 
 
 class FileNotFoundException(Exception):
     pass
 
 
-class SkipDuplicateMessageHandler(MessageHandler):
-    def __init__(self, cache):
-        super(SkipDuplicateMessageHandler, self).__init__(filters=Filter.message)
+class SkipDuplicateMessageHandler(HandlerBase):
+    """ Stops dispatching of events found duplicate by :class:`bot.dedup.Deduplicator`, registered first by the bot. """
+
+    def __init__(self, deduplicator):
+        super(SkipDuplicateMessageHandler, self).__init__()
 
-        self.cache = cache
+        self.deduplicator = deduplicator
 
     def check(self, event, dispatcher):
-        if super(SkipDuplicateMessageHandler, self).check(event=event, dispatcher=dispatcher):
-            if self.cache.get(event.data["msgId"]) == event.data["text"]:
-                raise StopDispatching
+        reason = self.deduplicator.check(event)
+        if dispatcher.metrics is not None:
+            dispatcher.metrics.observe_dedup(reason)
+        if reason is not None:
+            dispatcher.log.debug("Skipping duplicate event '{}' ({}).".format(event, reason))
+            raise StopDispatching
+        return False
 
 
 class InvalidToken(Exception):
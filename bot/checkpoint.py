@@ -0,0 +1,213 @@
+import json
+import logging
+import sqlite3
+from collections import Counter, deque
+from threading import Lock
+from time import monotonic
+
+from .util import write_json_atomically
+
+
+class CheckpointStore(object):
+    """ Durable storage of the last dispatched event id by bot. """
+
+    def load(self, key):
+        """ Saved event id of the bot, ``None`` if there's none. """
+        raise NotImplementedError
+
+    def save(self, key, event_id):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FileCheckpointStore(CheckpointStore):
+    """
+    JSON file of event ids by bot, rewritten to a temporary file and renamed over the old one, so a crash leaves either
+    the old or the new version. The file may be shared by bots of one process, not by several processes.
+    """
+
+    def __init__(self, path, fsync=True):
+        """
+        :param fsync: Flush every save to disk, otherwise a power loss may lose recent saves.
+        """
+        super(FileCheckpointStore, self).__init__()
+
+        self.path = path
+        self.fsync = fsync
+
+        self._lock = Lock()
+        self._data = None
+
+    def _read(self):
+        if self._data is None:
+            try:
+                with open(self.path) as f:
+                    self._data = json.load(f)
+            except FileNotFoundError:
+                self._data = {}
+        return self._data
+
+    def load(self, key):
+        with self._lock:
+            return self._read().get(key)
+
+    def save(self, key, event_id):
+        with self._lock:
+            data = self._read()
+            data[key] = event_id
+
+            write_json_atomically(self.path, data, fsync=self.fsync)
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """ SQLite table of event ids by bot, may be shared by several processes. """
+
+    def __init__(self, path, table="checkpoints"):
+        super(SQLiteCheckpointStore, self).__init__()
+
+        self.table = table
+
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS {} (key TEXT PRIMARY KEY, event_id INTEGER NOT NULL)".format(table)
+        )
+
+    def load(self, key):
+        with self._lock:
+            row = self._connection.execute("SELECT event_id FROM {} WHERE key = ?".format(self.table), (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def save(self, key, event_id):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO {} (key, event_id) VALUES (?, ?)".format(self.table), (key, event_id)
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class Checkpointer(object):
+    """
+    Saves how far events of a bot have been dispatched, so polling resumes from there after a restart.
+
+    Events are dispatched concurrently and finish out of order, the saved id is a watermark: every event up to it has
+    been dispatched (its handlers ran, whether they raised or not) or dropped by the overload policy. Events after it
+    are fetched and dispatched again after a restart.
+
+    The watermark is saved every ``every_events`` dispatched events or every ``interval_s`` seconds, whatever comes
+    first, and when polling stops.
+    """
+
+    def __init__(self, store, key=None, every_events=100, interval_s=5.0, clock=monotonic):
+        """
+        :param store: :class:`CheckpointStore` such as :class:`FileCheckpointStore` or :class:`SQLiteCheckpointStore`.
+        :param key: Key of the bot in the store, bot ``uin`` by default.
+        """
+        super(Checkpointer, self).__init__()
+
+        self.log = logging.getLogger(__name__)
+
+        self.store = store
+        self.key = key
+        self.every_events = every_events
+        self.interval_s = interval_s
+        self.clock = clock
+
+        self._lock = Lock()
+        self._pending = deque()
+        # An id may be pending more than once when the API delivers an event again, each one is marked done.
+        self._done = Counter()
+        self._watermark = None
+        self._committed = None
+        self._committed_at = clock()
+        self._uncommitted = 0
+        self._commits = 0
+
+    @property
+    def watermark(self):
+        """ Id of the event up to which all events are dispatched. """
+        return self._watermark
+
+    def resume(self, key=None):
+        """ Saved event id to poll from, ``None`` if there's none. """
+        with self._lock:
+            if self.key is None:
+                self.key = key
+            self._watermark = self._committed = self.store.load(self.key)
+            self._pending.clear()
+            self._done.clear()
+            self._committed_at = self.clock()
+            self._uncommitted = 0
+            return self._committed
+
+    def fetched(self, batch):
+        """ Tracks events of a fetched :class:`bot.event.EventBatch`, must be called in the fetching order. """
+        with self._lock:
+            for event in batch.events:
+                self._pending.append(event.event_id)
+            # Skipped events of unknown types are treated as dispatched.
+            if batch.last_event_id is not None and (not self._pending or self._pending[-1] != batch.last_event_id):
+                self._pending.append(batch.last_event_id)
+                self._done[batch.last_event_id] += 1
+                self._advance()
+
+    def done(self, event_id):
+        """ Marks the event dispatched or dropped. """
+        with self._lock:
+            self._done[event_id] += 1
+            self._advance()
+
+    def _advance(self):
+        pending = self._pending
+        while pending and self._done[pending[0]]:
+            self._done[pending[0]] -= 1
+            if not self._done[pending[0]]:
+                del self._done[pending[0]]
+            self._watermark = pending.popleft()
+            self._uncommitted += 1
+
+        if self._uncommitted >= self.every_events or (
+            self._uncommitted and self.clock() - self._committed_at >= self.interval_s
+        ):
+            self._commit()
+
+    def maybe_commit(self):
+        """ Saves the watermark if ``interval_s`` has passed, for idle periods without dispatched events. """
+        with self._lock:
+            if self._uncommitted and self.clock() - self._committed_at >= self.interval_s:
+                self._commit()
+
+    def commit(self):
+        """ Saves the watermark now if it moved. """
+        with self._lock:
+            if self._watermark != self._committed:
+                self._commit()
+
+    def _commit(self):
+        # noinspection PyBroadException
+        try:
+            self.store.save(self.key, self._watermark)
+        except Exception:
+            self.log.exception("Can't save checkpoint of '{}'.".format(self.key))
+        else:
+            self._committed = self._watermark
+            self._commits += 1
+
+        # Failed saves are retried on the same cadence.
+        self._committed_at = self.clock()
+        self._uncommitted = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "watermark": self._watermark,
+                "committed": self._committed,
+                "in_flight": len(self._pending),
+                "commits": self._commits,
+            }
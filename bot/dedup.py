@@ -0,0 +1,160 @@
+import json
+import logging
+from collections import deque
+from threading import Lock
+
+from .event import EventType
+from .util import write_json_atomically
+
+# Methods sending messages the API may deliver back to the bot, see Deduplicator.sent.
+SENDING_ENDPOINTS = frozenset(("messages/sendText",))
+
+
+class RecentKeys(object):
+    """ The last ``capacity`` distinct keys: a deque holds the eviction order, a set answers lookups. """
+
+    def __init__(self, capacity):
+        super(RecentKeys, self).__init__()
+
+        self.capacity = capacity
+
+        # Both grow with the keys, an unused instance stays small whatever the capacity.
+        self._order = deque()
+        self._keys = set()
+
+    def add(self, key):
+        """ Remembers the key evicting the oldest one when full, returns ``False`` if it's already remembered. """
+        if key in self._keys:
+            return False
+
+        if self.capacity:
+            if len(self._order) >= self.capacity:
+                self._keys.discard(self._order.popleft())
+            self._order.append(key)
+            self._keys.add(key)
+        return True
+
+    def keys(self):
+        """ Remembered keys from the oldest. """
+        return list(self._order)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class Deduplicator(object):
+    """
+    Skips events delivered more than once, which happens after reconnects: polling resumes from the last acknowledged
+    ``eventId`` and the API may deliver events again.
+
+    Remembers ids of the last ``capacity`` events and chat and message ids of the last ``capacity`` new messages, an
+    event is a duplicate if either is remembered. Text messages sent by the bot itself, which the API may deliver back
+    as new messages, are remembered too and skipped if the delivered text is the same. Memory is bounded by the
+    capacities whatever the traffic.
+
+    With ``path`` the remembered keys are saved when polling stops and loaded when it starts, so events dispatched
+    before a restart but after the saved ``last_event_id`` (see :class:`bot.checkpoint.Checkpointer`) are skipped too.
+    """
+
+    def __init__(self, capacity=1024, sent_capacity=1024, path=None, fsync=True):
+        """
+        :param capacity: Number of remembered events and received messages, ``0`` disables deduplication including
+            messages sent by the bot.
+        :param sent_capacity: Number of remembered messages sent by the bot, ``0`` disables only their skipping.
+        :param path: JSON file keeping remembered keys across restarts.
+        """
+        super(Deduplicator, self).__init__()
+
+        self.log = logging.getLogger(__name__)
+
+        self.path = path
+        self.fsync = fsync
+
+        self._lock = Lock()
+        self._events = RecentKeys(capacity)
+        self._messages = RecentKeys(capacity)
+        self._sent = RecentKeys(sent_capacity if capacity else 0)
+        self._checked = 0
+        self._duplicates = {}
+
+    def check(self, event):
+        """ Remembers the event, returns why it's a duplicate: ``"event"``, ``"message"``, ``"sent"`` or ``None``. """
+        reason = None
+        message_key = _message_key(event) if event.type is EventType.NEW_MESSAGE else None
+        with self._lock:
+            self._checked += 1
+            if event.event_id is not None and not self._events.add(event.event_id):
+                reason = "event"
+            if message_key is not None:
+                new = self._messages.add(message_key)
+                if reason is None and message_key + (event.data.get("text"),) in self._sent:
+                    reason = "sent"
+                elif reason is None and not new:
+                    reason = "message"
+
+            if reason is not None:
+                self._duplicates[reason] = self._duplicates.get(reason, 0) + 1
+        return reason
+
+    def sent(self, chat_id, msg_id, text):
+        """ Remembers a text message sent by the bot, so it isn't dispatched if the API delivers it back. """
+        with self._lock:
+            self._sent.add((chat_id, msg_id, text))
+
+    def load(self):
+        """ Remembers keys saved to ``path`` before, does nothing without it. """
+        if self.path is None:
+            return
+
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+
+        with self._lock:
+            for event_id in data.get("events", ()):
+                self._events.add(event_id)
+            for (chat_id, msg_id) in data.get("messages", ()):
+                self._messages.add((chat_id, msg_id))
+            for (chat_id, msg_id, text) in data.get("sent", ()):
+                self._sent.add((chat_id, msg_id, text))
+        self.log.info("Loaded {} events and {} messages to deduplicate from '{}'.".format(
+            len(self._events), len(self._messages), self.path
+        ))
+
+    def save(self):
+        """ Saves remembered keys to ``path``, does nothing without it. """
+        if self.path is None:
+            return
+
+        with self._lock:
+            data = {"events": self._events.keys(), "messages": self._messages.keys(), "sent": self._sent.keys()}
+        # noinspection PyBroadException
+        try:
+            write_json_atomically(self.path, data, fsync=self.fsync)
+        except Exception:
+            self.log.exception("Can't save deduplication keys to '{}'.".format(self.path))
+
+    def stats(self):
+        with self._lock:
+            duplicates = sum(self._duplicates.values())
+            return {
+                "checked": self._checked,
+                "duplicates": duplicates,
+                "duplicates_by_reason": dict(self._duplicates),
+                "hit_rate": duplicates / self._checked if self._checked else 0.0,
+                "events": len(self._events),
+                "messages": len(self._messages),
+                "sent": len(self._sent),
+            }
+
+
+def _message_key(event):
+    data = event.data
+    msg_id = data.get("msgId")
+    chat_id = (data.get("chat") or {}).get("chatId")
+    return (chat_id, msg_id) if msg_id is not None and chat_id is not None else None
@@ -1,34 +1,341 @@
 import logging
+from concurrent.futures import Future
+from threading import Lock
+from time import perf_counter
+
+import six
+
+from .filter import CompiledFilter, PatternSet
+from .profiling import Profiler
+from .worker import WorkerPool
+
+
+_MISSING = object()
+
+# Bumped by invalidate_routes, dispatchers recompute routes of older generations.
+_generation = 0
+
+
+def invalidate_routes():
+    """
+    Makes dispatchers recompute their routes, which are computed from handler filters, commands and event types.
+    Handlers call it when their filters or commands change after creation, custom handlers changing their
+    ``event_types`` or ``commands`` must call it too.
+    """
+    global _generation
+    _generation += 1
 
 
 class Dispatcher(object):
-    def __init__(self, bot):
+    def __init__(self, bot, workers=0, max_queue_size=0):
+        """
+        :param workers: Number of threads running handlers, with ``0`` events are dispatched in the polling thread.
+            Events of the same chat are always dispatched one after another by the same worker.
+        :param max_queue_size: Maximum number of events waiting for each worker, ``0`` means unbounded.
+        """
         super(Dispatcher, self).__init__()
 
         self.log = logging.getLogger(__name__)
 
         self.bot = bot
-        self.handlers = []
+        self.metrics = getattr(bot, "metrics", None)
+        self.profiler = None
+        self.pool = WorkerPool(workers=workers, max_queue_size=max_queue_size, name="dispatcher") if workers else None
+
+        # Handlers and routes are replaced, never modified, so dispatching threads can iterate them without locking.
+        self._lock = Lock()
+        self._handlers = ()
+        self._routes = _RouteTable(())
+
+    @property
+    def handlers(self):
+        return self._handlers
 
     def add_handler(self, handler):
-        self.handlers.append(handler)
+        with self._lock:
+            self._set_handlers(self._handlers + (handler,))
 
     def remove_handler(self, handler):
-        if handler in self.handlers:
-            self.handlers.remove(handler)
+        with self._lock:
+            if handler in self._handlers:
+                self._set_handlers(tuple(h for h in self._handlers if h is not handler))
+
+    def _set_handlers(self, handlers):
+        # Routes are computed on first use, so registering many handlers doesn't rebuild them every time.
+        self._routes = _RouteTable(handlers)
+        self._handlers = handlers
+
+    def route(self, event):
+        """
+        Handlers which may accept the event judging by its type, command and regexp patterns found in it while
+        dispatching, in registration order.
+        """
+        command = event.command
+        return self._route_table().route(event.type, command.name if command is not None else None).select(event)
+
+    def command_route(self, event):
+        """ Command handlers which may accept the event, in registration order. """
+        command = event.command
+        if command is None:
+            return ()
+        return self._route_table().command_route(event.type, command.name).select(event)
+
+    def _route_table(self):
+        routes = self._routes
+        if routes.generation != _generation:
+            with self._lock:
+                routes = self._routes
+                if routes.generation != _generation:
+                    routes = self._routes = _RouteTable(self._handlers)
+        return routes
+
+    def check(self, handler, event):
+        """ Result of ``handler.check`` for the event, evaluated at most once per dispatching. """
+        memo = event.memo
+        result = memo.get(handler, _MISSING)
+        if result is _MISSING:
+            # Guards against handlers checking each other in a loop.
+            memo[handler] = False
+            profiler = self.profiler
+            if profiler is None:
+                result = memo[handler] = handler.check(event=event, dispatcher=self)
+            else:
+                with profiler.timing("check", handler):
+                    result = memo[handler] = handler.check(event=event, dispatcher=self)
+        return result
+
+    def enable_profiling(self, slow_threshold=1.0, profile_sample_rate=0.0, **kwargs):
+        """
+        Starts timing handler calls, may be called while events are being dispatched.
+
+        :param slow_threshold: Seconds after which a handler call is reported with its stack.
+        :param profile_sample_rate: Share of events dispatched under :mod:`cProfile`.
+        :return: :class:`bot.profiling.Profiler` collecting the results.
+        """
+        profiler = Profiler(slow_threshold=slow_threshold, profile_sample_rate=profile_sample_rate, **kwargs)
+        profiler.start()
+        previous, self.profiler = self.profiler, profiler
+        if previous is not None:
+            previous.stop()
+        return profiler
+
+    def disable_profiling(self):
+        """ Stops timing handler calls, returns the :class:`bot.profiling.Profiler` with the results if any. """
+        profiler, self.profiler = self.profiler, None
+        if profiler is not None:
+            profiler.stop()
+        return profiler
+
+    def _new_memo(self):
+        """ Initial ``event.memo`` with sets of all regexp filter patterns, see :class:`bot.filter.PatternSet`. """
+        return dict(self._route_table().memo())
 
     def dispatch(self, event):
+        profiler = self.profiler
+        if profiler is not None and profiler.sampled():
+            with profiler.profiling():
+                return self._dispatch(event)
+        return self._dispatch(event)
+
+    def _dispatch(self, event):
         # noinspection PyBroadException
         try:
             self.log.debug("Dispatching event '{}'.".format(event))
-            for handler in (h for h in self.handlers if h.check(event=event, dispatcher=self)):
-                handler.handle(event=event, dispatcher=self)
+            event.memo = self._new_memo()
+            for handler in (h for h in self.route(event) if self.check(h, event)):
+                self._handle(handler, event)
         except StopDispatching:
             self.log.debug("Caught '{}' exception, stopping dispatching.".format(StopDispatching.__name__))
         except Exception:
             self.log.exception("Exception while dispatching event!")
 
+    def _handle(self, handler, event):
+        profiler = self.profiler
+        if profiler is None:
+            return self._measure(handler, event)
+        with profiler.timing("handle", handler):
+            return self._measure(handler, event)
+
+    def _measure(self, handler, event):
+        metrics = self.metrics
+        if metrics is None:
+            return handler.handle(event=event, dispatcher=self)
+
+        started_at = perf_counter()
+        try:
+            result = handler.handle(event=event, dispatcher=self)
+        except StopDispatching:
+            metrics.observe_handler(handler, perf_counter() - started_at)
+            raise
+        except Exception:
+            metrics.observe_handler(handler, perf_counter() - started_at, failed=True)
+            raise
+        metrics.observe_handler(handler, perf_counter() - started_at)
+        return result
+
+    def submit(self, event):
+        """ Dispatches event in the worker pool if it's configured, returns :class:`concurrent.futures.Future`. """
+        if self.pool is not None:
+            return self.pool.submit(_chat_key(event), self.dispatch, event)
+
+        future = Future()
+        future.set_result(self.dispatch(event))
+        return future
+
+    def stop(self):
+        """ Waits for queued events to be dispatched and stops workers. """
+        if self.pool is not None:
+            self.pool.stop()
+
+    def stats(self):
+        return self.pool.stats() if self.pool is not None else {"workers": 0, "queue_depth": 0}
+
+
+class _RouteTable(object):
+    """
+    Handlers which may accept events of a type and command, computed from a snapshot of handlers on first use.
+
+    Handlers bound to particular commands are only routed messages with these commands. Routes of commands no handler
+    is bound to are shared, so unknown commands don't grow the table. Routes and pattern sets are cached in plain
+    dicts, threads racing to compute one compute the same value. Dispatcher replaces tables of older generations, see
+    :func:`invalidate_routes`.
+    """
+
+    def __init__(self, handlers):
+        super(_RouteTable, self).__init__()
+
+        self.handlers = handlers
+        self.generation = _generation
+        self._bound = None
+        self._memo = None
+        self._routes = {}
+        self._command_routes = {}
+
+    def memo(self):
+        """ ``event.memo`` items with a :class:`bot.filter.PatternSet` of regexp filter patterns by event data field. """
+        memo = self._memo
+        if memo is None:
+            patterns = {}
+            for handler in self.handlers:
+                compiled = getattr(handler, "_compiled_filters", None)
+                for (field, pattern) in (compiled.patterns() if isinstance(compiled, CompiledFilter) else ()):
+                    patterns.setdefault(field, set()).add(pattern)
+
+            memo = self._memo = {
+                (PatternSet, f): PatternSet(p) for (f, p) in patterns.items() if len(p) >= PatternSet.MIN_PATTERNS
+            }
+        return memo
+
+    def route(self, event_type, command):
+        key = (event_type, self._bound_command(command))
+        route = self._routes.get(key)
+        if route is None:
+            route = self._routes[key] = _Route(
+                (h for h in self.handlers if _accepts(h, event_type) and _bound_to(h, key[1])), self.memo()
+            )
+        return route
+
+    def command_route(self, event_type, command):
+        key = (event_type, self._bound_command(command))
+        route = self._command_routes.get(key)
+        if route is None:
+            route = self._command_routes[key] = _Route((
+                h for h in self.handlers if getattr(h, "commands", None) is not None and
+                _accepts(h, event_type) and _bound_to(h, key[1])
+            ), self.memo())
+        return route
+
+    def _bound_command(self, command):
+        """ The command if any handler is bound to it, ``None`` otherwise. """
+        if command is None:
+            return None
+
+        bound = self._bound
+        if bound is None:
+            bound = self._bound = frozenset(name for h in self.handlers for name in getattr(h, "commands", None) or ())
+        return command if command in bound else None
+
+
+class _Route(object):
+    """
+    Handlers of a route, those requiring a regexp pattern are grouped by it.
+
+    While dispatching, ``event.memo`` holds the pattern set of the field, which finds all patterns in the text in a
+    single pass. Only handlers requiring found patterns are selected then, others can't accept the event.
+    """
+
+    def __init__(self, handlers, memo):
+        super(_Route, self).__init__()
+
+        self.handlers = tuple(handlers)
+        # Event data field -> pattern -> positions of the handlers requiring it.
+        self.required = {}
+        self._positions = []
+        for (position, handler) in enumerate(self.handlers):
+            required = _required_pattern(handler)
+            if required is not None and (PatternSet, required[0]) in memo:
+                self.required.setdefault(required[0], {}).setdefault(required[1], []).append(position)
+            else:
+                self._positions.append(position)
+        self._others = tuple(self.handlers[i] for i in self._positions)
+
+    def select(self, event):
+        """ Handlers which may accept the event, all of them if the memo has no pattern sets. """
+        if not self.required:
+            return self.handlers
+
+        positions = None
+        for (field, required) in self.required.items():
+            text = event.data.get(field)
+            # The filters can't pass for a missing text.
+            matched = PatternSet.matched(event, field) if isinstance(text, six.string_types) else ()
+            if matched is None:
+                return self.handlers
+
+            for pattern in matched:
+                found = required.get(pattern)
+                if found:
+                    positions = list(self._positions) if positions is None else positions
+                    positions.extend(found)
+
+        if positions is None:
+            return self._others
+        positions.sort()
+        return tuple(self.handlers[i] for i in positions)
+
+
+def _required_pattern(handler):
+    """ ``(event data field, pattern)`` which must be found for the handler to accept an event, ``None`` if any. """
+    if not getattr(getattr(type(handler), "check", None), "requires_filters", False):
+        return None
+    compiled = getattr(handler, "_compiled_filters", None)
+    if not getattr(handler, "filters", None) or not isinstance(compiled, CompiledFilter):
+        return None
+    return compiled.required_pattern()
+
+
+def _bound_to(handler, command):
+    """ Handler isn't bound to particular commands or is bound to the command. """
+    commands = getattr(handler, "commands", None)
+    return not commands or command in commands
+
+
+def _accepts(handler, event_type):
+    event_types = getattr(handler, "event_types", None)
+    return event_types is None or event_type in event_types
+
+
+def _chat_key(event):
+    data = event.data
+    chat = data.get("chat") or data.get("message", {}).get("chat") or {}
+    return chat.get("chatId")
+
 
 class StopDispatching(Exception):
     """ If raised from handler 'check' or 'handle' methods then dispatching will be stopped. """
-    pass
+
+    def __init__(self, result=None):
+        super(StopDispatching, self).__init__()
+
+        # Value returned by the handler callback (a coroutine for async callbacks), awaited by AsyncDispatcher.
+        self.result = result
@@ -1,5 +1,28 @@
+import logging
+from collections import namedtuple
 from enum import Enum, unique
 
+import six
+
+from .constant import Parts, PayLoadFileType
+from .filter import CommandFilter
+from .util import json_loads, deep_getsizeof
+
+log = logging.getLogger(__name__)
+
+
+Command = namedtuple("Command", ("prefix", "name", "args"))
+
+PartIndex = namedtuple("PartIndex", ("types", "file_types", "mentions"))
+PartIndex.__doc__ = """
+Message parts summary: sets of :class:`bot.constant.Parts`, :class:`bot.constant.PayLoadFileType` and user ids of
+mentions.
+"""
+
+_NO_PARTS = PartIndex(types=frozenset(), file_types=frozenset(), mentions=frozenset())
+_PARTS = {p.value: p for p in Parts}
+_FILE_TYPES = {t.value: t for t in PayLoadFileType}
+
 
 @unique
 class EventType(Enum):
@@ -14,28 +37,233 @@ class EventType(Enum):
     CALLBACK_QUERY = "callbackQuery"
 
 
+_MISSING = object()
+
+
+class lazy_attribute(object):
+    """
+    Read-write attribute computed by the decorated method on first access.
+
+    The value is stored in the slot with the same name prefixed by underscore, which must be declared in ``__slots__``.
+    """
+
+    def __init__(self, func):
+        super(lazy_attribute, self).__init__()
+
+        self.func = func
+        self.slot = "_" + func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        value = getattr(instance, self.slot, _MISSING)
+        if value is _MISSING:
+            value = self.func(instance)
+            setattr(instance, self.slot, value)
+        return value
+
+    def __set__(self, instance, value):
+        setattr(instance, self.slot, value)
+
+
 class Event(object):
-    def __init__(self, type_, data):
+    """
+    Event received from 'events/get'.
+
+    Only the payload is kept, convenience attributes are computed from it on first access. Instantiating ``Event``
+    returns the subclass matching the event type: :class:`MessageEvent`, :class:`CallbackQueryEvent`,
+    :class:`ChatMembersEvent` or :class:`PinEvent`.
+    """
+    __slots__ = ("type", "data", "event_id", "_from_chat", "_chat_type", "_command", "_part_index", "_memo")
+
+    def __new__(cls, type_, data, event_id=None):
+        if cls is Event:
+            cls = _EVENT_CLASSES.get(type_, Event)
+        return super(Event, cls).__new__(cls)
+
+    def __init__(self, type_, data, event_id=None):
         super(Event, self).__init__()
 
         self.type = type_
         self.data = data
+        self.event_id = event_id
+
+    def __getnewargs__(self):
+        # Copying and unpickling call __new__ with these.
+        return self.type, self.data, self.event_id
+
+    @property
+    def chat(self):
+        return self.data['chat']
+
+    @lazy_attribute
+    def from_chat(self):
+        return self.chat['chatId']
+
+    @lazy_attribute
+    def chat_type(self):
+        return self.chat['type']
 
-        if type_ == EventType.NEW_MESSAGE:
-            self.msgId = data.get('msgId')
-            self.text = data.get('text')
-            self.format = data.get('format')
-            self.from_chat = data['chat']['chatId']
-            self.chat_type = data['chat']['type']
-            self.message_author = data.get('from', {})
-
-        elif type_ == EventType.CALLBACK_QUERY:
-            self.msgId = data['message'].get('msgId')
-            self.callback_query = data['callbackData']
-            self.from_chat = data['message']['chat']['chatId']
-            self.chat_type = data['message']['chat']['type']
-            self.message_author = data['queryId'].split(':')[1]
-            self.queryId = data['queryId']
+    @lazy_attribute
+    def command(self):
+        """ :class:`Command` parsed from the message text or ``None`` if the text is not a command. """
+        text = self.data.get("text")
+        if not isinstance(text, six.string_types):
+            return None
+
+        stripped = text.strip()
+        for prefix in CommandFilter.COMMAND_PREFIXES:
+            if stripped.startswith(prefix):
+                (name, _, args) = text.partition(" ")
+                return Command(prefix=prefix, name=name[1:].lower(), args=args)
+
+        return None
+
+    @lazy_attribute
+    def part_index(self):
+        """ :class:`PartIndex` of the message parts, built in a single pass over them. """
+        parts = self.data.get("parts")
+        if not parts:
+            return _NO_PARTS
+
+        (types, file_types, mentions) = (set(), set(), set())
+        for part in parts:
+            part_type = _PARTS.get(part.get("type"))
+            payload = part.get("payload")
+            types.add(part_type)
+            # Keyboard parts have a list of button rows as payload.
+            if not isinstance(payload, dict):
+                continue
+            file_types.add(_FILE_TYPES.get(payload.get("type")))
+            if part_type is Parts.MENTION:
+                mentions.add(payload.get("userId"))
+
+        # Unknown part and file types are collected as None.
+        (types, file_types) = (frozenset(types) - {None}, frozenset(file_types) - {None})
+        return PartIndex(types=types, file_types=file_types, mentions=frozenset(mentions))
+
+    @lazy_attribute
+    def memo(self):
+        """ Scratch storage for results computed while dispatching the event, such as handler checks. """
+        return {}
+
+    def memory_footprint(self):
+        """ Approximate size in bytes of the event object including its payload. """
+        return deep_getsizeof(self)
 
     def __repr__(self):
         return "Event(type='{self.type}', data='{self.data}')".format(self=self)
+
+
+class MessageEvent(Event):
+    """ New, edited or deleted message. """
+    __slots__ = ("_msgId", "_text", "_format", "_message_author")
+
+    @lazy_attribute
+    def msgId(self):
+        return self.data.get('msgId')
+
+    @lazy_attribute
+    def text(self):
+        return self.data.get('text')
+
+    @lazy_attribute
+    def format(self):
+        return self.data.get('format')
+
+    @lazy_attribute
+    def message_author(self):
+        return self.data.get('from', {})
+
+    @property
+    def parts(self):
+        return self.data.get('parts', ())
+
+
+class CallbackQueryEvent(Event):
+    """ Inline keyboard button click. """
+    __slots__ = ("_msgId", "_message_author")
+
+    @property
+    def chat(self):
+        return self.data['message']['chat']
+
+    @lazy_attribute
+    def msgId(self):
+        return self.data['message'].get('msgId')
+
+    @property
+    def callback_query(self):
+        return self.data['callbackData']
+
+    @property
+    def queryId(self):
+        return self.data['queryId']
+
+    @lazy_attribute
+    def message_author(self):
+        return self.queryId.split(':')[1]
+
+
+class ChatMembersEvent(Event):
+    """ Members joined or left the chat. """
+    __slots__ = ()
+
+    @property
+    def members(self):
+        return self.data.get('newMembers' if self.type is EventType.NEW_CHAT_MEMBERS else 'leftMembers', ())
+
+
+class PinEvent(Event):
+    """ Message was pinned or unpinned. """
+    __slots__ = ()
+
+    @property
+    def msgId(self):
+        return self.data.get('msgId')
+
+
+_EVENT_CLASSES = {
+    EventType.NEW_MESSAGE: MessageEvent,
+    EventType.EDITED_MESSAGE: MessageEvent,
+    EventType.DELETED_MESSAGE: MessageEvent,
+    EventType.CALLBACK_QUERY: CallbackQueryEvent,
+    EventType.NEW_CHAT_MEMBERS: ChatMembersEvent,
+    EventType.LEFT_CHAT_MEMBERS: ChatMembersEvent,
+    EventType.PINNED_MESSAGE: PinEvent,
+    EventType.UNPINNED_MESSAGE: PinEvent,
+}
+
+
+_EVENT_TYPES = {t.value: t for t in EventType}
+
+EventBatch = namedtuple("EventBatch", ("events", "last_event_id", "data"))
+
+
+def parse_events(body):
+    """
+    Decodes 'events/get' response body once and builds events in the same pass.
+
+    :param body: Raw response body (``bytes`` or ``str``).
+    :return: :class:`EventBatch` with the list of events, the greatest event id (``None`` for an empty batch) and the
+        decoded response.
+    """
+    data = json_loads(body)
+    events = []
+    last_event_id = None
+
+    for event in data.get("events") or ():
+        event_id = event["eventId"]
+        if last_event_id is None or event_id > last_event_id:
+            last_event_id = event_id
+
+        type_ = _EVENT_TYPES.get(event["type"])
+        if type_ is None:
+            log.warning("Skipping event {} of unknown type '{}'.".format(event_id, event["type"]))
+            continue
+
+        events.append(Event(type_=type_, data=event["payload"], event_id=event_id))
+
+    return EventBatch(events=events, last_event_id=last_event_id, data=data)
@@ -3,6 +3,15 @@ from abc import ABCMeta, abstractmethod
 
 import six
 
+# Private modules, patterns are searched without literal prefilter if they are gone.
+try:
+    from re import _parser as _sre_parse
+except ImportError:  # pragma: no cover
+    try:
+        import sre_parse as _sre_parse
+    except ImportError:
+        _sre_parse = None
+
 from .constant import Parts, PayLoadFileType
 
 
@@ -23,10 +32,33 @@ class FilterBase(object):
     def __invert__(self):
         return InvertFilter(self)
 
+    def __repr__(self):
+        fields = type(self).__dict__.get("_KEY_FIELDS")
+        if fields is None:
+            return super(FilterBase, self).__repr__()
+        return "{}({})".format(type(self).__name__, ", ".join(repr(getattr(self, f)) for f in fields))
+
     @abstractmethod
     def filter(self, event):
         pass
 
+    @property
+    def key(self):
+        """
+        Filters with equal keys give the same result for the same event, compiled filters evaluate them once per event.
+
+        A filter is only equal to itself unless its exact class declares ``_KEY_FIELDS``, attributes the result depends
+        on.
+        """
+        fields = type(self).__dict__.get("_KEY_FIELDS")
+        if fields is None:
+            return self
+        return (type(self),) + tuple(getattr(self, f) for f in fields)
+
+    def compile(self):
+        """ Returns :class:`CompiledFilter` equivalent to this filter. """
+        return CompiledFilter(self)
+
 
 class CompositeFilter(FilterBase):
     def __init__(self, filter_1, filter_2):
@@ -35,6 +67,9 @@ class CompositeFilter(FilterBase):
         self.filter_1 = filter_1
         self.filter_2 = filter_2
 
+    def __repr__(self):
+        return "{}({!r}, {!r})".format(type(self).__name__, self.filter_1, self.filter_2)
+
 
 class AndFilter(CompositeFilter):
     def filter(self, event):
@@ -52,6 +87,9 @@ class IterableFilter(FilterBase):
 
         self.iterable = iterable
 
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, self.iterable)
+
 
 class AllFilter(IterableFilter):
     def filter(self, event):
@@ -72,104 +110,142 @@ class InvertFilter(FilterBase):
     def filter(self, event):
         return not self.filter_(event)
 
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, self.filter_)
+
 
 class MessageFilter(FilterBase):
+    _KEY_FIELDS = ()
+
     def filter(self, event):
         return "text" in event.data and isinstance(event.data["text"], six.string_types)
 
 
 class CommandFilter(MessageFilter):
+    _KEY_FIELDS = ()
     COMMAND_PREFIXES = ("/", ".")
 
     def filter(self, event):
-        return super(CommandFilter, self).filter(event) and any(
-            event.data["text"].strip().startswith(p) for p in CommandFilter.COMMAND_PREFIXES
-        )
+        return event.command is not None
 
 
 class RegexpFilter(MessageFilter):
+    _KEY_FIELDS = ("pattern",)
+
     def __init__(self, pattern):
         super(RegexpFilter, self).__init__()
 
         self.pattern = re.compile(pattern) if isinstance(pattern, six.string_types) else pattern
 
     def filter(self, event):
-        return super(RegexpFilter, self).filter(event) and self.pattern.search(event.data["text"])
+        return super(RegexpFilter, self).filter(event) and _search(event, self.pattern, "text")
+
+    def _plan(self):
+        return _and(MessageFilter(), _PatternFilter(self.pattern))
 
 
 class SenderFilter(MessageFilter):
+    _KEY_FIELDS = ("user_id",)
+
     def __init__(self, user_id):
         super(SenderFilter, self).__init__()
 
         self.user_id = user_id
 
     def filter(self, event):
-        return super(SenderFilter, self).filter(event) and 'from' in event.data \
-               and event.data['from']['userId'] == self.user_id
+        return super(SenderFilter, self).filter(event) and _is_sender(event, self.user_id)
+
+    def _plan(self):
+        return _and(MessageFilter(), _SenderFilter(self.user_id))
 
 
 class FileFilter(MessageFilter):
+    _KEY_FIELDS = ()
+
     def filter(self, event):
-        return super(FileFilter, self).filter(event) and 'parts' in event.data and any(
-           p['type'] == Parts.FILE.value for p in event.data['parts']
-        )
+        return super(FileFilter, self).filter(event) and _has_part(event, Parts.FILE)
+
+    def _plan(self):
+        return _and(MessageFilter(), _PartFilter(Parts.FILE))
 
 
 class ImageFilter(FileFilter):
+    _KEY_FIELDS = ()
+
     def filter(self, event):
-        return super(ImageFilter, self).filter(event) and any(
-            p['payload']['type'] == PayLoadFileType.IMAGE.value for p in event.data['parts'] if 'type' in p['payload']
-        )
+        return super(ImageFilter, self).filter(event) and _has_file_type(event, PayLoadFileType.IMAGE)
+
+    def _plan(self):
+        return _and(MessageFilter(), _PartFilter(Parts.FILE), _FileTypeFilter(PayLoadFileType.IMAGE))
 
 
 class VideoFilter(FileFilter):
+    _KEY_FIELDS = ()
+
     def filter(self, event):
-        return super(VideoFilter, self).filter(event) and any(
-            p['payload']['type'] == PayLoadFileType.VIDEO.value for p in event.data['parts'] if 'type' in p['payload']
-        )
+        return super(VideoFilter, self).filter(event) and _has_file_type(event, PayLoadFileType.VIDEO)
+
+    def _plan(self):
+        return _and(MessageFilter(), _PartFilter(Parts.FILE), _FileTypeFilter(PayLoadFileType.VIDEO))
 
 
 class AudioFilter(FileFilter):
+    _KEY_FIELDS = ()
+
     def filter(self, event):
-        return super(AudioFilter, self).filter(event) and any(
-            p['payload']['type'] == PayLoadFileType.AUDIO.value for p in event.data['parts'] if 'type' in p['payload']
-        )
+        return super(AudioFilter, self).filter(event) and _has_file_type(event, PayLoadFileType.AUDIO)
+
+    def _plan(self):
+        return _and(MessageFilter(), _PartFilter(Parts.FILE), _FileTypeFilter(PayLoadFileType.AUDIO))
 
 
 class StickerFilter(MessageFilter):
+    _KEY_FIELDS = ()
+
     def filter(self, event):
-        return super(StickerFilter, self).filter(event) and 'parts' in event.data and any(
-           p['type'] == Parts.STICKER.value for p in event.data['parts']
-        )
+        return super(StickerFilter, self).filter(event) and _has_part(event, Parts.STICKER)
+
+    def _plan(self):
+        return _and(MessageFilter(), _PartFilter(Parts.STICKER))
 
 
 class MentionFilter(MessageFilter):
+    _KEY_FIELDS = ("user_id",)
+
     def __init__(self, user_id=None):
         super(MentionFilter, self).__init__()
 
         self.user_id = user_id
 
     def filter(self, event):
-        return super(MentionFilter, self).filter(event) and 'parts' in event.data and any(
-           p['type'] == Parts.MENTION.value and (
-               p['payload']['userId'] == self.user_id if self.user_id else True
-           ) for p in event.data['parts']
-        )
+        return super(MentionFilter, self).filter(event) and _has_mention(event, self.user_id)
+
+    def _plan(self):
+        return _and(MessageFilter(), _MentionPartFilter(self.user_id))
 
 
 class ForwardFilter(MessageFilter):
+    _KEY_FIELDS = ()
+
     def filter(self, event):
-        return 'parts' in event.data and any(p['type'] == Parts.FORWARD.value for p in event.data['parts'])
+        return _has_part(event, Parts.FORWARD)
+
+    def _plan(self):
+        return _leaf(_PartFilter(Parts.FORWARD))
 
 
 class ReplyFilter(MessageFilter):
+    _KEY_FIELDS = ()
+
     def filter(self, event):
-        return super(ReplyFilter, self).filter(event) and 'parts' in event.data and any(
-           p['type'] == Parts.REPLY.value for p in event.data['parts']
-        )
+        return super(ReplyFilter, self).filter(event) and _has_part(event, Parts.REPLY)
+
+    def _plan(self):
+        return _and(MessageFilter(), _PartFilter(Parts.REPLY))
 
 
 class URLFilter(RegexpFilter):
+    _KEY_FIELDS = ()
     REGEXP = re.compile(r"^\s*https?://\S+\s*$", re.IGNORECASE)
 
     __FILTER = InvertFilter(FileFilter())  # Files are also URLs, but we need to skip it.
@@ -180,8 +256,13 @@ class URLFilter(RegexpFilter):
     def filter(self, event):
         return super(URLFilter, self).filter(event) and URLFilter.__FILTER(event)
 
+    def _plan(self):
+        return _and(MessageFilter(), _PatternFilter(URLFilter.REGEXP), ("not", FileFilter()._plan()))
+
 
 class CallbackDataFilter(FilterBase):
+    _KEY_FIELDS = ("callback_data",)
+
     def __init__(self, callback_data):
         super(CallbackDataFilter, self).__init__()
 
@@ -192,13 +273,434 @@ class CallbackDataFilter(FilterBase):
 
 
 class CallbackDataRegexpFilter(FilterBase):
+    _KEY_FIELDS = ("pattern",)
+    _SEARCH_FIELD = "callbackData"
+
     def __init__(self, pattern):
         super(CallbackDataRegexpFilter, self).__init__()
 
         self.pattern = re.compile(pattern)
 
     def filter(self, event):
-        return "callbackData" in event.data and self.pattern.search(event.data['callbackData'])
+        return "callbackData" in event.data and _search(event, self.pattern, "callbackData")
+
+
+def _has_part(event, part_type):
+    return part_type in event.part_index.types
+
+
+def _has_file_type(event, file_type):
+    return file_type in event.part_index.file_types
+
+
+def _has_mention(event, user_id):
+    index = event.part_index
+    return user_id in index.mentions if user_id else Parts.MENTION in index.types
+
+
+def _is_sender(event, user_id):
+    return 'from' in event.data and event.data['from']['userId'] == user_id
+
+
+def _search(event, pattern, field):
+    memo = getattr(event, "memo", None)
+    patterns = memo.get((PatternSet, field)) if memo is not None else None
+    if patterns is None or pattern not in patterns:
+        return pattern.search(event.data[field])
+    return pattern in PatternSet.matched(event, field)
+
+
+class PatternSet(object):
+    """
+    Searches text for many regular expressions at once.
+
+    Most filter patterns contain a literal which any match must include (``spam`` in ``\\bspam\\d+``). Such patterns
+    are grouped by that literal, and a group is only searched when its literal occurs in the text. Plain substring
+    checks are much cheaper than regex searches, so a text is fully searched only by the few patterns that can match
+    it. Patterns without such literal (or case insensitive ones) are always searched.
+
+    Dispatcher builds a set of all regexp filter patterns of its handlers and puts it to ``event.memo``, regexp
+    filters then take their result from the single pass. Handlers requiring a pattern (see
+    :meth:`CompiledFilter.required_pattern`) aren't even checked unless the pass found it.
+    """
+
+    # Dispatcher doesn't bother building a set for fewer patterns.
+    MIN_PATTERNS = 4
+
+    def __init__(self, patterns):
+        super(PatternSet, self).__init__()
+
+        self.patterns = frozenset(patterns)
+        self.fallback = []
+
+        literals = {}
+        for pattern in self.patterns:
+            literal = _required_literal(pattern)
+            if literal:
+                literals.setdefault(literal, []).append(pattern)
+            else:
+                self.fallback.append(pattern)
+
+        # Longer literals are rarer, check them first to fail fast on nothing.
+        self._literals = sorted(literals.items(), key=lambda item: -len(item[0]))
+
+    def __contains__(self, pattern):
+        return pattern in self.patterns
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def search(self, text):
+        """ Set of patterns found in the text. """
+        matched = {p for (literal, patterns) in self._literals if literal in text for p in patterns if p.search(text)}
+        matched.update(p for p in self.fallback if p.search(text))
+        return matched
+
+    @staticmethod
+    def matched(event, field):
+        """
+        Patterns of the set in ``event.memo`` found in the event data field, searched once per event.
+
+        :return: Set of patterns or ``None`` if there's no set for the field in the memo.
+        """
+        memo = event.memo
+        matched = memo.get((PatternSet, field, "matched"))
+        if matched is None:
+            patterns = memo.get((PatternSet, field))
+            if patterns is None:
+                return None
+            matched = memo[(PatternSet, field, "matched")] = patterns.search(event.data[field])
+        return matched
+
+
+def _required_literal(pattern):
+    """ Longest literal every match of the pattern contains or ``None`` if there's no such or it can't be told. """
+    if _sre_parse is None or not isinstance(pattern.pattern, six.text_type) or pattern.flags & re.IGNORECASE:
+        return None
+
+    try:
+        items = list(_sre_parse.parse(pattern.pattern, pattern.flags))
+        literal_op = _sre_parse.LITERAL
+    except Exception:  # pragma: no cover
+        return None
+
+    (best, run) = (u"", [])
+    for (op, value) in items + [(None, None)]:
+        if op is literal_op:
+            run.append(six.unichr(value))
+            continue
+
+        if len(run) > len(best):
+            best = u"".join(run)
+        run = []
+
+    return best or None
+
+
+class _PartFilter(FilterBase):
+    """ Part of a built-in filter, used in compiled plans: message has a part of the given type. """
+    _KEY_FIELDS = ("part_type",)
+
+    def __init__(self, part_type):
+        super(_PartFilter, self).__init__()
+
+        self.part_type = part_type
+
+    def filter(self, event):
+        return _has_part(event, self.part_type)
+
+
+class _FileTypeFilter(FilterBase):
+    """ Part of a built-in filter, used in compiled plans: message has a file of the given type. """
+    _KEY_FIELDS = ("file_type",)
+
+    def __init__(self, file_type):
+        super(_FileTypeFilter, self).__init__()
+
+        self.file_type = file_type
+
+    def filter(self, event):
+        return _has_file_type(event, self.file_type)
+
+
+class _MentionPartFilter(FilterBase):
+    """ Part of a built-in filter, used in compiled plans: message mentions the user (or anyone). """
+    _KEY_FIELDS = ("user_id",)
+
+    def __init__(self, user_id):
+        super(_MentionPartFilter, self).__init__()
+
+        self.user_id = user_id
+
+    def filter(self, event):
+        return _has_mention(event, self.user_id)
+
+
+class _SenderFilter(FilterBase):
+    """ Part of a built-in filter, used in compiled plans: message is sent by the user. """
+    _KEY_FIELDS = ("user_id",)
+
+    def __init__(self, user_id):
+        super(_SenderFilter, self).__init__()
+
+        self.user_id = user_id
+
+    def filter(self, event):
+        return _is_sender(event, self.user_id)
+
+
+class _PatternFilter(FilterBase):
+    """ Part of a built-in filter, used in compiled plans: message text matches the pattern. """
+    _KEY_FIELDS = ("pattern",)
+    _SEARCH_FIELD = "text"
+
+    def __init__(self, pattern):
+        super(_PatternFilter, self).__init__()
+
+        self.pattern = pattern
+
+    def filter(self, event):
+        return _search(event, self.pattern, "text")
+
+
+class CompiledFilter(object):
+    """
+    Filter tree compiled for evaluation while dispatching.
+
+    Nested and/or filters are flattened, built-in filters are split into the checks they consist of and checks
+    already evaluated to true earlier in the enclosing conjunction are dropped, e.g. ``Filter.text`` checks that the
+    event is a message once. Every check result is stored in ``event.memo`` by filter key, so checks shared between
+    handlers are evaluated once per event too. :attr:`plan` and :meth:`explain` show what is evaluated.
+    """
+
+    def __init__(self, filter_):
+        super(CompiledFilter, self).__init__()
+
+        self.filter_ = filter_
+        self.plan = _simplify(_node(filter_), frozenset())
+        self._evaluate = _evaluator(self.plan)
+
+    def __call__(self, event):
+        memo = getattr(event, "memo", None)
+        return self._evaluate(event, {} if memo is None else memo)
+
+    def leaves(self):
+        """ Filters evaluated by the plan. """
+        return [node[1] for node in _walk(self.plan) if node[0] == "leaf"]
+
+    def patterns(self):
+        """ Regular expressions searched by the plan as ``(event data field, pattern)`` pairs. """
+        return [(f._SEARCH_FIELD, f.pattern) for f in self.leaves() if getattr(f, "_SEARCH_FIELD", None)]
+
+    def required_pattern(self):
+        """
+        ``(event data field, pattern)`` the filter can't pass without finding in the field, ``None`` if there's none.
+        """
+        for node in self.plan[1] if self.plan[0] == "and" else (self.plan,):
+            filter_ = node[1] if node[0] == "leaf" else None
+            # Subclasses may override the filter method, its search is then not required.
+            if getattr(filter_, "_SEARCH_FIELD", None) and _owner(type(filter_), "filter") is _owner(
+                type(filter_), "_SEARCH_FIELD"
+            ):
+                return filter_._SEARCH_FIELD, filter_.pattern
+        return None
+
+    def explain(self):
+        lines = []
+        _explain(self.plan, 0, lines)
+        return "\n".join(lines)
+
+
+_TRUE = ("true",)
+_FALSE = ("false",)
+
+
+def _leaf(filter_):
+    return "leaf", filter_
+
+
+def _and(*items):
+    return "and", tuple(i if isinstance(i, tuple) else _leaf(i) for i in items)
+
+
+def _node(filter_):
+    """ Translates filter tree into plan nodes: (and|or, children), (not, child), (leaf, filter), (true|false,). """
+    if isinstance(filter_, AndFilter):
+        return "and", (_node(filter_.filter_1), _node(filter_.filter_2))
+    if isinstance(filter_, OrFilter):
+        return "or", (_node(filter_.filter_1), _node(filter_.filter_2))
+    if isinstance(filter_, AllFilter):
+        return "and", tuple(_node(f) for f in filter_.iterable)
+    if isinstance(filter_, AnyFilter):
+        return "or", tuple(_node(f) for f in filter_.iterable)
+    if isinstance(filter_, InvertFilter):
+        return "not", _node(filter_.filter_)
+    if isinstance(filter_, FilterBase) and _owner(type(filter_), "_plan") is _owner(type(filter_), "filter"):
+        return filter_._plan()
+    return _leaf(filter_)
+
+
+def _owner(cls, name):
+    return next((c for c in cls.__mro__ if name in c.__dict__), None)
+
+
+def _node_key(node):
+    if node[0] == "leaf":
+        return "leaf", _filter_key(node[1])
+    if node[0] == "not":
+        return "not", _node_key(node[1])
+    if node[0] in ("and", "or"):
+        return node[0], tuple(_node_key(n) for n in node[1])
+    return node
+
+
+def _filter_key(filter_):
+    return filter_.key if isinstance(filter_, FilterBase) else filter_
+
+
+def _simplify(node, known):
+    """ Flattens and deduplicates node, ``known`` are keys of leaves known to be true at this point. """
+    kind = node[0]
+    if kind == "leaf":
+        return _TRUE if _filter_key(node[1]) in known else node
+
+    if kind == "not":
+        child = _simplify(node[1], known)
+        if child[0] in ("true", "false"):
+            return _FALSE if child is _TRUE else _TRUE
+        return child[1] if child[0] == "not" else ("not", child)
+
+    if kind not in ("and", "or"):
+        return node
+
+    children = _flatten(kind, node[1])
+    if kind == "and":
+        # Members are evaluated in order, only leaves evaluated before a member are known to be true in it. Leaves
+        # after it may guard it, e.g. the message check of '(Filter.regexp(...) | Filter.sticker) & Filter.message'.
+        simplified = []
+        for child in children:
+            child = _simplify(child, known)
+            simplified.append(child)
+            if child[0] == "leaf":
+                known = known | {_filter_key(child[1])}
+        children = simplified
+    else:
+        children = [_simplify(c, known) for c in children]
+
+    (neutral, absorbing) = (_TRUE, _FALSE) if kind == "and" else (_FALSE, _TRUE)
+    result, seen = [], set()
+    for child in _flatten(kind, children):
+        if child is absorbing:
+            return absorbing
+        key = _node_key(child)
+        if child is not neutral and key not in seen:
+            seen.add(key)
+            result.append(child)
+
+    if not result:
+        return neutral
+    return result[0] if len(result) == 1 else (kind, tuple(result))
+
+
+def _flatten(kind, children):
+    result = []
+    for child in children:
+        result.extend(_flatten(kind, child[1]) if child[0] == kind else (child,))
+    return result
+
+
+def _evaluator(node):
+    return _EVALUATORS[node[0]](node)
+
+
+def _leaf_evaluator(node):
+    (filter_, key) = (node[1], _filter_key(node[1]))
+
+    def evaluate(event, memo):
+        result = memo.get(key)
+        if result is None:
+            result = memo[key] = bool(filter_(event))
+        return result
+
+    return evaluate
+
+
+def _not_evaluator(node):
+    child = _evaluator(node[1])
+
+    def evaluate(event, memo):
+        return not child(event, memo)
+
+    return evaluate
+
+
+def _and_evaluator(node):
+    children = tuple(_evaluator(n) for n in node[1])
+
+    def evaluate(event, memo):
+        for child in children:
+            if not child(event, memo):
+                return False
+        return True
+
+    return evaluate
+
+
+def _or_evaluator(node):
+    children = tuple(_evaluator(n) for n in node[1])
+
+    def evaluate(event, memo):
+        for child in children:
+            if child(event, memo):
+                return True
+        return False
+
+    return evaluate
+
+
+def _constant_evaluator(node):
+    value = node is _TRUE
+
+    def evaluate(event, memo):
+        return value
+
+    return evaluate
+
+
+_EVALUATORS = {
+    "leaf": _leaf_evaluator,
+    "not": _not_evaluator,
+    "and": _and_evaluator,
+    "or": _or_evaluator,
+    "true": _constant_evaluator,
+    "false": _constant_evaluator,
+}
+
+
+def _walk(node):
+    yield node
+    if node[0] == "not":
+        for n in _walk(node[1]):
+            yield n
+    elif node[0] in ("and", "or"):
+        for child in node[1]:
+            for n in _walk(child):
+                yield n
+
+
+def _explain(node, depth, lines):
+    indent = "  " * depth
+    if node[0] == "leaf":
+        lines.append(indent + repr(node[1]))
+    elif node[0] == "not":
+        lines.append(indent + "NOT")
+        _explain(node[1], depth + 1, lines)
+    elif node[0] in ("and", "or"):
+        lines.append(indent + node[0].upper())
+        for child in node[1]:
+            _explain(child, depth + 1, lines)
+    else:
+        lines.append(indent + node[0].upper())
 
 
 class Filter(object):
@@ -2,42 +2,74 @@ from abc import ABCMeta
 
 import six
 
-from .dispatcher import StopDispatching
+from .dispatcher import StopDispatching, invalidate_routes
 from .event import EventType
-from .filter import Filter
+from .filter import Filter, FilterBase
+
+
+def requires_filters(check):
+    """
+    Marks a ``check`` method which passes only if the handler filters pass. Dispatcher doesn't check such handlers for
+    texts the regexp their filters require isn't found in, a ``check`` override without the mark is always called.
+    """
+    check.requires_filters = True
+    return check
 
 
 @six.add_metaclass(ABCMeta)
 class HandlerBase(object):
+    # Event types the handler may accept, None means any. Dispatcher doesn't check the handler for other types.
+    event_types = None
+    # Lowercase command names the handler accepts, dispatcher checks the handler only for messages with these commands.
+    # None is for handlers not handling commands, empty set is for handlers accepting any command.
+    # Handlers changing these after registration must call bot.dispatcher.invalidate_routes.
+    commands = None
+
     def __init__(self, filters=None, callback=None):
         super(HandlerBase, self).__init__()
 
         self.filters = filters
         self.callback = callback
 
+    @property
+    def filters(self):
+        return self._filters
+
+    @filters.setter
+    def filters(self, filters):
+        changed = hasattr(self, "_filters")
+        self._filters = filters
+        self._compiled_filters = filters.compile() if isinstance(filters, FilterBase) else filters
+        if changed:
+            invalidate_routes()
+
+    @requires_filters
     def check(self, event, dispatcher):
-        return bool(not self.filters or self.filters(event))
+        return bool(not self._filters or self._compiled_filters(event))
 
     def handle(self, event, dispatcher):
         if self.callback:
-            self.callback(bot=dispatcher.bot, event=event)
+            return self.callback(bot=dispatcher.bot, event=event)
 
 
 class DefaultHandler(HandlerBase):
     def __init__(self, callback=None):
         super(DefaultHandler, self).__init__(callback=callback)
 
+    @requires_filters
     def check(self, event, dispatcher):
         return super(DefaultHandler, self).check(event=event, dispatcher=dispatcher) and not any(
-            h.check(event=event, dispatcher=dispatcher) for h in dispatcher.handlers if h is not self
+            dispatcher.check(h, event) for h in dispatcher.route(event) if not isinstance(h, DefaultHandler)
         )
 
     def handle(self, event, dispatcher):
-        super(DefaultHandler, self).handle(event=event, dispatcher=dispatcher)
-        raise StopDispatching
+        raise StopDispatching(super(DefaultHandler, self).handle(event=event, dispatcher=dispatcher))
 
 
 class NewChatMembersHandler(HandlerBase):
+    event_types = (EventType.NEW_CHAT_MEMBERS,)
+
+    @requires_filters
     def check(self, event, dispatcher):
         return (
             super(NewChatMembersHandler, self).check(event=event, dispatcher=dispatcher) and
@@ -46,6 +78,9 @@ class NewChatMembersHandler(HandlerBase):
 
 
 class LeftChatMembersHandler(HandlerBase):
+    event_types = (EventType.LEFT_CHAT_MEMBERS,)
+
+    @requires_filters
     def check(self, event, dispatcher):
         return (
             super(LeftChatMembersHandler, self).check(event=event, dispatcher=dispatcher) and
@@ -54,6 +89,9 @@ class LeftChatMembersHandler(HandlerBase):
 
 
 class PinnedMessageHandler(HandlerBase):
+    event_types = (EventType.PINNED_MESSAGE,)
+
+    @requires_filters
     def check(self, event, dispatcher):
         return (
             super(PinnedMessageHandler, self).check(event=event, dispatcher=dispatcher) and
@@ -62,6 +100,9 @@ class PinnedMessageHandler(HandlerBase):
 
 
 class UnPinnedMessageHandler(HandlerBase):
+    event_types = (EventType.UNPINNED_MESSAGE,)
+
+    @requires_filters
     def check(self, event, dispatcher):
         return (
             super(UnPinnedMessageHandler, self).check(event=event, dispatcher=dispatcher) and
@@ -70,6 +111,9 @@ class UnPinnedMessageHandler(HandlerBase):
 
 
 class MessageHandler(HandlerBase):
+    event_types = (EventType.NEW_MESSAGE,)
+
+    @requires_filters
     def check(self, event, dispatcher):
         return (
                 super(MessageHandler, self).check(event=event, dispatcher=dispatcher) and
@@ -78,6 +122,9 @@ class MessageHandler(HandlerBase):
 
 
 class EditedMessageHandler(HandlerBase):
+    event_types = (EventType.EDITED_MESSAGE,)
+
+    @requires_filters
     def check(self, event, dispatcher):
         return (
                 super(EditedMessageHandler, self).check(event=event, dispatcher=dispatcher) and
@@ -86,6 +133,9 @@ class EditedMessageHandler(HandlerBase):
 
 
 class DeletedMessageHandler(HandlerBase):
+    event_types = (EventType.DELETED_MESSAGE,)
+
+    @requires_filters
     def check(self, event, dispatcher):
         return (
                 super(DeletedMessageHandler, self).check(event=event, dispatcher=dispatcher) and
@@ -94,20 +144,57 @@ class DeletedMessageHandler(HandlerBase):
 
 
 class CommandHandler(MessageHandler):
-    def __init__(self, command=None, filters=None, callback=None):
+    def __init__(self, command=None, filters=None, callback=None, aliases=None):
         super(CommandHandler, self).__init__(
             filters=Filter.command if filters is None else Filter.command & filters,
             callback=callback
         )
 
-        self.command = command
+        self._command = command
+        self._aliases = aliases
+        self._commands = _command_names(command, aliases)
 
+    @property
+    def commands(self):
+        return self._commands
+
+    @property
+    def command(self):
+        return self._command
+
+    @command.setter
+    def command(self, command):
+        self._command = command
+        self._commands = _command_names(command, self._aliases)
+        invalidate_routes()
+
+    @property
+    def aliases(self):
+        return self._aliases
+
+    @aliases.setter
+    def aliases(self, aliases):
+        self._aliases = aliases
+        self._commands = _command_names(self._command, aliases)
+        invalidate_routes()
+
+    @requires_filters
     def check(self, event, dispatcher):
-        if super(CommandHandler, self).check(event=event, dispatcher=dispatcher):
-            command = event.data["text"].partition(" ")[0][1:].lower()
-            return not self.command or any((c.lower() == command for c in (
-                (self.command,) if isinstance(self.command, six.string_types) else self.command
-            )))
+        return (
+            event.type == EventType.NEW_MESSAGE and
+            (not self.commands or event.command is not None and event.command.name in self.commands) and
+            super(CommandHandler, self).check(event=event, dispatcher=dispatcher)
+        )
+
+
+def _command_names(command, aliases):
+    return frozenset(c.lower() for c in _names(command) + _names(aliases))
+
+
+def _names(commands):
+    if not commands:
+        return ()
+    return (commands,) if isinstance(commands, six.string_types) else tuple(commands)
 
 
 class HelpCommandHandler(CommandHandler):
@@ -149,18 +236,21 @@ class UnknownCommandHandler(CommandHandler):
     def __init__(self, filters=None, callback=None):
         super(UnknownCommandHandler, self).__init__(filters=filters, callback=callback)
 
+    @requires_filters
     def check(self, event, dispatcher):
         return super(UnknownCommandHandler, self).check(event=event, dispatcher=dispatcher) and not any(
-            h.check(event=event, dispatcher=dispatcher) for h in dispatcher.handlers if
-            isinstance(h, CommandHandler) and h is not self
+            dispatcher.check(h, event) for h in dispatcher.command_route(event) if
+            not isinstance(h, UnknownCommandHandler)
         )
 
     def handle(self, event, dispatcher):
-        super(UnknownCommandHandler, self).handle(event=event, dispatcher=dispatcher)
-        raise StopDispatching
+        raise StopDispatching(super(UnknownCommandHandler, self).handle(event=event, dispatcher=dispatcher))
 
 
 class BotButtonCommandHandler(HandlerBase):
+    event_types = (EventType.CALLBACK_QUERY,)
+
+    @requires_filters
     def check(self, event, dispatcher):
         return (
             super(BotButtonCommandHandler, self).check(event=event, dispatcher=dispatcher) and
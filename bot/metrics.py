@@ -0,0 +1,294 @@
+import logging
+from bisect import bisect_left
+from threading import Lock, Thread
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
+
+from .util import ThreadingHTTPServer
+
+# Default latency buckets, in seconds.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Metric(object):
+    TYPE = None
+
+    def __init__(self, name, help_, labels=()):
+        super(_Metric, self).__init__()
+
+        self.name = name
+        self.help = help_
+        self.labels = tuple(labels)
+
+        self._lock = Lock()
+
+    def samples(self):
+        """ Iterable of ``(suffix, label names, label values, value)``. """
+        raise NotImplementedError
+
+    def expose(self):
+        lines = [
+            "# HELP {} {}".format(self.name, self.help.replace("\\", "\\\\").replace("\n", "\\n")),
+            "# TYPE {} {}".format(self.name, self.TYPE),
+        ]
+        for (suffix, names, values, value) in self.samples():
+            lines.append("{}{}{} {}".format(self.name, suffix, _labels(names, values), _number(value)))
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """ Monotonically increasing value per label values. """
+    TYPE = "counter"
+
+    def __init__(self, name, help_, labels=()):
+        super(Counter, self).__init__(name, help_, labels)
+
+        self._values = {}
+
+    def inc(self, values=(), amount=1):
+        """
+        :param values: Tuple of label values in the order of label names.
+        """
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def get(self, values=()):
+        return self._values.get(values, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return (("", self.labels, values, value) for (values, value) in items)
+
+
+class Histogram(_Metric):
+    """ Distribution of observed values over buckets per label values. """
+    TYPE = "histogram"
+
+    def __init__(self, name, help_, labels=(), buckets=LATENCY_BUCKETS):
+        super(Histogram, self).__init__(name, help_, labels)
+
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, value, values=()):
+        with self._lock:
+            state = self._values.get(values)
+            if state is None:
+                state = self._values[values] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def count(self, values=()):
+        state = self._values.get(values)
+        return sum(state[0]) if state is not None else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((values, (list(counts), total)) for (values, (counts, total)) in self._values.items())
+
+        names = self.labels + ("le",)
+        for (values, (counts, total)) in items:
+            cumulative = 0
+            for (bound, bucket_count) in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield ("_bucket", names, values + (bound,), cumulative)
+            yield ("_sum", self.labels, values, total)
+            yield ("_count", self.labels, values, cumulative)
+
+
+class Gauge(_Metric):
+    """ Value read by a function when metrics are exported, the function returns a number or a dict by label values. """
+    TYPE = "gauge"
+
+    def __init__(self, name, help_, func, labels=()):
+        super(Gauge, self).__init__(name, help_, labels)
+
+        self.func = func
+
+    def samples(self):
+        value = self.func()
+        items = sorted(value.items()) if isinstance(value, dict) else [((), value)]
+        return (("", self.labels, values, v) for (values, v) in items if v is not None)
+
+
+class Registry(object):
+    """ Set of metrics exported together in Prometheus text format. """
+
+    def __init__(self):
+        super(Registry, self).__init__()
+
+        self.log = logging.getLogger(__name__)
+
+        self._metrics = []
+        self._lock = Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_, labels=()):
+        return self.register(Counter(name, help_, labels))
+
+    def histogram(self, name, help_, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_, labels, buckets))
+
+    def gauge(self, name, help_, func, labels=()):
+        """ Registers a gauge reading ``func``, if one is registered under the name already it's kept and returned. """
+        gauge = Gauge(name, help_, func, labels)
+        with self._lock:
+            registered = next((m for m in self._metrics if m.name == name), None)
+            if registered is not None:
+                return registered
+            self._metrics.append(gauge)
+        return gauge
+
+    def expose(self):
+        """ All metrics in Prometheus text exposition format. """
+        with self._lock:
+            metrics = list(self._metrics)
+        return "\n".join(m.expose() for m in metrics) + "\n"
+
+    def serve(self, port=9090, host="127.0.0.1"):
+        """
+        Serves metrics at ``http://host:port/metrics`` from a daemon thread.
+
+        :return: :class:`bot.util.ThreadingHTTPServer`, call its ``shutdown`` to stop serving.
+        """
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+
+                body = registry.expose().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format_, *args):
+                registry.log.debug("Metrics request: " + format_ % args)
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        thread = Thread(target=server.serve_forever, name="metrics")
+        thread.daemon = True
+        thread.start()
+
+        self.log.info("Serving metrics at http://{}:{}/metrics.".format(host, server.server_port))
+        return server
+
+
+class BotMetrics(Registry):
+    """ Metrics of API requests, handlers and polling of a bot. """
+
+    def __init__(self, latency_buckets=LATENCY_BUCKETS):
+        super(BotMetrics, self).__init__()
+
+        self.api_requests = self.counter(
+            "bot_api_requests_total", "API requests by method and HTTP status.", ("endpoint", "status")
+        )
+        self.api_errors = self.counter(
+            "bot_api_errors_total", "API requests failed without response, by exception.", ("endpoint", "error")
+        )
+        self.api_duration = self.histogram(
+            "bot_api_request_duration_seconds", "API request duration.", ("endpoint",), latency_buckets
+        )
+        self.api_sent_bytes = self.counter("bot_api_sent_bytes_total", "Request body bytes.", ("endpoint",))
+        self.api_received_bytes = self.counter(
+            "bot_api_received_bytes_total", "Response body bytes.", ("endpoint",)
+        )
+
+        self.handler_invocations = self.counter(
+            "bot_handler_invocations_total", "Handler invocations.", ("handler",)
+        )
+        self.handler_exceptions = self.counter(
+            "bot_handler_exceptions_total", "Handler invocations which raised an exception.", ("handler",)
+        )
+        self.handler_duration = self.histogram(
+            "bot_handler_duration_seconds", "Handler duration.", ("handler",), latency_buckets
+        )
+
+        self.polling_batch_size = self.histogram(
+            "bot_polling_batch_events", "Events received by one 'events/get'.", (),
+            (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+        )
+        self.polling_empty = self.counter("bot_polling_empty_total", "Polls which returned no events.")
+        self.polling_errors = self.counter("bot_polling_errors_total", "Polls which failed.")
+
+        self.dedup_checked = self.counter("bot_dedup_checked_events_total", "Events checked for duplicates.")
+        self.dedup_duplicates = self.counter(
+            "bot_dedup_duplicate_events_total", "Events skipped as duplicates, by reason.", ("reason",)
+        )
+
+        self._handler_names = {}
+
+    def observe_request(self, endpoint, duration, status=None, error=None, sent=0, received=0):
+        """ Records an API request which got a response with ``status`` or failed with ``error``. """
+        labels = (endpoint,)
+        self.api_duration.observe(duration, labels)
+        if error is not None:
+            self.api_errors.inc((endpoint, type(error).__name__))
+        else:
+            self.api_requests.inc((endpoint, str(status)))
+        if sent:
+            self.api_sent_bytes.inc(labels, sent)
+        if received:
+            self.api_received_bytes.inc(labels, received)
+
+    def observe_handler(self, handler, duration, failed=False):
+        labels = (self.handler_name(handler),)
+        self.handler_invocations.inc(labels)
+        self.handler_duration.observe(duration, labels)
+        if failed:
+            self.handler_exceptions.inc(labels)
+
+    def observe_batch(self, events):
+        self.polling_batch_size.observe(events)
+        if not events:
+            self.polling_empty.inc()
+
+    def observe_dedup(self, reason):
+        """ Records an event checked by :class:`bot.dedup.Deduplicator`, ``reason`` is ``None`` if it's new. """
+        self.dedup_checked.inc()
+        if reason is not None:
+            self.dedup_duplicates.inc((reason,))
+
+    def handler_name(self, handler):
+        """ Handler label: handler class and callback name. """
+        name = self._handler_names.get(handler)
+        if name is None:
+            name = self._handler_names[handler] = handler_name(handler)
+        return name
+
+
+def handler_name(handler):
+    """ Handler class and callback name, for example ``MessageHandler:echo``. """
+    callback = getattr(handler, "callback", None)
+    if callback is None:
+        return type(handler).__name__
+    return "{}:{}".format(
+        type(handler).__name__, getattr(callback, "__qualname__", getattr(callback, "__name__", type(callback).__name__))
+    )
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(n, _label_value(v)) for (n, v) in zip(names, values)) + "}"
+
+
+def _label_value(value):
+    if isinstance(value, float):
+        return _number(value)
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
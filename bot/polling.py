@@ -0,0 +1,143 @@
+import logging
+from collections import deque
+from enum import Enum, unique
+from threading import Condition
+from time import monotonic
+
+
+@unique
+class OverloadPolicy(Enum):
+    """ What :class:`EventQueue` does with a new event when it's full. """
+    # Wait for the dispatcher to take an event, polling stops until then.
+    BLOCK = "block"
+    # Drop the oldest queued event.
+    DROP_OLDEST = "drop_oldest"
+    # Drop the oldest queued event of a sheddable type, or the new event if it's sheddable itself, block otherwise.
+    SHED = "shed"
+
+
+class EventQueue(object):
+    """
+    Bounded queue between the polling thread fetching events and the thread dispatching them.
+
+    The poller puts events right after a batch is fetched and requests the next one at once, so dispatch time no longer
+    delays fetching. Time between putting and taking an event is tracked as fetch-to-dispatch latency.
+    """
+
+    def __init__(self, maxsize=0, policy=OverloadPolicy.BLOCK, shed_types=(), on_drop=None):
+        """
+        :param maxsize: Maximum number of queued events, ``0`` means unbounded.
+        :param policy: :class:`OverloadPolicy` applied when the queue is full.
+        :param shed_types: Event types which may be dropped with :attr:`OverloadPolicy.SHED`.
+        :param on_drop: Called with every dropped event.
+        """
+        super(EventQueue, self).__init__()
+
+        self.log = logging.getLogger(__name__)
+
+        self.maxsize = maxsize
+        self.policy = OverloadPolicy(policy)
+        self.shed_types = frozenset(shed_types or ())
+        self.on_drop = on_drop
+
+        self._items = deque()
+        self._condition = Condition()
+        self._closed = False
+
+        self._put = 0
+        self._taken = 0
+        self._dropped = {}
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._latency_last = 0.0
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def put(self, event):
+        """
+        Queues the event applying the overload policy when the queue is full.
+
+        :return: ``False`` if the event was dropped or the queue is closed.
+        """
+        with self._condition:
+            while not self._closed and self.maxsize and len(self._items) >= self.maxsize:
+                if self.policy is OverloadPolicy.DROP_OLDEST:
+                    self._drop(self._items.popleft()[1])
+                elif self.policy is OverloadPolicy.SHED and self._shed_queued():
+                    continue
+                elif self.policy is OverloadPolicy.SHED and event.type in self.shed_types:
+                    self._drop(event)
+                    return False
+                else:
+                    self._condition.wait()
+
+            if self._closed:
+                return False
+
+            self._items.append((monotonic(), event))
+            self._put += 1
+            self._condition.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """ Takes the oldest event, returns ``None`` on timeout or if the queue is closed and empty. """
+        with self._condition:
+            deadline = None if timeout is None else monotonic() + timeout
+            while not self._items:
+                remaining = None if deadline is None else deadline - monotonic()
+                if self._closed or (remaining is not None and remaining <= 0):
+                    return None
+                self._condition.wait(remaining)
+
+            (put_at, event) = self._items.popleft()
+            self._condition.notify_all()
+
+            latency = monotonic() - put_at
+            self._taken += 1
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+            self._latency_last = latency
+
+            return event
+
+    def close(self):
+        """ Stops accepting events, already queued ones can still be taken. """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                "queue_depth": len(self._items),
+                "capacity": self.maxsize,
+                "policy": self.policy.value,
+                "put": self._put,
+                "dispatched": self._taken,
+                "dropped": sum(self._dropped.values()),
+                "dropped_by_type": {t.value: n for (t, n) in self._dropped.items()},
+                "latency_last_s": self._latency_last,
+                "latency_avg_s": self._latency_total / self._taken if self._taken else 0.0,
+                "latency_max_s": self._latency_max,
+            }
+
+    def _shed_queued(self):
+        """ Drops the oldest queued event of a sheddable type, returns ``False`` if there's none. """
+        for (i, (_, queued)) in enumerate(self._items):
+            if queued.type in self.shed_types:
+                del self._items[i]
+                self._drop(queued)
+                return True
+
+        return False
+
+    def _drop(self, event):
+        self._dropped[event.type] = self._dropped.get(event.type, 0) + 1
+        self.log.warning("Event queue is full, dropping event '{}'.".format(event))
+        if self.on_drop is not None:
+            self.on_drop(event)
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+from threading import Lock, Thread
+
+from urllib3 import PoolManager
+
+from .async_bot import AsyncHTTPSession, aiohttp
+from .bot import Bot, _session_pool_stats
+from .dispatcher import _chat_key
+from .event import parse_events
+from .metrics import BotMetrics
+from .retry import RetryPolicy
+from .worker import WorkerPool
+
+
+class BotPool(object):
+    """
+    Runs many bots in one process with a fixed number of threads.
+
+    Long polls of all bots are made by a single supervisor thread running an :mod:`asyncio` loop, fetched events are
+    dispatched by a shared :class:`bot.worker.WorkerPool` and requests sent by handlers go through one shared
+    :class:`urllib3.PoolManager`. Each bot keeps its own dispatcher, handlers and ``last_event_id``. Events of the same
+    chat of the same bot are dispatched one after another. Bots share :attr:`metrics` and the retry policy unless
+    they are given their own.
+
+    Requires :mod:`aiohttp`, install it with ``pip install mailru-im-bot[async]``.
+    """
+
+    def __init__(self, dispatch_workers=8, max_pending_events=1000, connections=100, bot_class=Bot, metrics=None):
+        """
+        :param dispatch_workers: Number of threads running handlers of all bots.
+        :param max_pending_events: Polling pauses while this many fetched events wait for dispatch.
+        :param connections: Number of kept connections of the shared pool used by handlers.
+        :param metrics: :class:`bot.metrics.BotMetrics` of all bots, serve them with ``pool.metrics.serve(port)``.
+        """
+        super(BotPool, self).__init__()
+
+        if aiohttp is None:
+            raise ImportError("BotPool requires 'aiohttp', install it with 'pip install mailru-im-bot[async]'.")
+
+        self.log = logging.getLogger(__name__)
+
+        self.bot_class = bot_class
+        self.max_pending_events = max_pending_events
+        self.executor = WorkerPool(workers=dispatch_workers, name="bot-pool")
+        self.pool_manager = PoolManager(num_pools=10, maxsize=connections)
+        self.metrics = BotMetrics() if metrics is None else metrics
+        self.retry_policy = RetryPolicy()
+        self.bots = []
+        self.running = False
+
+        self._lock = Lock()
+        self._loop = None
+        self._thread = None
+        self._client = None
+        self._pending = None
+        self._pending_events = 0
+        self._tasks = {}
+
+        self._register_gauges()
+
+    def _register_gauges(self):
+        # Registered before the ones of bots, which don't queue events themselves.
+        metrics = self.metrics
+        metrics.gauge("bot_event_queue_depth", "Fetched events waiting for dispatch.", lambda: self._pending_events)
+        metrics.gauge("bot_dispatcher_queue_depth", "Events waiting for a dispatch worker.",
+                      lambda: self.executor.stats()["queue_depth"])
+        metrics.gauge("bot_dispatcher_busy_workers", "Dispatch workers running handlers.",
+                      lambda: self.executor.stats()["busy_workers"])
+
+    def add_bot(self, token, **kwargs):
+        """
+        Creates a bot sharing threads and connections of the pool, it's polled at once if the pool is running.
+
+        :param kwargs: :class:`bot.bot.Bot` parameters, except for worker and connection pool ones.
+        """
+        kwargs.setdefault("metrics", self.metrics)
+        kwargs.setdefault("retry_policy", self.retry_policy)
+        bot = self.bot_class(token=token, dispatch_workers=0, send_workers=0, pool_manager=self.pool_manager, **kwargs)
+        with self._lock:
+            self.bots.append(bot)
+            if self.running:
+                asyncio.run_coroutine_threadsafe(self._start(bot), self._loop).result()
+        return bot
+
+    def remove_bot(self, bot):
+        """ Stops polling the bot, events already fetched for it are still dispatched. """
+        with self._lock:
+            self.bots.remove(bot)
+            if self.running:
+                asyncio.run_coroutine_threadsafe(self._stop(bot), self._loop).result()
+        bot.deduplicator.save()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+
+            self.log.info("Starting polling of {} bots.".format(len(self.bots)))
+            self.running = True
+            self._loop = asyncio.new_event_loop()
+            self._thread = Thread(target=self._loop.run_forever, name="bot-pool-supervisor")
+            self._thread.daemon = True
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(self._start_all(), self._loop).result()
+
+    def stop(self):
+        """ Stops polling, waits for fetched events to be dispatched. """
+        with self._lock:
+            if not self.running:
+                return
+
+            self.log.info("Stopping bot pool.")
+            self.running = False
+            asyncio.run_coroutine_threadsafe(self._stop_all(), self._loop).result()
+            # Completed dispatches are reported to the loop, it's stopped after the last one.
+            self.executor.join()
+            for bot in self.bots:
+                if bot.checkpointer is not None:
+                    bot.checkpointer.commit()
+                bot.deduplicator.save()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = self._thread = None
+
+        self.executor.stop()
+        self.pool_manager.clear()
+
+    async def _start_all(self):
+        # Every bot holds a long poll connection.
+        self._client = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+        self._pending = asyncio.Semaphore(self.max_pending_events)
+        for bot in self.bots:
+            await self._start(bot)
+
+    async def _stop_all(self):
+        for bot in list(self._tasks):
+            await self._stop(bot)
+        await self._client.close()
+        self._client = None
+
+    async def _start(self, bot):
+        # Bot methods called by the pool return coroutines with this session, handlers keep using blocking sessions.
+        bot.__dict__["polling_session"] = AsyncHTTPSession(bot=bot, pool=bot.polling_pool, client=self._client)
+        if bot.checkpointer is not None:
+            bot._resume_from_checkpoint()
+        bot.deduplicator.load()
+        self._tasks[bot] = asyncio.ensure_future(self._poll(bot))
+        if bot.name is None:
+            self.executor.submit(id(bot), bot._resolve_identity_in_background)
+
+    async def _stop(self, bot):
+        task = self._tasks.pop(bot, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.wait((task,))
+        if bot.checkpointer is not None:
+            # Events still being dispatched are saved by the cadence or fetched again after a restart.
+            bot.checkpointer.commit()
+
+    async def _poll(self, bot):
+        while True:
+            # Exceptions should not stop polling of the bot.
+            # noinspection PyBroadException
+            try:
+                response = await bot._events_get()
+                with bot._polled(bot._update_last_event_id(parse_events(response.content))) as events:
+                    for event in events:
+                        await self._submit(bot, event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await asyncio.sleep(bot._polling_failed(e))
+
+    async def _submit(self, bot, event):
+        await self._pending.acquire()
+        self._pending_events += 1
+        future = self.executor.submit((id(bot), _chat_key(event)), bot.dispatcher.dispatch, event)
+        future.add_done_callback(lambda _: self._loop.call_soon_threadsafe(self._dispatched, self._pending))
+        bot._checkpoint_on_dispatch(event, future)
+
+    def _dispatched(self, pending):
+        self._pending_events -= 1
+        pending.release()
+
+    def stats(self):
+        return {
+            "bots": len(self.bots),
+            "polling": len(self._tasks),
+            "pending_events": self._pending_events,
+            "executor": self.executor.stats(),
+            "connections": _session_pool_stats(self.bots[0].http_session) if self.bots else None,
+        }
@@ -0,0 +1,223 @@
+import cProfile
+import io
+import logging
+import pstats
+import random
+import sys
+import traceback
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from itertools import count
+from threading import Event, Lock, Thread, get_ident
+from time import perf_counter
+
+from .metrics import handler_name
+
+SlowCall = namedtuple("SlowCall", ("kind", "handler", "duration", "running", "stack"))
+SlowCall.__doc__ = """
+Handler ``check`` or ``handle`` call which took longer than the threshold.
+
+``stack`` is the stack of the dispatching thread taken while the call was still running, ``None`` if the call
+finished before the watchdog looked at it. For :class:`bot.async_bot.AsyncBot` it's the stack of the event loop
+thread, which shows the culprit when a callback blocks the loop.
+"""
+
+
+class _Call(object):
+    __slots__ = ("kind", "handler", "thread_id", "started_at", "finished_at", "stack")
+
+    def __init__(self, kind, handler, started_at):
+        self.kind = kind
+        self.handler = handler
+        self.thread_id = get_ident()
+        self.started_at = started_at
+        self.finished_at = None
+        self.stack = None
+
+    def slow_call(self, now):
+        running = self.finished_at is None
+        return SlowCall(
+            self.kind, handler_name(self.handler), (now if running else self.finished_at) - self.started_at, running,
+            self.stack
+        )
+
+
+class Profiler(object):
+    """
+    Timing of handler ``check`` and ``handle`` calls made by :class:`bot.dispatcher.Dispatcher`.
+
+    Calls running longer than ``slow_threshold`` are reported with a snapshot of the stack they are stuck in, taken by
+    a watchdog thread. Optionally a sample of dispatched events is run under :mod:`cProfile`, the profiles are
+    aggregated and can be printed or dumped for ``pstats``/``snakeviz``. Events dispatched by
+    :class:`bot.async_bot.AsyncDispatcher` are timed but not profiled, since their handlers interleave on one thread.
+
+    Enable with :meth:`bot.dispatcher.Dispatcher.enable_profiling` and disable with
+    :meth:`bot.dispatcher.Dispatcher.disable_profiling`, both may be called while the bot is polling.
+    """
+
+    def __init__(self, slow_threshold=1.0, profile_sample_rate=0.0, max_slow_calls=100, rnd=None):
+        """
+        :param slow_threshold: Seconds after which a ``check`` or ``handle`` call is reported as slow.
+        :param profile_sample_rate: Share of dispatched events run under :mod:`cProfile`, from ``0`` to ``1``.
+        :param max_slow_calls: Number of most recent slow calls to keep.
+        """
+        super(Profiler, self).__init__()
+
+        self.log = logging.getLogger(__name__)
+
+        self.slow_threshold = slow_threshold
+        self.profile_sample_rate = profile_sample_rate
+        self.random = rnd or random.Random()
+
+        self._lock = Lock()
+        self._ids = count()
+        self._running = {}
+        self._timings = {}
+        self._slow = deque(maxlen=max_slow_calls)
+        self._slow_count = 0
+        self._profile_stats = None
+        self._profiled = 0
+
+        self._stopping = Event()
+        self._watchdog = None
+
+    def start(self):
+        """ Starts the watchdog thread reporting slow calls while they run. """
+        with self._lock:
+            if self._watchdog is None:
+                self._stopping.clear()
+                self._watchdog = Thread(target=self._watch, name="profiler-watchdog")
+                self._watchdog.daemon = True
+                self._watchdog.start()
+
+    def stop(self):
+        with self._lock:
+            (watchdog, self._watchdog) = (self._watchdog, None)
+        if watchdog is not None:
+            self._stopping.set()
+            watchdog.join()
+
+    @contextmanager
+    def timing(self, kind, handler):
+        """ Times a handler call, ``kind`` is ``"check"`` or ``"handle"``. """
+        call = _Call(kind, handler, perf_counter())
+        call_id = next(self._ids)
+        self._running[call_id] = call
+        try:
+            yield
+        finally:
+            call.finished_at = perf_counter()
+            del self._running[call_id]
+            self._record(call)
+
+    def _record(self, call):
+        duration = call.finished_at - call.started_at
+        with self._lock:
+            timing = self._timings.get((call.kind, call.handler))
+            if timing is None:
+                timing = self._timings[(call.kind, call.handler)] = [0, 0.0, 0.0]
+            timing[0] += 1
+            timing[1] += duration
+            timing[2] = max(timing[2], duration)
+
+            if duration >= self.slow_threshold and call.stack is None:
+                # Finished between two watchdog checks.
+                self._slow.append(call)
+                self._slow_count += 1
+
+        if duration >= self.slow_threshold:
+            self.log.warning("Handler '{}' {} took {:.3f}s.".format(handler_name(call.handler), call.kind, duration))
+
+    def _watch(self):
+        interval = min(max(self.slow_threshold / 4, 0.01), 1.0)
+        while not self._stopping.wait(interval):
+            now = perf_counter()
+            for call in [c for c in list(self._running.values()) if c.stack is None]:
+                if now - call.started_at >= self.slow_threshold:
+                    self._snapshot(call, now)
+
+    def _snapshot(self, call, now):
+        frame = sys._current_frames().get(call.thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+        with self._lock:
+            if call.finished_at is not None:
+                # Already recorded as finished, the stack may belong to something else by now.
+                return
+            call.stack = stack
+            self._slow.append(call)
+            self._slow_count += 1
+
+        self.log.warning("Handler '{}' {} has been running for {:.3f}s:\n{}".format(
+            handler_name(call.handler), call.kind, now - call.started_at, stack
+        ))
+
+    def sampled(self):
+        """ Whether the next dispatched event is profiled. """
+        rate = self.profile_sample_rate
+        return rate > 0 and (rate >= 1 or self.random.random() < rate)
+
+    @contextmanager
+    def profiling(self):
+        """ Runs the block under :mod:`cProfile` and adds its statistics to the aggregated ones. """
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active in this thread.
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                if self._profile_stats is None:
+                    self._profile_stats = pstats.Stats(profile)
+                else:
+                    self._profile_stats.add(profile)
+                self._profiled += 1
+
+    def print_stats(self, sort="cumulative", limit=30, stream=None):
+        """ Prints aggregated profile of sampled events, returns the text if ``stream`` isn't given. """
+        output = stream or io.StringIO()
+        with self._lock:
+            if self._profile_stats is None:
+                output.write("No events were profiled.\n")
+            else:
+                self._profile_stats.stream = output
+                self._profile_stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue() if stream is None else None
+
+    def dump_stats(self, path):
+        """ Saves aggregated profile of sampled events to be loaded with :class:`pstats.Stats`. """
+        with self._lock:
+            if self._profile_stats is None:
+                raise ValueError("No events were profiled.")
+            self._profile_stats.dump_stats(path)
+
+    def slow_calls(self):
+        """ Most recent :class:`SlowCall` records, oldest first. """
+        now = perf_counter()
+        with self._lock:
+            return [c.slow_call(now) for c in self._slow]
+
+    def stats(self):
+        with self._lock:
+            timings = {}
+            for ((kind, handler), (calls, total, longest)) in self._timings.items():
+                # Handlers with the same name are merged.
+                timing = timings.setdefault(kind, {}).setdefault(
+                    handler_name(handler), {"calls": 0, "total_s": 0.0, "max_s": 0.0}
+                )
+                timing["calls"] += calls
+                timing["total_s"] += total
+                timing["max_s"] = max(timing["max_s"], longest)
+                timing["avg_s"] = timing["total_s"] / timing["calls"]
+            return {
+                "check": timings.get("check", {}),
+                "handle": timings.get("handle", {}),
+                "running": len(self._running),
+                "slow_calls": self._slow_count,
+                "profiled_events": self._profiled,
+            }
@@ -0,0 +1,196 @@
+import logging
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from time import monotonic, sleep
+
+from six.moves.urllib.parse import urlsplit, parse_qs
+
+from .util import request_endpoint
+
+RateLimit = namedtuple("RateLimit", ("rate", "burst"))
+RateLimit.__doc__ = """ Token bucket parameters: requests per second and how many requests may go out at once. """
+
+
+class TokenBucket(object):
+    """
+    Token bucket handing out reservations instead of failing.
+
+    Tokens may go negative: each reservation takes a token at once and returns how long the caller has to wait for it,
+    so concurrent callers are spread over time in reservation order.
+    """
+
+    def __init__(self, rate, burst, clock=monotonic):
+        super(TokenBucket, self).__init__()
+
+        self.configured_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.clock = clock
+        self.updated_at = clock()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        if now > self.updated_at:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def reserve(self, now=None):
+        """ Takes a token, returns number of seconds to wait before using it. """
+        now = self.clock() if now is None else now
+        self._refill(now)
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.paused_until - now)
+
+    def throttled(self, retry_after=None, now=None):
+        """ Halves the rate, and stops handing out tokens for ``retry_after`` seconds if given. """
+        now = self.clock() if now is None else now
+        self._refill(now)
+        self.rate = max(self.rate / 2, self.configured_rate / 64)
+        self.tokens = min(self.tokens, 0.0)
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+
+    def succeeded(self):
+        """ Slowly brings the rate back to the configured one after throttling. """
+        if self.rate < self.configured_rate:
+            self.rate = min(self.configured_rate, self.rate + self.configured_rate / 32)
+
+
+class RateLimiter(object):
+    """
+    Client side rate limiting of API requests.
+
+    Every request except polling takes a token from the global bucket, from the bucket of its endpoint if a limit is
+    configured for it, and from the bucket of its ``chatId``. Requests over the limit wait rather than fail.
+
+    Throttling responses (HTTP 429 or ``Retry-After`` header) halve the rates of the affected buckets, successful
+    responses bring them back to the configured values.
+    """
+
+    # Endpoints which are never limited.
+    EXEMPT_ENDPOINTS = frozenset(("events/get",))
+
+    def __init__(self, global_limit=RateLimit(rate=30, burst=30), chat_limit=RateLimit(rate=1, burst=5),
+                 endpoint_limits=None, max_chats=10000, clock=monotonic):
+        """
+        :param global_limit: :class:`RateLimit` of all requests, ``None`` for no limit.
+        :param chat_limit: :class:`RateLimit` of requests to the same chat, ``None`` for no limit.
+        :param endpoint_limits: Additional :class:`RateLimit` per endpoint, for example
+            ``{"messages/sendFile": RateLimit(rate=5, burst=5)}``.
+        :param max_chats: Number of chat buckets to keep, least recently used ones are discarded.
+        """
+        super(RateLimiter, self).__init__()
+
+        self.log = logging.getLogger(__name__)
+
+        self.chat_limit = chat_limit
+        self.max_chats = max_chats
+        self.clock = clock
+
+        self._lock = Lock()
+        self._global = TokenBucket(*global_limit, clock=clock) if global_limit else None
+        self._endpoints = {e: TokenBucket(*limit, clock=clock) for (e, limit) in (endpoint_limits or {}).items()}
+        self._chats = OrderedDict()
+
+        self._requests = 0
+        self._delayed = 0
+        self._waiting = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._throttled = 0
+
+    @staticmethod
+    def request_key(url, params=None):
+        """ Endpoint (for example ``messages/sendText``) and ``chatId`` of a request. """
+        if params is not None:
+            chat_id = params.get("chatId")
+        else:
+            chat_id = parse_qs(urlsplit(url).query).get("chatId", (None,))[0]
+        return request_endpoint(url), chat_id
+
+    def _buckets(self, endpoint, chat_id):
+        buckets = [b for b in (self._global, self._endpoints.get(endpoint)) if b is not None]
+        if chat_id is not None and self.chat_limit:
+            bucket = self._chats.pop(chat_id, None)
+            if bucket is None:
+                bucket = TokenBucket(*self.chat_limit, clock=self.clock)
+                while len(self._chats) >= self.max_chats:
+                    self._chats.popitem(last=False)
+            self._chats[chat_id] = bucket
+            buckets.append(bucket)
+        return buckets
+
+    def reserve(self, endpoint, chat_id=None):
+        """ Takes tokens for the request, returns number of seconds to wait before sending it. """
+        if endpoint in self.EXEMPT_ENDPOINTS:
+            return 0.0
+
+        with self._lock:
+            now = self.clock()
+            wait = max([b.reserve(now) for b in self._buckets(endpoint, chat_id)] or [0.0])
+
+            self._requests += 1
+            if wait > 0:
+                self._delayed += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+
+        return wait
+
+    def acquire(self, endpoint, chat_id=None):
+        """ Blocks until the request may be sent. """
+        wait = self.reserve(endpoint, chat_id)
+        if wait > 0:
+            self.log.debug("Rate limit reached, delaying '{}' request by {:.3f}s.".format(endpoint, wait))
+            with self._lock:
+                self._waiting += 1
+            try:
+                sleep(wait)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+
+    def update(self, endpoint, chat_id, status_code, headers=None):
+        """ Adapts rates to the response of the request. """
+        if endpoint in self.EXEMPT_ENDPOINTS:
+            return
+
+        retry_after = _retry_after(headers)
+        with self._lock:
+            buckets = [
+                b for b in (self._global, self._endpoints.get(endpoint), self._chats.get(chat_id)) if b is not None
+            ]
+            if status_code == 429 or retry_after is not None:
+                self._throttled += 1
+                # Throttling of a chat shouldn't slow down the others.
+                chat = self._chats.get(chat_id)
+                for bucket in ([chat] if chat is not None else buckets):
+                    bucket.throttled(retry_after=retry_after)
+                self.log.warning("Request '{}' was throttled by server, reducing rate.".format(endpoint))
+            else:
+                for bucket in buckets:
+                    bucket.succeeded()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "delayed": self._delayed,
+                "waiting": self._waiting,
+                "wait_total_s": self._wait_total,
+                "wait_max_s": self._wait_max,
+                "wait_avg_s": self._wait_total / self._delayed if self._delayed else 0.0,
+                "throttled": self._throttled,
+                "global_rate": self._global.rate if self._global is not None else None,
+                "chats": len(self._chats),
+            }
+
+
+def _retry_after(headers):
+    value = (headers or {}).get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,170 @@
+import logging
+import random
+from threading import Lock
+from time import monotonic
+
+
+# Jitter doesn't need a generator of its own, backoffs share this one.
+_RANDOM = random.Random()
+
+
+class Backoff(object):
+    """ Exponential backoff with full jitter: delay is random between zero and ``base * 2 ** attempt``, up to ``cap``. """
+
+    def __init__(self, base=0.5, cap=30.0, rnd=None):
+        super(Backoff, self).__init__()
+
+        self.base = base
+        self.cap = cap
+        self.random = rnd or _RANDOM
+
+    def delay(self, attempt):
+        return self.random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+class RetryPolicy(object):
+    """
+    Decides whether a failed API request is sent again.
+
+    Requests failing with a connection or timeout error or a 5xx status are retried if the endpoint is idempotent:
+    reading methods (``get*``) and methods setting something to a given value. Other requests, such as sending a
+    message, are only retried when the connection couldn't be established, so the request surely wasn't delivered.
+
+    Throttled requests (HTTP 429) weren't processed by the server, so they are retried whatever the endpoint after the
+    ``Retry-After`` the server asked for. Throttling asking to wait longer than the backoff cap is left to the caller.
+    """
+
+    IDEMPOTENT_ENDPOINTS = frozenset((
+        "events/get", "messages/editText", "messages/deleteMessages", "chats/sendActions", "chats/setTitle",
+        "chats/setAbout", "chats/setRules", "chats/pinMessage", "chats/unpinMessage", "chats/blockUser",
+        "chats/unblockUser",
+    ))
+    RETRY_STATUSES = frozenset((500, 502, 503, 504))
+    THROTTLED_STATUS = 429
+
+    def __init__(self, retries=2, backoff=None, idempotent_endpoints=None):
+        """
+        :param retries: Maximum number of repeated attempts.
+        :param backoff: :class:`Backoff` between attempts.
+        :param idempotent_endpoints: Endpoints which are safe to repeat in addition to ``*/get*`` ones.
+        """
+        super(RetryPolicy, self).__init__()
+
+        self.retries = retries
+        self.backoff = backoff or Backoff()
+        self.idempotent_endpoints = (
+            self.IDEMPOTENT_ENDPOINTS if idempotent_endpoints is None else frozenset(idempotent_endpoints)
+        )
+
+    def is_idempotent(self, endpoint):
+        return endpoint.rpartition("/")[2].startswith("get") or endpoint in self.idempotent_endpoints
+
+    def should_retry(self, endpoint, attempt, status_code=None, connect_error=False, retry_after=None):
+        """
+        :param attempt: Number of already repeated attempts.
+        :param status_code: Response status, ``None`` if request failed with an error.
+        :param connect_error: Request failed because connection couldn't be established.
+        :param retry_after: Seconds from the ``Retry-After`` header of the response, ``None`` if there's none.
+        """
+        if attempt >= self.retries:
+            return False
+        if connect_error:
+            return True
+        if status_code == self.THROTTLED_STATUS:
+            return retry_after is None or retry_after <= self.backoff.cap
+        return (status_code is None or status_code in self.RETRY_STATUSES) and self.is_idempotent(endpoint)
+
+    def delay(self, attempt, retry_after=None):
+        """ Seconds to wait before the next attempt, ``retry_after`` if the server asked for it. """
+        return retry_after if retry_after is not None else self.backoff.delay(attempt)
+
+
+class CircuitOpenError(Exception):
+    """ Request wasn't sent because its endpoint failed too many times in a row recently. """
+    pass
+
+
+class _Circuit(object):
+    __slots__ = ("failures", "opened_at", "trial")
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = None
+        # When the trial request was let through, None if there's no trial.
+        self.trial = None
+
+
+class CircuitBreaker(object):
+    """
+    Fails requests fast when an endpoint is degraded.
+
+    After ``failure_threshold`` consecutive failures of an endpoint its circuit opens and requests to it raise
+    :class:`CircuitOpenError` without being sent. After ``reset_timeout`` seconds a single trial request is let
+    through: its success closes the circuit, its failure opens it for another ``reset_timeout``. A trial ended without
+    an outcome (see :meth:`release`) or not recorded within ``reset_timeout`` lets another one through.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=monotonic):
+        super(CircuitBreaker, self).__init__()
+
+        self.log = logging.getLogger(__name__)
+
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+
+        self._lock = Lock()
+        self._circuits = {}
+        self._rejected = 0
+
+    def before(self, endpoint):
+        """ Raises :class:`CircuitOpenError` if the request must not be sent. """
+        with self._lock:
+            circuit = self._circuits.get(endpoint)
+            if circuit is None or circuit.opened_at is None:
+                return
+
+            now = self.clock()
+            trial_over = circuit.trial is None or now - circuit.trial >= self.reset_timeout
+            if trial_over and now - circuit.opened_at >= self.reset_timeout:
+                circuit.trial = now
+                return
+
+            self._rejected += 1
+
+        raise CircuitOpenError("Circuit of endpoint '{}' is open after {} failures.".format(endpoint, circuit.failures))
+
+    def record(self, endpoint, success):
+        with self._lock:
+            circuit = self._circuits.get(endpoint)
+            if success:
+                if circuit is not None:
+                    if circuit.opened_at is not None:
+                        self.log.info("Circuit of endpoint '{}' is closed.".format(endpoint))
+                    del self._circuits[endpoint]
+                return
+
+            if circuit is None:
+                circuit = self._circuits[endpoint] = _Circuit()
+            circuit.failures += 1
+            if circuit.trial is not None or (circuit.opened_at is None and circuit.failures >= self.failure_threshold):
+                self.log.warning("Circuit of endpoint '{}' is open after {} failures.".format(
+                    endpoint, circuit.failures
+                ))
+                circuit.opened_at = self.clock()
+            circuit.trial = None
+
+    def release(self, endpoint):
+        """ The request let through by :meth:`before` ended without an outcome, e.g. it was cancelled. """
+        with self._lock:
+            circuit = self._circuits.get(endpoint)
+            if circuit is not None:
+                circuit.trial = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open": sorted(e for (e, c) in self._circuits.items() if c.opened_at is not None),
+                "failing": {e: c.failures for (e, c) in self._circuits.items()},
+                "rejected": self._rejected,
+            }
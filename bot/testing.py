@@ -0,0 +1,332 @@
+""" Local stand-in for the Bot API to test and load-test bots without the real server. """
+import json
+import logging
+import random
+from collections import deque, namedtuple
+from itertools import count
+from threading import Condition, Lock, Thread
+from time import monotonic, sleep, time
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
+from six.moves.urllib.parse import parse_qs, urlsplit
+
+from .util import ThreadingHTTPServer, request_endpoint
+
+FaultProfile = namedtuple("FaultProfile", ("latency", "jitter", "error_rate", "error_status", "throttle_rate",
+                                           "retry_after"))
+FaultProfile.__new__.__defaults__ = (0.0, 0.0, 0.0, 500, 0.0, 1)
+FaultProfile.__doc__ = """
+Behaviour of an endpoint of :class:`MockBotServer`: seconds of ``latency`` plus random ``jitter`` before responding,
+share of requests failing with ``error_status`` and share of requests throttled with HTTP 429 and ``Retry-After``.
+"""
+
+Call = namedtuple("Call", ("method", "endpoint", "params", "body", "status", "received_at"))
+Call.__doc__ = """ Request received by :class:`MockBotServer`, ``params`` are query parameters with single values. """
+
+BOT_USER_ID = "100000"
+
+
+def text_message(rnd):
+    """ Default event factory of :class:`EventSource`: text message from one of 100 private chats. """
+    chat_id = "{}@chat.agent".format(rnd.randint(1, 100))
+    msg_id = rnd.randint(10 ** 16, 10 ** 17)
+    return "newMessage", {
+        "msgId": str(msg_id),
+        "chat": {"chatId": chat_id, "type": "private"},
+        "from": {"userId": chat_id, "firstName": "Name"},
+        "timestamp": int(time()),
+        "text": "Message {}".format(msg_id),
+    }
+
+
+class EventSource(object):
+    """
+    Events served by ``events/get`` of :class:`MockBotServer`.
+
+    Events are generated at ``rate`` per second starting with the first fetch, and can be pushed explicitly. Fetching
+    long-polls like the real API: it waits up to ``pollTime`` for an event newer than ``lastEventId``.
+    """
+
+    def __init__(self, rate=0.0, total=None, factory=text_message, batch_size=100, history=10000, seed=0,
+                 clock=monotonic):
+        """
+        :param rate: Generated events per second, ``0`` to only serve pushed events, ``float("inf")`` to generate
+            events as fast as they are fetched.
+        :param total: Number of events to generate, ``None`` means no limit.
+        :param factory: Called with a :class:`random.Random`, returns event type and payload, for example one of
+            ``benchmark.payloads.GENERATORS``.
+        :param batch_size: Maximum number of events in one response.
+        :param history: Number of served events kept to be fetched again with an older ``lastEventId``.
+        """
+        super(EventSource, self).__init__()
+
+        self.rate = rate
+        self.total = total
+        self.factory = factory
+        self.batch_size = batch_size
+        self.history = history
+        self.random = random.Random(seed)
+        self.clock = clock
+
+        self._condition = Condition()
+        self._events = []
+        self._first_id = 1
+        self._started_at = None
+        self._generated = 0
+
+    @property
+    def last_event_id(self):
+        return self._first_id + len(self._events) - 1
+
+    def push(self, type_, payload):
+        """ Adds an event to be served, returns its id. """
+        with self._condition:
+            event_id = self._append(type_, payload)
+            self._condition.notify_all()
+        return event_id
+
+    def _append(self, type_, payload):
+        event_id = self.last_event_id + 1
+        self._events.append({"eventId": event_id, "type": type_, "payload": payload})
+        if len(self._events) > 2 * self.history:
+            del self._events[:-self.history]
+            self._first_id = event_id - len(self._events) + 1
+        return event_id
+
+    def _generate(self, now, limit):
+        """ Generates events due by now, at most ``limit``, returns seconds until the next one is due. """
+        remaining = float("inf") if self.total is None else self.total - self._generated
+        if not self.rate or remaining <= 0:
+            return None
+
+        elapsed = now - self._started_at
+        due = remaining if self.rate == float("inf") else int(elapsed * self.rate) - self._generated
+        for _ in range(int(max(0, min(due, limit, remaining)))):
+            self._generated += 1
+            self._append(*self.factory(self.random))
+
+        if self.rate == float("inf") or self._generated == self.total:
+            return None
+        return max(0.0, (self._generated + 1) / self.rate - elapsed)
+
+    def fetch(self, last_event_id, timeout=0.0):
+        """ Events newer than ``last_event_id``, waits up to ``timeout`` seconds for one to appear. """
+        deadline = self.clock() + timeout
+        with self._condition:
+            if self._started_at is None:
+                self._started_at = self.clock()
+
+            while True:
+                now = self.clock()
+                start = max(0, last_event_id - self._first_id + 1)
+                next_due = self._generate(now, self.batch_size - (len(self._events) - start))
+                events = self._events[start:start + self.batch_size]
+                if events or now >= deadline:
+                    return events
+
+                wait = deadline - now
+                self._condition.wait(wait if next_due is None else min(wait, next_due))
+
+
+class MockBotServer(object):
+    """
+    Threaded HTTP server answering Bot API requests with plausible responses.
+
+    Every request is recorded as :class:`Call`, latency, errors and throttling are injected per endpoint with
+    :class:`FaultProfile`. Use as a context manager or call :meth:`start` and :meth:`stop`::
+
+        with MockBotServer(events=EventSource(rate=1000)) as server:
+            bot = Bot(token=server.token, api_url_base=server.url)
+    """
+
+    RESPONSES = {
+        "self/get": {"userId": BOT_USER_ID, "nick": "test_bot", "firstName": "test_bot", "about": "", "photo": []},
+        "chats/getInfo": {"type": "private", "firstName": "first", "lastName": "last", "about": "some text",
+                          "language": "en"},
+        "chats/getAdmins": {"admins": [{"userId": BOT_USER_ID, "creator": True}]},
+        "chats/getMembers": {"members": [{"userId": BOT_USER_ID}]},
+        "chats/getBlockedUsers": {"users": []},
+        "chats/getPendingUsers": {"users": []},
+        "chats/createChat": {"sn": "1@chat.agent"},
+        "files/getInfo": {"type": "image", "size": 1024, "filename": "image.png", "url": "http://localhost/image.png"},
+    }
+    # Endpoints responding with the id of the sent message.
+    SENDING_ENDPOINTS = frozenset(("messages/sendText", "messages/sendFile", "messages/sendVoice"))
+
+    def __init__(self, host="localhost", port=0, token=None, events=None, profiles=None, responses=None,
+                 max_calls=100000, seed=0):
+        """
+        :param token: Token accepted by the server, ``None`` accepts any token.
+        :param events: :class:`EventSource` of ``events/get``, by default serving pushed events only.
+        :param profiles: :class:`FaultProfile` by endpoint, ``"*"`` applies to endpoints not listed.
+        :param responses: Response bodies by endpoint in addition to :attr:`RESPONSES`, either dicts or functions
+            called with the request parameters returning a dict.
+        :param max_calls: Number of most recent calls kept, ``0`` disables recording.
+        """
+        super(MockBotServer, self).__init__()
+
+        self.log = logging.getLogger(__name__)
+
+        self.host = host
+        self.port = port
+        self.token = token or "mock.token"
+        self._check_token = token is not None
+        self.events = events or EventSource()
+        self.profiles = dict(profiles or {})
+        self.responses = dict(self.RESPONSES, **(responses or {}))
+        self.random = random.Random(seed)
+
+        self._lock = Lock()
+        self._calls = deque(maxlen=max_calls) if max_calls else None
+        self._counts = {}
+        self._message_ids = count(1)
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        """ Value for ``api_url_base`` of :class:`bot.bot.Bot`. """
+        return "http://{}:{}".format(self.host, self.port)
+
+    def start(self):
+        server = self
+
+        class Handler(_RequestHandler):
+            mock = server
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_port
+        self._thread = Thread(target=self._server.serve_forever, name="mock-bot-api")
+        self._thread.daemon = True
+        self._thread.start()
+        self.log.info("Mock Bot API is listening at {}.".format(self.url))
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def set_profile(self, endpoint, profile):
+        """ Changes behaviour of the endpoint (``"*"`` for all others), ``None`` restores normal responses. """
+        with self._lock:
+            if profile is None:
+                self.profiles.pop(endpoint, None)
+            else:
+                self.profiles[endpoint] = profile
+
+    def calls(self, endpoint=None):
+        """ Recorded :class:`Call` list, oldest first, optionally of a single endpoint. """
+        with self._lock:
+            calls = list(self._calls or ())
+        return calls if endpoint is None else [c for c in calls if c.endpoint == endpoint]
+
+    def clear_calls(self):
+        with self._lock:
+            if self._calls is not None:
+                self._calls.clear()
+            self._counts.clear()
+
+    def wait_for_calls(self, endpoint, number, timeout=5.0):
+        """ Waits until the endpoint received ``number`` requests, returns whether it did. """
+        deadline = monotonic() + timeout
+        while self._counts.get(endpoint, 0) < number:
+            if monotonic() >= deadline:
+                return False
+            sleep(0.005)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {"requests": dict(self._counts), "last_event_id": self.events.last_event_id}
+
+    def _profile(self, endpoint):
+        profiles = self.profiles
+        return profiles.get(endpoint) or profiles.get("*")
+
+    def respond(self, method, endpoint, params, body):
+        """ Status, headers and body of the response to a request, records the request. """
+        (status, headers, response) = self._respond(endpoint, params)
+        with self._lock:
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+            if self._calls is not None:
+                self._calls.append(Call(method, endpoint, params, body, status, time()))
+        return status, headers, json.dumps(response).encode("utf-8")
+
+    def _respond(self, endpoint, params):
+        if self._check_token and params.get("token") != self.token:
+            return 200, {}, {"ok": False, "description": "Invalid token"}
+
+        profile = self._profile(endpoint)
+        if profile is not None:
+            delay = profile.latency + (self.random.uniform(0, profile.jitter) if profile.jitter else 0.0)
+            if delay > 0:
+                sleep(delay)
+            roll = self.random.random()
+            if roll < profile.throttle_rate:
+                return 429, {"Retry-After": str(profile.retry_after)}, {"ok": False, "description": "Too many requests"}
+            if roll < profile.throttle_rate + profile.error_rate:
+                return profile.error_status, {}, {"ok": False, "description": "Internal error"}
+
+        if endpoint == "events/get":
+            events = self.events.fetch(
+                last_event_id=int(params.get("lastEventId") or 0), timeout=float(params.get("pollTime") or 0)
+            )
+            return 200, {}, {"ok": True, "events": events}
+
+        response = self.responses.get(endpoint)
+        if callable(response):
+            response = response(params)
+        response = dict(response or {})
+        if endpoint in self.SENDING_ENDPOINTS:
+            response.setdefault("msgId", str(next(self._message_ids)))
+        if endpoint in ("messages/sendFile", "messages/sendVoice"):
+            response.setdefault("fileId", params.get("fileId") or "0dLYa000aKKIK2dDtkRxLB5c9a27b91ae")
+        response.setdefault("ok", True)
+        return 200, {}, response
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, with Nagle's algorithm every keep-alive response waits for an ACK.
+    disable_nagle_algorithm = True
+    mock = None
+
+    def do_GET(self):
+        self._do()
+
+    def do_POST(self):
+        self._do()
+
+    def _do(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        params = {k: v[0] for (k, v) in parse_qs(url.query).items()}
+        if self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+            params.update((k, v[0]) for (k, v) in parse_qs(body.decode("utf-8")).items())
+
+        (status, headers, response) = self.mock.respond(self.command, request_endpoint(url.path), params, body)
+
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(response)))
+            for (name, value) in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(response)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client gave up waiting, for example a cancelled long poll.
+            self.close_connection = True
+
+    def log_message(self, format_, *args):
+        self.mock.log.debug("Mock Bot API request: " + format_ % args)
@@ -1,13 +1,32 @@
+import json
+import os
 import signal
+import sys
 from collections import namedtuple
 
 from baseconv import BaseConverter
+from six.moves.BaseHTTPServer import HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+from six.moves.urllib.parse import urlsplit
+
+try:
+    # Optional faster decoder for 'events/get' responses.
+    import orjson as _json
+except ImportError:
+    import json as _json
 
 from .constant import ImageType, VideoType, AudioType
 
+json_loads = _json.loads
+
 BASE62_CONVERTER = BaseConverter("0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ")
 
 
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    """ HTTP server handling each request in a daemon thread, ``http.server.ThreadingHTTPServer`` is Python 3.7+. """
+    daemon_threads = True
+
+
 def decode_file_id(file_id):
     file_type = file_id[0]
     for t in (ImageType, VideoType, AudioType):
@@ -43,6 +62,11 @@ def decode_file_id(file_id):
 _signals = {getattr(signal, n): n for n in dir(signal) if n.startswith("SIG") and "_" not in n}
 
 
+def request_endpoint(url):
+    """ API method of the request URL, for example ``messages/sendText``. """
+    return "/".join(urlsplit(url).path.rstrip("/").split("/")[-2:])
+
+
 def signal_name_by_code(code):
     return _signals[code]
 
@@ -54,3 +78,52 @@ def invalidate_cached_property(o, name):
 
 def wrap(string, length):
     return (string[i:i + length] for i in range(0, len(string), length))
+
+
+def deep_getsizeof(o):
+    """ Size in bytes of object and everything it references through containers and slots, each object counted once. """
+    seen = set()
+    size = 0
+    stack = [o]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        else:
+            for cls in type(o).__mro__:
+                for slot in getattr(cls, "__slots__", ()):
+                    if hasattr(o, slot):
+                        stack.append(getattr(o, slot))
+
+    return size
+
+
+def write_json_atomically(path, data, fsync=True):
+    """
+    Writes JSON to a temporary file and renames it over ``path``, so a crash leaves either the old or new file.
+
+    :param fsync: Flush the file and, on POSIX, the directory entry of the rename to disk before returning.
+    """
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary, "w") as f:
+        json.dump(data, f, sort_keys=True)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+    # The rename is only durable once the directory is synced too, directories can't be opened so on Windows.
+    if fsync and os.name == "posix":
+        directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
@@ -0,0 +1,59 @@
+import random
+import re
+from itertools import count
+
+from .util import request_endpoint
+
+
+class WireLog(object):
+    """
+    Settings of HTTP exchange logging done by :class:`bot.bot.LoggingHTTPAdapter` at DEBUG level.
+
+    Nothing is computed for an exchange unless DEBUG is enabled, the endpoint is enabled and the exchange is sampled.
+    """
+
+    _TOKEN_REGEXP = re.compile(r"\btoken=[^&\s\"']+")
+
+    def __init__(self, sample_rate=1.0, sample_every=1, endpoints=None, max_body_bytes=4096, redact=True):
+        """
+        :param sample_rate: Probability of an exchange to be logged.
+        :param sample_every: Only every Nth exchange is logged.
+        :param endpoints: API methods to log (for example ``{"messages/sendText"}``), ``None`` means all.
+        :param max_body_bytes: Bodies are truncated to this size, ``None`` means no limit.
+        :param redact: Replace bot token with ``***``.
+        """
+        super(WireLog, self).__init__()
+
+        self.sample_rate = sample_rate
+        self.sample_every = sample_every
+        self.endpoints = frozenset(endpoints) if endpoints is not None else None
+        self.max_body_bytes = max_body_bytes
+        self.redact = redact
+
+        self._counter = count()
+
+    def sampled(self, url):
+        """ Whether the exchange with the URL is logged. """
+        if self.endpoints is not None and request_endpoint(url) not in self.endpoints:
+            return False
+        if self.sample_every > 1 and next(self._counter) % self.sample_every:
+            return False
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def body(self, body, encoding=None):
+        """ Body as text, truncated to ``max_body_bytes``. """
+        if body is None:
+            return None
+
+        (size, truncated) = (len(body), self.max_body_bytes is not None and len(body) > self.max_body_bytes)
+        if truncated:
+            body = body[:self.max_body_bytes]
+        if isinstance(body, bytes):
+            body = body.decode(encoding or "utf-8", errors="replace")
+        if truncated:
+            body += u"... [{} bytes total]".format(size)
+
+        return self.text(body)
+
+    def text(self, text):
+        return self._TOKEN_REGEXP.sub("token=***", text) if self.redact and "token=" in text else text
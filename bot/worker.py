@@ -0,0 +1,116 @@
+import logging
+from concurrent.futures import Future
+from threading import Thread, Lock
+from time import monotonic
+
+from six.moves import queue
+
+
+class WorkerPool(object):
+    """
+    Fixed set of worker threads with a queue per worker.
+
+    Tasks are sharded by key: tasks submitted with the same key always go to the same worker and are executed in
+    submission order, tasks with different keys run concurrently.
+    """
+
+    _STOP = object()
+
+    def __init__(self, workers, max_queue_size=0, name="bot-worker"):
+        super(WorkerPool, self).__init__()
+
+        if workers < 1:
+            raise ValueError("Worker pool needs at least one worker, got {}.".format(workers))
+
+        self.log = logging.getLogger(__name__)
+
+        self.workers = workers
+        self.name = name
+
+        self._queues = [queue.Queue(maxsize=max_queue_size) for _ in range(workers)]
+        self._threads = []
+        self._lock = Lock()
+        self._busy_since = [None] * workers
+        self._busy_time = [0.0] * workers
+        self._completed = [0] * workers
+        self._started_at = None
+
+    @property
+    def running(self):
+        return bool(self._threads)
+
+    def start(self):
+        with self._lock:
+            if not self._threads:
+                self._started_at = monotonic()
+                for (index, q) in enumerate(self._queues):
+                    thread = Thread(target=self._work, args=(index, q), name="{}-{}".format(self.name, index))
+                    thread.daemon = True
+                    thread.start()
+                    self._threads.append(thread)
+
+    def stop(self, wait=True):
+        """ Stops workers after all already submitted tasks are done. """
+        with self._lock:
+            threads, self._threads = self._threads, []
+            for q in (self._queues if threads else ()):
+                q.put(WorkerPool._STOP)
+
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def submit(self, key, fn, *args, **kwargs):
+        """ Schedules ``fn(*args, **kwargs)`` on the worker owning ``key``, blocks while its queue is full. """
+        if not self._threads:
+            self.start()
+
+        future = Future()
+        self._queues[hash(key) % self.workers].put((future, fn, args, kwargs))
+        return future
+
+    def join(self):
+        """ Blocks until every submitted task is done. """
+        for q in self._queues:
+            q.join()
+
+    def stats(self):
+        now = monotonic()
+        elapsed = max(now - self._started_at, 1e-9) if self._started_at is not None else None
+        depths = [q.qsize() for q in self._queues]
+        busy_time = [
+            t + (now - since if since is not None else 0.0) for (t, since) in zip(self._busy_time, self._busy_since)
+        ]
+
+        return {
+            "workers": self.workers,
+            "queue_depth": sum(depths),
+            "queue_depths": depths,
+            "busy_workers": sum(1 for since in self._busy_since if since is not None),
+            "completed": sum(self._completed),
+            "utilization": sum(busy_time) / (elapsed * self.workers) if elapsed else 0.0,
+            "worker_utilization": [t / elapsed for t in busy_time] if elapsed else [0.0] * self.workers,
+        }
+
+    def _work(self, index, q):
+        while True:
+            task = q.get()
+            try:
+                if task is WorkerPool._STOP:
+                    return
+
+                (future, fn, args, kwargs) = task
+                if future.set_running_or_notify_cancel():
+                    self._busy_since[index] = monotonic()
+                    # noinspection PyBroadException
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        self.log.exception("Exception in worker '{}'.".format(self.name))
+                        future.set_exception(e)
+                    finally:
+                        self._busy_time[index] += monotonic() - self._busy_since[index]
+                        self._busy_since[index] = None
+                        self._completed[index] += 1
+            finally:
+                q.task_done()
@@ -0,0 +1,20 @@
+import asyncio
+
+from bot.async_bot import AsyncBot
+from bot.handler import MessageHandler
+
+TOKEN = ""  # your token here
+
+
+async def message_cb(bot, event):
+    await bot.send_text(chat_id=event.from_chat, text=event.text)
+
+
+async def main():
+    bot = AsyncBot(token=TOKEN)
+    bot.dispatcher.add_handler(MessageHandler(callback=message_cb))
+    await bot.start_polling()
+    await bot.idle()
+
+
+asyncio.run(main())
@@ -0,0 +1,17 @@
+from bot.event import Event, EventType
+
+
+def message(text="hello", chat_id="c", msg_id=None, event_id=None, parts=None, **data):
+    """
+    New message event as received from 'events/get', ``msgId`` is the text by default and ``text=None`` leaves it out.
+
+    :param data: Other payload fields.
+    """
+    payload = {"msgId": text if msg_id is None else msg_id, "chat": {"chatId": chat_id, "type": "private"}}
+    payload["from"] = {"userId": "u"}
+    if text is not None:
+        payload["text"] = text
+    if parts is not None:
+        payload["parts"] = parts
+    payload.update(data)
+    return Event(type_=EventType.NEW_MESSAGE, data=payload, event_id=event_id)
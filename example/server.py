@@ -1,7 +1,12 @@
 # Python 3 server example
+import argparse
+import logging
 from http.server import BaseHTTPRequestHandler, HTTPServer
+from time import sleep
 import urllib.parse as urlparse
 
+from bot.testing import EventSource, FaultProfile, MockBotServer
+
 
 hostName = "localhost"
 serverPort = 8080
@@ -134,5 +139,25 @@ def startServer():
     webServer.server_close()
 
 
+def startMockServer(argv=None):
+    """ Serves the full mock Bot API, see bot.testing.MockBotServer. """
+    parser = argparse.ArgumentParser(description="Mock Bot API server.")
+    parser.add_argument("--port", type=int, default=serverPort)
+    parser.add_argument("--rate", type=float, default=1.0, help="generated events per second")
+    parser.add_argument("--latency", type=float, default=0.0, help="response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with HTTP 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests failing with HTTP 429")
+    args = parser.parse_args(argv)
+
+    profile = FaultProfile(latency=args.latency, error_rate=args.error_rate, throttle_rate=args.throttle_rate)
+    with MockBotServer(host=hostName, port=args.port, events=EventSource(rate=args.rate), profiles={"*": profile}):
+        try:
+            while True:
+                sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
 if __name__ == "__main__":
-    startServer()
+    logging.basicConfig(level=logging.INFO)
+    startMockServer()
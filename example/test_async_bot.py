@@ -0,0 +1,172 @@
+import asyncio
+from http.server import HTTPServer
+from threading import Thread
+
+import pytest
+
+from bot.event import EventType
+from bot.handler import MessageHandler, EditedMessageHandler, DefaultHandler
+from bot.polling import OverloadPolicy
+from bot.retry import CircuitBreaker
+from bot.testing import MockBotServer
+
+import server
+
+pytest.importorskip("aiohttp")
+
+from bot.async_bot import AsyncBot  # noqa: E402
+
+TOKEN = "XXX.XXXXXXXXXX.XXXXXXXXXX:XXXXXXXXX"
+
+
+@pytest.fixture(scope="module")
+def api_url():
+    web_server = HTTPServer(("localhost", 0), server.MyServer)
+    thread = Thread(target=web_server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    yield "http://localhost:{}".format(web_server.server_port)
+
+    web_server.shutdown()
+    web_server.server_close()
+
+
+def test_async_methods(api_url):
+    async def run():
+        bot = AsyncBot(token=TOKEN, api_url_base=api_url, is_myteam=True)
+        try:
+            info = await bot.get_chat_info("XXXXX")
+            created = await bot.create_chat(name="test")
+            sent = await bot.send_file(chat_id="XXXXX", file=b"x" * 100, caption="caption")
+            response = await bot.events_get(1, 0)
+            assert bot.user_agent.startswith("bot/base")
+            await bot.resolve_identity()
+            stats = bot.pool_stats()
+            assert stats["http_session"]["requests"] == 3 and stats["http_session"]["in_flight"] == 0
+        finally:
+            await bot.close_sessions()
+
+        return bot, info, created, sent, response
+
+    bot, info, created, sent, response = asyncio.run(run())
+
+    assert info.json()["ok"] and info.json()["about"] == "some text"
+    assert created.json()["ok"] and sent.json()["ok"]
+    assert len(response.json()["events"]) == 2
+    assert bot.last_event_id == 2
+    assert bot.user_agent.startswith("test_bot/base")
+
+
+def test_async_polling(api_url):
+    replies = []
+
+    async def message_cb(bot, event):
+        response = await bot.send_text(chat_id=event.from_chat, text=event.text)
+        replies.append(response.json()["ok"])
+
+    def edited_message_cb(bot, event):
+        replies.append(event.data["editedTimestamp"])
+
+    async def default_cb(bot, event):
+        replies.append("default")
+
+    async def run():
+        bot = AsyncBot(token=TOKEN, api_url_base=api_url, name="test", poll_time_s=1)
+        bot.dispatcher.add_handler(DefaultHandler(callback=default_cb))
+        bot.dispatcher.add_handler(MessageHandler(callback=message_cb))
+        bot.dispatcher.add_handler(EditedMessageHandler(callback=edited_message_cb))
+
+        await bot.start_polling()
+        while len(replies) < 2:
+            await asyncio.sleep(0.01)
+        await bot.stop()
+        await bot.idle()
+
+    asyncio.run(asyncio.wait_for(run(), timeout=10))
+
+    assert replies[:2] == [True, 1546290099]
+
+
+@pytest.mark.parametrize("policy, shed_types, expected", (
+    (OverloadPolicy.BLOCK, (), ["1", "2", "3", "4", "5"]),
+    (OverloadPolicy.DROP_OLDEST, (), ["4", "5"]),
+    (OverloadPolicy.SHED, (EventType.NEW_MESSAGE,), ["4", "5"]),
+    (OverloadPolicy.SHED, (EventType.CALLBACK_QUERY,), ["1", "2", "3", "4", "5"]),
+))
+def test_async_overload_policy(policy, shed_types, expected):
+    received = []
+
+    async def run():
+        release = asyncio.Event()
+
+        async def handler(bot, event):
+            received.append(event.data["msgId"])
+            await release.wait()
+
+        with MockBotServer(token="secret") as server:
+            for msg_id in ("1", "2", "3", "4", "5"):
+                server.events.push("newMessage", {
+                    "msgId": msg_id, "text": "hi", "chat": {"chatId": "c", "type": "private"}, "from": {"userId": "u"}
+                })
+
+            bot = AsyncBot(
+                token="secret", api_url_base=server.url, name="bot", poll_time_s=1, event_queue_size=2,
+                overload_policy=policy, shed_event_types=shed_types
+            )
+            bot.dispatcher.add_handler(MessageHandler(callback=handler))
+            await bot.start_polling()
+            try:
+                while not received:
+                    await asyncio.sleep(0.01)
+                # The whole batch is submitted before the first event of the chat is dispatched.
+                assert received == expected[:1] and bot.dispatcher.pending == 2
+
+                release.set()
+                while len(received) < len(expected):
+                    await asyncio.sleep(0.01)
+                await bot.dispatcher.join()
+            finally:
+                await bot.stop()
+
+            return bot.stats()["event_queue"]
+
+    stats = asyncio.run(asyncio.wait_for(run(), timeout=10))
+
+    assert received == expected
+    assert stats["capacity"] == 2 and stats["dropped"] == 5 - len(expected)
+
+
+def test_cancelled_trial_does_not_keep_circuit_open(api_url):
+    now = [0.0]
+
+    async def run():
+        bot = AsyncBot(
+            token=TOKEN, api_url_base=api_url, name="test",
+            circuit_breaker=CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        )
+        bot.circuit_breaker.record("chats/getInfo", success=False)
+        now[0] += 10
+
+        started = asyncio.Event()
+        send = bot.http_session._send
+
+        async def hanging_send(**kwargs):
+            started.set()
+            await asyncio.sleep(60)
+
+        bot.http_session._send = hanging_send
+        try:
+            trial = asyncio.ensure_future(bot.get_chat_info("XXXXX"))
+            await started.wait()
+            trial.cancel()
+            await asyncio.wait((trial,))
+
+            bot.http_session._send = send
+            return await bot.get_chat_info("XXXXX")
+        finally:
+            await bot.close_sessions()
+
+    response = asyncio.run(asyncio.wait_for(run(), timeout=10))
+
+    assert response.json()["ok"]
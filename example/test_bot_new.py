@@ -76,3 +76,11 @@ def test_plug_error():
 
 def test_plug_ok():
     pass
+
+
+def test_user_agent_does_not_call_api():
+    new_bot = Bot(token=TOKEN, api_url_base=API_URL)
+
+    assert new_bot.user_agent.startswith(Bot.FALLBACK_NAME + "/base")
+    assert new_bot.resolve_identity().startswith("test_bot/base")
+    assert new_bot.user_agent.startswith("test_bot/base")
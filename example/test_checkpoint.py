@@ -0,0 +1,144 @@
+import json
+import os
+import stat
+from threading import Lock, Event as ThreadingEvent
+
+import pytest
+
+from bot.bot import Bot
+from bot.checkpoint import Checkpointer, FileCheckpointStore, SQLiteCheckpointStore
+from bot.event import Event, EventBatch, EventType
+from bot.handler import MessageHandler
+from bot.testing import MockBotServer
+from bot.util import write_json_atomically
+
+
+def batch(*event_ids, last_event_id=None):
+    events = [Event(EventType.NEW_MESSAGE, {}, event_id=i) for i in event_ids]
+    return EventBatch(events, event_ids[-1] if last_event_id is None else last_event_id, {})
+
+
+class MemoryStore(object):
+    def __init__(self):
+        self.saved = []
+
+    def load(self, key):
+        return self.saved[-1] if self.saved else None
+
+    def save(self, key, event_id):
+        self.saved.append(event_id)
+
+
+def test_watermark():
+    now = [0.0]
+    store = MemoryStore()
+    checkpointer = Checkpointer(store, key="bot", every_events=3, interval_s=10, clock=lambda: now[0])
+
+    checkpointer.fetched(batch(1, 2, 3))
+    checkpointer.done(2)
+    checkpointer.done(3)
+    # Event 1 is still being dispatched.
+    assert checkpointer.watermark is None
+
+    checkpointer.done(1)
+    assert checkpointer.watermark == 3 and store.saved == [3]
+
+    # Event 6 was of an unknown type and skipped by parsing.
+    checkpointer.fetched(batch(4, 5, last_event_id=6))
+    checkpointer.done(4)
+    checkpointer.maybe_commit()
+    assert checkpointer.watermark == 4 and store.saved == [3]
+
+    now[0] = 10
+    checkpointer.maybe_commit()
+    assert store.saved == [3, 4]
+
+    checkpointer.done(5)
+    checkpointer.commit()
+    assert store.saved == [3, 4, 6]
+    assert checkpointer.stats() == {"watermark": 6, "committed": 6, "in_flight": 0, "commits": 3}
+
+
+def test_watermark_with_event_fetched_twice():
+    store = MemoryStore()
+    checkpointer = Checkpointer(store, key="bot", every_events=1000, interval_s=1000)
+
+    # The API delivered event 5 again in the next batch.
+    checkpointer.fetched(batch(4, 5))
+    checkpointer.fetched(batch(5, 6))
+    for event_id in (4, 5, 5, 6):
+        checkpointer.done(event_id)
+
+    assert checkpointer.watermark == 6 and checkpointer.stats()["in_flight"] == 0
+    checkpointer.commit()
+    assert store.saved == [6]
+
+
+@pytest.mark.parametrize("store_class", (FileCheckpointStore, SQLiteCheckpointStore))
+def test_stores(tmp_path, store_class):
+    path = str(tmp_path / "checkpoints")
+    store = store_class(path)
+    assert store.load("a") is None
+    store.save("a", 10)
+    store.save("b", 20)
+    store.save("a", 30)
+    store.close()
+
+    store = store_class(path)
+    assert (store.load("a"), store.load("b")) == (30, 20)
+    store.close()
+
+
+@pytest.mark.skipif(os.name != "posix", reason="directories are synced on POSIX only")
+def test_write_json_atomically_syncs_file_and_directory(tmp_path, monkeypatch):
+    (synced, fsync) = ([], os.fsync)
+
+    def recording_fsync(fd):
+        synced.append("directory" if stat.S_ISDIR(os.fstat(fd).st_mode) else "file")
+        fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", recording_fsync)
+    path = str(tmp_path / "data.json")
+    write_json_atomically(path, {"a": 1})
+    write_json_atomically(path, {"a": 2}, fsync=False)
+
+    assert synced == ["file", "directory"]
+    with open(path) as f:
+        assert json.load(f) == {"a": 2}
+    assert os.listdir(str(tmp_path)) == ["data.json"]
+
+
+def test_bot_resumes_from_checkpoint(tmp_path):
+    store = FileCheckpointStore(str(tmp_path / "checkpoints.json"))
+    (lock, received, all_received) = (Lock(), [], ThreadingEvent())
+
+    def handler(bot, event):
+        with lock:
+            received.append(event.data["msgId"])
+            if len(received) % 3 == 0:
+                all_received.set()
+
+    def message(msg_id):
+        return "newMessage", {"msgId": msg_id, "chat": {"chatId": "c", "type": "private"}, "from": {"userId": "u"}}
+
+    with MockBotServer(token="secret") as server:
+        for msg_ids in (("1", "2", "3"), ("4", "5", "6")):
+            for msg_id in msg_ids:
+                server.events.push(*message(msg_id))
+
+            all_received.clear()
+            bot = Bot(
+                token="secret", api_url_base=server.url, name="bot", poll_time_s=1, dispatch_workers=2,
+                checkpointer=Checkpointer(store, every_events=1000, interval_s=1000)
+            )
+            bot.dispatcher.add_handler(MessageHandler(callback=handler))
+            bot.start_polling()
+            try:
+                assert all_received.wait(5)
+            finally:
+                bot.stop()
+
+            assert store.load(bot.uin) == server.events.last_event_id
+
+    # The second bot didn't dispatch events of the first one again.
+    assert sorted(received) == ["1", "2", "3", "4", "5", "6"]
@@ -0,0 +1,89 @@
+from threading import Event as ThreadingEvent
+
+from bot.bot import Bot
+from bot.dedup import Deduplicator, RecentKeys
+from bot.handler import MessageHandler
+from bot.testing import MockBotServer
+from bot.util import deep_getsizeof
+
+from conftest import message
+
+
+def test_recent_keys():
+    keys = RecentKeys(3)
+    assert [keys.add(k) for k in (1, 2, 1, 3, 4)] == [True, True, False, True, True]
+    assert keys.keys() == [2, 3, 4] and len(keys) == 3 and 1 not in keys
+    assert keys.add(1)
+
+    disabled = RecentKeys(0)
+    assert disabled.add(1) and disabled.add(1) and len(disabled) == 0
+
+    # Memory grows with the keys, not with the capacity.
+    assert deep_getsizeof(vars(RecentKeys(100000))) < 2000
+
+
+def test_deduplicator(tmp_path):
+    path = str(tmp_path / "dedup.json")
+    deduplicator = Deduplicator(capacity=100, path=path)
+    deduplicator.sent("c", "10", "echo")
+
+    assert deduplicator.check(message(msg_id="1", event_id=1)) is None
+    # Redelivered batch.
+    assert deduplicator.check(message(msg_id="1", event_id=1)) == "event"
+    # Same message under another event id.
+    assert deduplicator.check(message(msg_id="1", event_id=2)) == "message"
+    # Message sent by the bot delivered back, with another text it's a different message.
+    assert deduplicator.check(message("echo", msg_id="10", event_id=3)) == "sent"
+    assert deduplicator.check(message("echo", msg_id="11", event_id=4)) is None
+
+    stats = deduplicator.stats()
+    assert stats["checked"] == 5 and stats["duplicates_by_reason"] == {"event": 1, "message": 1, "sent": 1}
+    assert stats["hit_rate"] == 0.6
+
+    deduplicator.save()
+    restarted = Deduplicator(capacity=100, path=path)
+    restarted.load()
+    assert restarted.check(message(msg_id="11", event_id=4)) == "event"
+    assert restarted.check(message("echo", msg_id="10", event_id=5)) == "sent"
+
+
+def test_disabled_deduplicator():
+    deduplicator = Deduplicator(capacity=0)
+    deduplicator.sent("c", "10", "echo")
+
+    assert deduplicator.check(message("echo", msg_id="10", event_id=1)) is None
+    assert deduplicator.check(message("echo", msg_id="10", event_id=1)) is None
+
+
+def test_bot_skips_duplicates():
+    received = []
+    done = ThreadingEvent()
+
+    def handler(bot, event):
+        received.append(event.data["text"])
+        if event.data["text"] == "last":
+            done.set()
+
+    def push(server, msg_id, text):
+        server.events.push("newMessage", {
+            "msgId": msg_id, "text": text, "chat": {"chatId": "c", "type": "private"}, "from": {"userId": "u"}
+        })
+
+    with MockBotServer(token="secret") as server:
+        bot = Bot(token="secret", api_url_base=server.url, name="bot", poll_time_s=1)
+        bot.dispatcher.add_handler(MessageHandler(callback=handler))
+        sent_msg_id = bot.send_text(chat_id="c", text="echo").json()["msgId"]
+
+        push(server, "100", "first")
+        push(server, "100", "first")
+        push(server, sent_msg_id, "echo")
+        push(server, "101", "last")
+        bot.start_polling()
+        try:
+            assert done.wait(5)
+        finally:
+            bot.stop()
+
+    assert received == ["first", "last"]
+    assert bot.stats()["deduplicator"]["duplicates_by_reason"] == {"message": 1, "sent": 1}
+    assert bot.metrics.dedup_checked.get() == 4 and bot.metrics.dedup_duplicates.get(("sent",)) == 1
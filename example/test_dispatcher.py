@@ -0,0 +1,221 @@
+from threading import Event as ThreadingEvent
+from time import sleep
+
+from bot.dispatcher import Dispatcher
+from bot.handler import MessageHandler
+
+from conftest import message
+
+
+def test_worker_pool_keeps_chat_order():
+    dispatcher = Dispatcher(bot=None, workers=4)
+    received = {}
+
+    def message_cb(bot, event):
+        sleep(0.001)
+        received.setdefault(event.from_chat, []).append(int(event.text))
+
+    dispatcher.add_handler(MessageHandler(callback=message_cb))
+    futures = [dispatcher.submit(message(str(i), chat_id="chat{}".format(i % 5))) for i in range(100)]
+    for future in futures:
+        future.result(timeout=10)
+
+    stats = dispatcher.stats()
+    dispatcher.stop()
+
+    assert sorted(received) == ["chat{}".format(i) for i in range(5)]
+    for (chat, numbers) in received.items():
+        assert numbers == sorted(numbers) and len(numbers) == 20
+    assert stats["workers"] == 4 and stats["completed"] == 100 and stats["queue_depth"] == 0
+    assert 0 < stats["utilization"] <= 1
+
+
+def test_slow_chat_does_not_block_others():
+    dispatcher = Dispatcher(bot=None, workers=2)
+    started, release = ThreadingEvent(), ThreadingEvent()
+    fast = []
+
+    def message_cb(bot, event):
+        if event.from_chat == "slow":
+            started.set()
+            release.wait(timeout=10)
+        else:
+            fast.append(event.text)
+
+    dispatcher.add_handler(MessageHandler(callback=message_cb))
+    slow_future = dispatcher.submit(message("0", chat_id="slow"))
+    started.wait(timeout=10)
+    # Find a chat served by the other worker.
+    other = next(c for c in ("chat{}".format(i) for i in range(100)) if hash(c) % 2 != hash("slow") % 2)
+    dispatcher.submit(message("1", chat_id=other)).result(timeout=10)
+
+    assert fast == ["1"] and not slow_future.done()
+    assert dispatcher.stats()["busy_workers"] == 1
+
+    release.set()
+    slow_future.result(timeout=10)
+    dispatcher.stop()
+
+
+def test_inline_dispatch_without_workers():
+    dispatcher = Dispatcher(bot=None)
+    received = []
+    dispatcher.add_handler(MessageHandler(callback=lambda bot, event: received.append(event.text)))
+
+    assert dispatcher.submit(message("hello", chat_id="chat")).done()
+    assert received == ["hello"]
+    assert dispatcher.stats() == {"workers": 0, "queue_depth": 0}
+
+
+def test_routing_by_event_type():
+    from bot.handler import BotButtonCommandHandler, NewChatMembersHandler, DefaultHandler
+
+    dispatcher = Dispatcher(bot=None)
+    checked = []
+
+    class CountingHandler(NewChatMembersHandler):
+        def check(self, event, dispatcher):
+            checked.append(self)
+            return super(CountingHandler, self).check(event=event, dispatcher=dispatcher)
+
+    members_handlers = [CountingHandler() for _ in range(50)]
+    for handler in members_handlers:
+        dispatcher.add_handler(handler)
+    message_handler = MessageHandler()
+    button_handler = BotButtonCommandHandler()
+    default_handler = DefaultHandler()
+    for handler in (message_handler, button_handler, default_handler):
+        dispatcher.add_handler(handler)
+
+    event = message("hello", chat_id="chat")
+    assert dispatcher.route(event) == (message_handler, default_handler)
+
+    dispatcher.dispatch(event)
+    assert checked == []
+
+    dispatcher.remove_handler(message_handler)
+    assert dispatcher.route(event) == (default_handler,)
+    assert len(dispatcher.handlers) == 52
+
+
+def test_handlers_modified_while_dispatching():
+    from threading import Thread
+
+    dispatcher = Dispatcher(bot=None)
+    handlers = [MessageHandler(callback=lambda bot, event: None) for _ in range(100)]
+
+    def modify():
+        for _ in range(20):
+            for handler in handlers:
+                dispatcher.add_handler(handler)
+            for handler in handlers:
+                dispatcher.remove_handler(handler)
+
+    thread = Thread(target=modify)
+    thread.start()
+    while thread.is_alive():
+        # Dispatcher logs and swallows exceptions, so catch them with a handler checking the snapshot.
+        route = dispatcher.route(message("hello", chat_id="chat"))
+        assert len(set(route)) == len(route)
+        dispatcher.dispatch(message("hello", chat_id="chat"))
+    thread.join()
+
+    assert dispatcher.handlers == ()
+
+
+def test_command_routing():
+    from bot.filter import Filter
+    from bot.handler import CommandHandler, UnknownCommandHandler, HelpCommandHandler
+
+    dispatcher = Dispatcher(bot=None)
+    received = []
+    checked = []
+
+    class CountingCommandHandler(CommandHandler):
+        def check(self, event, dispatcher):
+            checked.append(self.command)
+            return super(CountingCommandHandler, self).check(event=event, dispatcher=dispatcher)
+
+    def callback(name):
+        return lambda bot, event: received.append(
+            (name,) + ((event.command.name, event.command.args) if event.command else ())
+        )
+
+    dispatcher.add_handler(UnknownCommandHandler(callback=callback("unknown")))
+    for i in range(200):
+        dispatcher.add_handler(CountingCommandHandler(command="cmd{}".format(i), callback=callback("cmd{}".format(i))))
+    dispatcher.add_handler(HelpCommandHandler(callback=callback("help")))
+    dispatcher.add_handler(CommandHandler(command="start", aliases=("Begin", "go"), callback=callback("start")))
+    dispatcher.add_handler(
+        CommandHandler(command="admin", filters=Filter.sender(user_id="owner"), callback=callback("admin"))
+    )
+    dispatcher.add_handler(MessageHandler(callback=callback("message")))
+
+    for text in ("/help me", "/BEGIN now", ".go", "/cmd7 x", "/nope", "/admin", "hello"):
+        dispatcher.dispatch(message(text, chat_id="chat"))
+
+    assert received == [
+        ("help", "help", "me"), ("message", "help", "me"),
+        ("start", "begin", "now"), ("message", "begin", "now"),
+        ("start", "go", ""), ("message", "go", ""),
+        ("cmd7", "cmd7", "x"), ("message", "cmd7", "x"),
+        ("unknown", "nope", ""),
+        ("unknown", "admin", ""),
+        ("message",),
+    ]
+    assert checked == ["cmd7"]
+
+
+def test_command_changed_after_registration():
+    from bot.handler import CommandHandler
+
+    dispatcher = Dispatcher(bot=None)
+    received = []
+    handler = CommandHandler(command="old", callback=lambda bot, event: received.append(event.command.name))
+    dispatcher.add_handler(handler)
+    dispatcher.dispatch(message("/old", chat_id="chat"))
+
+    handler.command = "New"
+    handler.aliases = ["alias"]
+    assert handler.commands == {"new", "alias"}
+    for text in ("/old", "/new", "/alias"):
+        dispatcher.dispatch(message(text, chat_id="chat"))
+
+    assert received == ["old", "new", "alias"]
+
+
+def test_filters_evaluated_once_per_event():
+    from collections import Counter
+
+    from bot.filter import FilterBase
+    from bot.handler import CommandHandler, UnknownCommandHandler, DefaultHandler
+
+    calls = Counter()
+
+    class CountingFilter(FilterBase):
+        def __init__(self, name, result):
+            super(CountingFilter, self).__init__()
+            self.name = name
+            self.result = result
+
+        def filter(self, event):
+            calls[self.name] += 1
+            return self.result
+
+    dispatcher = Dispatcher(bot=None)
+    defaults = []
+    dispatcher.add_handler(DefaultHandler(callback=lambda bot, event: defaults.append(event.text)))
+    dispatcher.add_handler(DefaultHandler(callback=lambda bot, event: defaults.append("second")))
+    dispatcher.add_handler(UnknownCommandHandler(filters=CountingFilter("unknown", True)))
+    for i in range(10):
+        dispatcher.add_handler(MessageHandler(filters=CountingFilter("message{}".format(i), False)))
+        dispatcher.add_handler(CommandHandler(command="cmd", filters=CountingFilter("command{}".format(i), False)))
+
+    dispatcher.dispatch(message("hello", chat_id="chat"))
+    assert defaults == ["hello"]
+    assert calls and max(calls.values()) == 1
+
+    calls.clear()
+    dispatcher.dispatch(message("/cmd", chat_id="chat"))
+    assert defaults == ["hello"]
+    assert calls["unknown"] == 1 and max(calls.values()) == 1
@@ -0,0 +1,105 @@
+import copy
+import json
+import pickle
+
+from bot.event import EventType, parse_events
+
+
+def test_parse_events():
+    body = json.dumps({"ok": True, "events": [
+        {"eventId": 7, "type": "newMessage", "payload": {
+            "msgId": "1", "text": "hi", "chat": {"chatId": "c", "type": "private"}
+        }},
+        {"eventId": 9, "type": "unknownType", "payload": {}},
+        {"eventId": 8, "type": "deletedMessage", "payload": {"msgId": "1", "chat": {"chatId": "c", "type": "private"}}},
+    ]}).encode("utf-8")
+
+    batch = parse_events(body)
+
+    assert [e.type for e in batch.events] == [EventType.NEW_MESSAGE, EventType.DELETED_MESSAGE]
+    assert batch.events[0].text == "hi" and batch.events[0].from_chat == "c"
+    assert batch.last_event_id == 9
+    assert batch.data["ok"] is True
+
+
+def test_parse_empty_events():
+    batch = parse_events(b'{"ok": false, "description": "Invalid token"}')
+
+    assert batch.events == [] and batch.last_event_id is None
+    assert batch.data["description"] == "Invalid token"
+
+
+def test_typed_lazy_events():
+    from bot.event import Event, MessageEvent, CallbackQueryEvent, ChatMembersEvent, PinEvent
+
+    chat = {"chatId": "c", "type": "group"}
+    message = Event(type_=EventType.NEW_MESSAGE, data={"msgId": "1", "text": "hi", "chat": chat, "from": {"userId": "u"}})
+    callback = Event(type_=EventType.CALLBACK_QUERY, data={
+        "queryId": "SVR:123:456", "callbackData": "data", "message": {"msgId": "2", "chat": chat}
+    })
+    members = Event(type_=EventType.LEFT_CHAT_MEMBERS, data={"chat": chat, "leftMembers": [{"userId": "u"}]})
+    pin = Event(type_=EventType.PINNED_MESSAGE, data={"chat": chat, "msgId": "3"})
+
+    assert isinstance(message, MessageEvent) and isinstance(message, Event)
+    assert not hasattr(message, "__dict__")
+    assert (message.msgId, message.text, message.format) == ("1", "hi", None)
+    assert (message.from_chat, message.chat_type, message.message_author) == ("c", "group", {"userId": "u"})
+    assert message.data["text"] == "hi"
+
+    assert isinstance(callback, CallbackQueryEvent)
+    assert (callback.msgId, callback.callback_query, callback.queryId) == ("2", "data", "SVR:123:456")
+    assert (callback.from_chat, callback.message_author) == ("c", "123")
+
+    assert isinstance(members, ChatMembersEvent) and members.members == [{"userId": "u"}]
+    assert isinstance(pin, PinEvent) and (pin.msgId, pin.from_chat) == ("3", "c")
+
+    message.text = "changed"
+    assert message.text == "changed" and message.data["text"] == "hi"
+    assert message.memory_footprint() > 0
+
+
+def test_part_index():
+    from bot.constant import Parts, PayLoadFileType
+    from bot.event import Event
+
+    chat = {"chatId": "c", "type": "group"}
+    message = Event(type_=EventType.NEW_MESSAGE, data={"msgId": "1", "chat": chat, "parts": [
+        {"type": "file", "payload": {"fileId": "f", "type": "image"}},
+        {"type": "mention", "payload": {"userId": "42"}},
+        {"type": "newPartType", "payload": {"type": "newFileType"}},
+    ]})
+    plain = Event(type_=EventType.NEW_MESSAGE, data={"msgId": "2", "chat": chat, "text": "hi"})
+
+    index = message.part_index
+    assert index.types == {Parts.FILE, Parts.MENTION}
+    assert index.file_types == {PayLoadFileType.IMAGE}
+    assert index.mentions == {"42"}
+    assert message.part_index is index
+
+    assert not (plain.part_index.types or plain.part_index.file_types or plain.part_index.mentions)
+
+
+def test_part_index_with_list_payload():
+    from bot.constant import Parts
+    from bot.event import Event
+    from bot.filter import Filter
+
+    keyboard = [[{"text": "OK", "callbackData": "ok"}]]
+    message = Event(type_=EventType.NEW_MESSAGE, data={"msgId": "1", "chat": {"chatId": "c", "type": "private"}, "parts": [
+        {"type": "inlineKeyboardMarkup", "payload": keyboard}, {"type": "mention", "payload": ["42"]},
+    ]})
+
+    assert message.part_index.types == {Parts.MENTION}
+    assert not (message.part_index.file_types or message.part_index.mentions)
+    assert not (Filter.image(message) or Filter.file(message) or Filter.mention("42")(message))
+
+
+def test_copy_and_pickle():
+    from bot.event import Event, MessageEvent
+
+    event = Event(type_=EventType.NEW_MESSAGE, data={"msgId": "1", "text": "hi", "chat": {"chatId": "c"}}, event_id=7)
+    assert event.text == "hi"
+
+    for clone in (copy.copy(event), copy.deepcopy(event), pickle.loads(pickle.dumps(event))):
+        assert type(clone) is MessageEvent
+        assert (clone.type, clone.data, clone.event_id, clone.text) == (event.type, event.data, 7, "hi")
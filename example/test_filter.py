@@ -0,0 +1,235 @@
+import random
+import re
+
+from bot.dispatcher import Dispatcher
+from bot.event import Event, EventType
+from bot.filter import AllFilter, AnyFilter, Filter, FilterBase, PatternSet
+from bot.handler import MessageHandler, requires_filters
+
+from conftest import message
+
+
+def file_part(type_=None):
+    payload = {"fileId": "0dLYa000aKKIK2dDtkRxLB5c9a27b91ae"}
+    if type_:
+        payload["type"] = type_
+    return {"type": "file", "payload": payload}
+
+
+EVENTS = [
+    message(),
+    message("/start now"),
+    message(" .help"),
+    message("12345"),
+    message("https://mail.ru"),
+    message("https://files.icq.net/get/1", parts=[file_part("image")]),
+    message("caption", parts=[file_part("video")]),
+    message("caption", parts=[file_part("audio")]),
+    message("caption", parts=[file_part()]),
+    message("", parts=[{"type": "sticker", "payload": {"fileId": "2IWuJzaNWCJZxJWCvZhDYuJ5XDsr7hU"}}]),
+    message("@[42] hi", parts=[{"type": "mention", "payload": {"userId": "42"}}]),
+    message("fwd", parts=[{"type": "forward", "payload": {"message": {}}}]),
+    message("re", parts=[{"type": "reply", "payload": {"message": {}}}]),
+    Event(type_=EventType.CALLBACK_QUERY, data={
+        "queryId": "SVR:1:2", "callbackData": "data_1", "message": {"chat": {"chatId": "c", "type": "private"}}
+    }),
+    Event(type_=EventType.DELETED_MESSAGE, data={"msgId": "1", "chat": {"chatId": "c", "type": "private"}}),
+]
+
+FILTERS = [
+    Filter.message, Filter.command, Filter.file, Filter.image, Filter.video, Filter.audio, Filter.media, Filter.data,
+    Filter.sticker, Filter.url, Filter.text, Filter.regexp(r"^\d+$"), Filter.mention(), Filter.mention("42"),
+    Filter.forward, Filter.reply, Filter.sender("u"), Filter.callback_data("data_1"),
+    Filter.callback_data_regexp("data_\\d"), ~~Filter.text, Filter.url & ~Filter.sticker,
+    Filter.mention() & ~Filter.mention("42"), Filter.text | Filter.media | Filter.command,
+]
+
+
+def test_compiled_filters_are_equivalent():
+    for filter_ in FILTERS:
+        compiled = filter_.compile()
+        for event in EVENTS:
+            event.memo = {}
+            assert compiled(event) == bool(filter_(event)), (filter_, event)
+
+
+def _outcome(filter_, event):
+    event.memo = {}
+    try:
+        return bool(filter_(event))
+    except Exception as e:
+        return type(e)
+
+
+def _random_filter(rnd, depth):
+    if depth == 0 or rnd.random() < 0.3:
+        return rnd.choice(FILTERS[:19])
+
+    kind = rnd.choice(("and", "or", "not", "all", "any"))
+    if kind == "not":
+        return ~_random_filter(rnd, depth - 1)
+    children = [_random_filter(rnd, depth - 1) for _ in range(rnd.randint(2, 3))]
+    if kind == "all":
+        return AllFilter(children)
+    if kind == "any":
+        return AnyFilter(children)
+    combined = children[0]
+    for child in children[1:]:
+        combined = combined & child if kind == "and" else combined | child
+    return combined
+
+
+def _random_event(rnd):
+    if rnd.random() < 0.1:
+        return rnd.choice(EVENTS[-2:])
+
+    # Texts missing or of another type, as in stickers and some service messages.
+    text = rnd.choice((None, None, 42, "", "hello", "/start now", "12345", "https://mail.ru", "data_1"))
+    parts = rnd.sample([
+        file_part("image"), file_part("video"), file_part(), {"type": "sticker", "payload": {"fileId": "s"}},
+        {"type": "mention", "payload": {"userId": "42"}}, {"type": "forward", "payload": {"message": {}}},
+        {"type": "reply", "payload": {"message": {}}},
+    ], rnd.randint(0, 2))
+    event = message(text, parts=parts or None)
+    if rnd.random() < 0.2:
+        del event.data["from"]
+    return event
+
+
+def test_compiled_random_filters_are_equivalent():
+    rnd = random.Random(0)
+    events = [_random_event(rnd) for _ in range(40)]
+    for _ in range(1000):
+        filter_ = _random_filter(rnd, depth=4)
+        compiled = filter_.compile()
+        for event in events:
+            assert _outcome(compiled, event) == _outcome(filter_, event), (filter_, event, compiled.explain())
+
+
+def test_dispatcher_routes_reassigned_filters():
+    handled = []
+    dispatcher = Dispatcher(bot=None)
+    handlers = [
+        MessageHandler(filters=Filter.regexp(p), callback=lambda bot, event, p=p: handled.append(p))
+        for p in ("one", "two", "three", "four", "five")
+    ]
+    for handler in handlers:
+        dispatcher.add_handler(handler)
+
+    dispatcher.dispatch(message("alpha"))
+    assert handled == []
+
+    handlers[0].filters = Filter.regexp("alpha")
+    dispatcher.dispatch(message("alpha"))
+    assert handled == ["one"]
+
+
+def test_dispatcher_routes_random_filters_like_checking_every_handler():
+    rnd = random.Random(0)
+    regexps = [Filter.regexp(p) for p in ("hello", r"\d{3}", "now$", "mail", "^/st")]
+    handled = []
+    dispatcher = Dispatcher(bot=None)
+    for i in range(200):
+        filter_ = _random_filter(rnd, depth=3)
+        if rnd.random() < 0.7:
+            filter_ = rnd.choice(regexps) & filter_ if rnd.random() < 0.5 else rnd.choice(regexps)
+        dispatcher.add_handler(MessageHandler(filters=filter_, callback=lambda bot, event, i=i: handled.append(i)))
+
+    for _ in range(200):
+        event = _random_event(rnd)
+        expected = [_outcome(lambda e, h=h: h.check(e, dispatcher), event) for h in dispatcher.handlers]
+        if any(o not in (True, False) for o in expected):
+            continue
+
+        del handled[:]
+        dispatcher.dispatch(event)
+        assert handled == [i for (i, o) in enumerate(expected) if o], event
+
+
+def test_guard_after_split_filter():
+    filter_ = (Filter.regexp("hello") | Filter.sticker) & Filter.message
+    sticker = message(None, parts=[{"type": "sticker", "payload": {"fileId": "s"}}])
+
+    assert filter_(sticker) is False and filter_.compile()(sticker) is False
+
+
+def test_compiled_plan_is_flat():
+    plan = Filter.text.compile().explain()
+
+    assert plan.count("MessageFilter()") == 1
+    assert plan.splitlines()[:2] == ["AND", "  MessageFilter()"]
+    assert [type(f).__name__ for f in Filter.media.compile().leaves()].count("MessageFilter") == 3
+
+
+def test_shared_filters_evaluated_once():
+    calls = []
+
+    class CountingFilter(FilterBase):
+        def filter(self, event):
+            calls.append(event)
+            return True
+
+    shared = CountingFilter()
+    first = (shared & Filter.message).compile()
+    second = (Filter.command | ~shared).compile()
+
+    event = message()
+    assert first(event) and not second(event)
+    assert len(calls) == 1
+
+
+PATTERNS = [
+    re.compile(p) for p in (
+        r"^\d+$", r"\bspam\d*", r"(?:buy|get) now", r"ca(p)tion", r"(\w)\1", r"(?P<word>hi)", r"(?i)HELLO",
+        r"mail\.ru$", r"[a-z]+", r"files\.icq", r"fwd|re", r"x{0}caption",
+    )
+] + [re.compile(r"^/start", re.MULTILINE), re.compile(u"\u0442\u0435\u0441\u0442")]
+
+
+def test_pattern_set_matches_separate_search():
+    pattern_set = PatternSet(PATTERNS)
+    texts = [e.data.get("text") or "" for e in EVENTS] + [
+        "spam42 buy now", "aa", "hi there", "say Hello", "x\n/start", u"\u0442\u0435\u0441\u0442", "CAPTION",
+    ]
+
+    assert pattern_set.fallback
+    for text in texts:
+        assert pattern_set.search(text) == {p for p in PATTERNS if p.search(text)}, text
+
+
+def test_dispatcher_searches_pattern_set_once(monkeypatch):
+    (searched, checked, handled) = ([], [], [])
+    search = PatternSet.search
+
+    def counting_search(self, text):
+        searched.append(text)
+        return search(self, text)
+
+    class CountingHandler(MessageHandler):
+        @requires_filters
+        def check(self, event, dispatcher):
+            checked.append(self.pattern)
+            return super(CountingHandler, self).check(event=event, dispatcher=dispatcher)
+
+    monkeypatch.setattr(PatternSet, "search", counting_search)
+    dispatcher = Dispatcher(bot=None)
+    for pattern in PATTERNS:
+        handler = CountingHandler(
+            filters=Filter.regexp(pattern), callback=lambda bot, event, pattern=pattern: handled.append(pattern)
+        )
+        handler.pattern = pattern
+        dispatcher.add_handler(handler)
+
+    dispatcher.dispatch(message("spam1 buy now"))
+
+    assert searched == ["spam1 buy now"]
+    # Handlers of patterns not found in the text aren't checked at all.
+    assert checked == handled == [p for p in PATTERNS if p.search("spam1 buy now")]
+
+    # Without the mark the overridden check may accept events regardless of filters, routes are rebuilt on
+    # registration.
+    CountingHandler.check = lambda self, event, dispatcher: checked.append(self.pattern)
+    dispatcher.add_handler(MessageHandler(filters=Filter.regexp("nothing")))
+    del checked[:]
+    dispatcher.dispatch(message("spam1 buy now"))
+    assert checked == PATTERNS
@@ -0,0 +1,79 @@
+from http.server import HTTPServer
+from threading import Thread
+
+import requests
+
+from bot.bot import Bot
+from bot.event import Event, EventType
+from bot.handler import MessageHandler
+from bot.metrics import Registry
+
+import server
+
+TOKEN = "XXX.XXXXXXXXXX.XXXXXXXXXX:XXXXXXXXX"
+
+
+def test_prometheus_text_format():
+    registry = Registry()
+    counter = registry.counter("requests_total", "Requests.", ("endpoint", "status"))
+    histogram = registry.histogram("duration_seconds", "Duration.", ("endpoint",), buckets=(0.1, 1))
+    registry.gauge("depth", "Depth.", lambda: 3)
+
+    counter.inc(("self/get", "200"))
+    counter.inc(("self/get", "200"), 2)
+    counter.inc(('a"b', "500"))
+    for value in (0.05, 0.1, 0.5, 5):
+        histogram.observe(value, ("self/get",))
+
+    assert registry.expose().splitlines() == [
+        "# HELP requests_total Requests.",
+        "# TYPE requests_total counter",
+        'requests_total{endpoint="a\\"b",status="500"} 1',
+        'requests_total{endpoint="self/get",status="200"} 3',
+        "# HELP duration_seconds Duration.",
+        "# TYPE duration_seconds histogram",
+        'duration_seconds_bucket{endpoint="self/get",le="0.1"} 2',
+        'duration_seconds_bucket{endpoint="self/get",le="1"} 3',
+        'duration_seconds_bucket{endpoint="self/get",le="+Inf"} 4',
+        'duration_seconds_sum{endpoint="self/get"} 5.65',
+        'duration_seconds_count{endpoint="self/get"} 4',
+        "# HELP depth Depth.",
+        "# TYPE depth gauge",
+        "depth 3",
+    ]
+
+
+def test_bot_metrics():
+    web_server = HTTPServer(("localhost", 0), server.MyServer)
+    thread = Thread(target=web_server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    bot = Bot(token=TOKEN, api_url_base="http://localhost:{}".format(web_server.server_port), name="test")
+    metrics_server = bot.metrics.serve(port=0)
+    try:
+        bot.get_chat_info("c")
+        bot.get_chat_info("c")
+
+        def failing(bot, event):
+            raise ValueError(event.text)
+
+        bot.dispatcher.add_handler(MessageHandler(callback=failing))
+        bot.dispatcher.dispatch(Event(type_=EventType.NEW_MESSAGE, data={
+            "msgId": "1", "text": "hi", "chat": {"chatId": "c", "type": "private"}, "from": {"userId": "u"}
+        }))
+
+        metrics = bot.metrics
+        assert metrics.api_requests.get(("chats/getInfo", "200")) == 2
+        assert metrics.api_duration.count(("chats/getInfo",)) == 2
+        assert metrics.api_received_bytes.get(("chats/getInfo",)) > 0
+        assert metrics.handler_exceptions.get(("MessageHandler:test_bot_metrics.<locals>.failing",)) == 1
+
+        exposed = requests.get("http://127.0.0.1:{}/metrics".format(metrics_server.server_port)).text
+        assert 'bot_api_requests_total{endpoint="chats/getInfo",status="200"} 2' in exposed
+        assert "bot_event_queue_depth 0" in exposed
+    finally:
+        metrics_server.shutdown()
+        metrics_server.server_close()
+        web_server.shutdown()
+        web_server.server_close()
@@ -0,0 +1,61 @@
+from threading import Event as ThreadingEvent
+
+import requests
+
+from bot.bot import Bot
+from bot.handler import MessageHandler
+from bot.testing import EventSource, FaultProfile, MockBotServer
+
+
+def test_bot_against_mock_server():
+    with MockBotServer(token="secret") as server:
+        bot = Bot(token="secret", api_url_base=server.url, poll_time_s=1)
+        received = ThreadingEvent()
+        bot.dispatcher.add_handler(MessageHandler(callback=lambda bot, event: received.set()))
+
+        assert bot.send_text(chat_id="c", text="hello").json()["msgId"] == "1"
+        assert bot.get_chat_info("c").json()["type"] == "private"
+
+        bot.start_polling()
+        try:
+            server.events.push("newMessage", {
+                "msgId": "1", "text": "hi", "chat": {"chatId": "c", "type": "private"}, "from": {"userId": "u"}
+            })
+            assert received.wait(5)
+        finally:
+            bot.stop()
+
+        (call,) = server.calls("messages/sendText")
+        assert call.method == "GET" and call.params["chatId"] == "c" and call.params["text"] == "hello"
+        assert server.stats()["requests"]["events/get"] >= 1
+
+        assert Bot(token="wrong", api_url_base=server.url).self_get().json()["description"] == "Invalid token"
+
+
+def test_fault_profiles():
+    profiles = {"messages/sendText": FaultProfile(throttle_rate=1, retry_after=3), "*": FaultProfile(error_rate=1)}
+    with MockBotServer(profiles=profiles) as server:
+        response = requests.get(server.url + "/messages/sendText", params={"token": server.token})
+        assert response.status_code == 429 and response.headers["Retry-After"] == "3"
+        assert requests.get(server.url + "/self/get").status_code == 500
+
+        server.set_profile("*", FaultProfile(latency=0.1))
+        response = requests.get(server.url + "/self/get")
+        assert response.status_code == 200 and response.elapsed.total_seconds() >= 0.1
+        assert [c.status for c in server.calls()] == [429, 500, 200]
+
+
+def test_event_generation():
+    source = EventSource(rate=float("inf"), total=250, batch_size=100)
+    batches = [source.fetch(0), source.fetch(100), source.fetch(200), source.fetch(250)]
+    assert [len(b) for b in batches] == [100, 100, 50, 0]
+    assert [e["eventId"] for e in batches[1]] == list(range(101, 201))
+
+    # Older events are served again, as the real API does until they are acknowledged.
+    assert source.fetch(240) == batches[2][-10:]
+
+    now = [0.0]
+    source = EventSource(rate=10, clock=lambda: now[0])
+    source.fetch(0)
+    now[0] = 1.05
+    assert len(source.fetch(0)) == 10
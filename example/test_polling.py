@@ -0,0 +1,90 @@
+from threading import Thread, Event as ThreadingEvent
+from time import sleep
+
+from bot.bot import Bot
+from bot.event import Event, EventType
+from bot.handler import MessageHandler
+from bot.polling import EventQueue, OverloadPolicy
+from bot.testing import MockBotServer
+
+
+def event(type_=EventType.NEW_MESSAGE, msg_id="1"):
+    return Event(type_=type_, data={"msgId": msg_id, "chat": {"chatId": "c", "type": "private"}})
+
+
+def test_drop_oldest():
+    q = EventQueue(maxsize=2, policy=OverloadPolicy.DROP_OLDEST)
+    events = [event(msg_id=str(i)) for i in range(3)]
+
+    assert all(q.put(e) for e in events)
+    assert [q.get(timeout=0), q.get(timeout=0), q.get(timeout=0)] == events[1:] + [None]
+    assert q.stats()["dropped"] == 1 and q.stats()["dispatched"] == 2
+
+
+def test_shed_by_type():
+    q = EventQueue(maxsize=2, policy=OverloadPolicy.SHED, shed_types=(EventType.EDITED_MESSAGE,))
+    (new, edited, new_2, edited_2) = (
+        event(), event(EventType.EDITED_MESSAGE), event(msg_id="2"), event(EventType.EDITED_MESSAGE, msg_id="2")
+    )
+
+    assert q.put(new) and q.put(edited)
+    assert q.put(new_2)
+    assert not q.put(edited_2)
+    assert [q.get(timeout=0), q.get(timeout=0)] == [new, new_2]
+    assert q.stats()["dropped_by_type"] == {"editedMessage": 2}
+
+
+def test_block_until_taken_and_close():
+    q = EventQueue(maxsize=1)
+    (first, second) = (event(), event(msg_id="2"))
+    q.put(first)
+
+    result = []
+    producer = Thread(target=lambda: result.append(q.put(second)))
+    producer.start()
+    sleep(0.05)
+    assert result == [] and len(q) == 1
+
+    assert q.get() is first
+    producer.join(1)
+    assert result == [True]
+
+    q.close()
+    assert not q.put(event()) and q.get() is second and q.get() is None
+    assert q.stats()["latency_max_s"] >= 0.05
+
+
+def test_queue_bound_with_dispatch_workers():
+    (release, received) = (ThreadingEvent(), [])
+
+    def handler(bot, event):
+        release.wait(5)
+        received.append(event.data["msgId"])
+
+    with MockBotServer(token="secret") as server:
+        for i in range(30):
+            server.events.push("newMessage", {
+                "msgId": str(i), "text": "hi", "chat": {"chatId": "c", "type": "private"}, "from": {"userId": "u"}
+            })
+
+        bot = Bot(
+            token="secret", api_url_base=server.url, name="bot", poll_time_s=1, dispatch_workers=2,
+            event_queue_size=2, overload_policy=OverloadPolicy.DROP_OLDEST
+        )
+        bot.dispatcher.add_handler(MessageHandler(callback=handler))
+        bot.start_polling()
+        try:
+            for _ in range(500):
+                if bot.event_queue.stats()["put"] == 30:
+                    break
+                sleep(0.01)
+            sleep(0.1)
+
+            stats = bot.stats()
+            assert stats["event_queue"]["queue_depth"] <= 2 and stats["dispatcher"]["queue_depth"] <= 2
+        finally:
+            release.set()
+            bot.stop()
+
+    # One being handled, at most two in the worker queue, one in the dispatching thread and two in the event queue.
+    assert 1 <= len(received) <= 6 and bot.stats()["event_queue"]["dropped"] == 30 - len(received)
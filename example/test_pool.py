@@ -0,0 +1,58 @@
+import threading
+
+from bot.handler import MessageHandler
+from bot.pool import BotPool
+from bot.testing import MockBotServer
+
+MESSAGE = {"msgId": "1", "text": "hi", "chat": {"chatId": "c", "type": "private"}, "from": {"userId": "u"}}
+
+
+def _pool_threads():
+    return [t for t in threading.enumerate() if t.name.startswith("bot-pool")]
+
+
+def test_bot_pool():
+    with MockBotServer() as server:
+        pool = BotPool(dispatch_workers=4)
+        received = {}
+        done = threading.Event()
+
+        def reply(bot, event):
+            bot.send_text(chat_id=event.from_chat, text=bot.token)
+            received[bot.token] = event.text
+            if len(received) == 50:
+                done.set()
+
+        bots = [pool.add_bot(token="token{}".format(i), api_url_base=server.url, name="bot", poll_time_s=1)
+                for i in range(40)]
+        for bot in bots:
+            bot.dispatcher.add_handler(MessageHandler(callback=reply))
+
+        pool.start()
+        try:
+            for i in range(40, 50):
+                pool.add_bot(token="token{}".format(i), api_url_base=server.url, name="bot", poll_time_s=1) \
+                    .dispatcher.add_handler(MessageHandler(callback=reply))
+
+            server.events.push("newMessage", MESSAGE)
+            assert done.wait(10)
+
+            # Supervisor and dispatch workers, no matter how many bots.
+            assert len(_pool_threads()) == 5
+            assert all(bot.last_event_id == 1 for bot in pool.bots)
+
+            # Bots add up to the pool metrics, gauges are the pool ones.
+            assert all(bot.metrics is pool.metrics and bot.retry_policy is pool.retry_policy for bot in pool.bots)
+            assert pool.metrics.polling_batch_size.count(()) >= 50
+            assert pool.metrics.expose().count("# TYPE bot_event_queue_depth gauge") == 1
+
+            pool.remove_bot(bots[0])
+            stats = pool.stats()
+            assert stats["bots"] == stats["polling"] == 49
+            assert stats["connections"]["opened"] <= 4
+        finally:
+            pool.stop()
+
+        assert not _pool_threads()
+        assert sorted(c.params["text"] for c in server.calls("messages/sendText")) == \
+            sorted("token{}".format(i) for i in range(50))
@@ -0,0 +1,37 @@
+from time import sleep
+
+from bot.dispatcher import Dispatcher
+from bot.handler import MessageHandler
+
+from conftest import message
+
+
+def slow_callback(bot, event):
+    if event.text == "slow":
+        sleep(0.3)
+
+
+def test_profiling():
+    dispatcher = Dispatcher(bot=None)
+    dispatcher.add_handler(MessageHandler(callback=slow_callback))
+
+    dispatcher.dispatch(message("before"))
+    profiler = dispatcher.enable_profiling(slow_threshold=0.1, profile_sample_rate=1.0)
+    try:
+        dispatcher.dispatch(message("fast"))
+        dispatcher.dispatch(message("slow"))
+    finally:
+        assert dispatcher.disable_profiling() is profiler
+    dispatcher.dispatch(message("after"))
+
+    stats = profiler.stats()
+    name = "MessageHandler:slow_callback"
+    assert stats["handle"][name]["calls"] == 2 and stats["check"]["MessageHandler:slow_callback"]["calls"] == 2
+    assert stats["handle"][name]["max_s"] >= 0.3
+    assert stats["slow_calls"] == 1 and stats["profiled_events"] == 2
+
+    (slow,) = profiler.slow_calls()
+    assert slow.kind == "handle" and slow.handler == name and not slow.running
+    assert "in slow_callback" in slow.stack and "sleep(0.3)" in slow.stack
+
+    assert "slow_callback" in profiler.print_stats(limit=10)
@@ -0,0 +1,58 @@
+from bot.ratelimit import RateLimit, RateLimiter
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_global_and_chat_buckets():
+    clock = Clock()
+    limiter = RateLimiter(global_limit=RateLimit(rate=10, burst=3), chat_limit=RateLimit(rate=1, burst=2), clock=clock)
+
+    assert [limiter.reserve("messages/sendText", "a") for _ in range(2)] == [0.0, 0.0]
+    assert limiter.reserve("messages/sendText", "a") == 1.0
+    assert limiter.reserve("messages/sendText", "b") == 0.1
+    assert limiter.reserve("events/get", "b") == 0.0
+
+    clock.now += 10
+    assert limiter.reserve("messages/sendText", "a") == 0.0
+    assert limiter.stats()["delayed"] == 2 and limiter.stats()["requests"] == 5
+
+
+def test_endpoint_limits():
+    limiter = RateLimiter(
+        global_limit=None, chat_limit=None, endpoint_limits={"messages/sendFile": RateLimit(rate=2, burst=1)},
+        clock=Clock()
+    )
+
+    assert limiter.reserve("messages/sendFile") == 0.0 and limiter.reserve("messages/sendFile") == 0.5
+    assert limiter.reserve("messages/sendText") == 0.0
+
+
+def test_server_throttling_adapts_rate():
+    clock = Clock()
+    limiter = RateLimiter(global_limit=RateLimit(rate=10, burst=10), chat_limit=RateLimit(rate=4, burst=1), clock=clock)
+
+    assert limiter.reserve("messages/sendText", "a") == 0.0
+    limiter.update("messages/sendText", "a", 429, {"Retry-After": "3"})
+    assert limiter.reserve("messages/sendText", "a") == 3.0
+    assert limiter.reserve("messages/sendText", "b") == 0.0
+
+    clock.now += 10
+    assert limiter.reserve("messages/sendText", "a") == 0.0
+    assert limiter.reserve("messages/sendText", "a") == 0.5
+    for _ in range(32):
+        limiter.update("messages/sendText", "a", 200)
+    assert limiter._chats["a"].rate == 4
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_request_key():
+    assert RateLimiter.request_key("https://api.icq.net/bot/v1/messages/sendText?token=t&chatId=c%40chat") == (
+        "messages/sendText", "c@chat"
+    )
+    assert RateLimiter.request_key("https://api.icq.net/bot/v1/self/get", {"token": "t"}) == ("self/get", None)
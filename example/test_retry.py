@@ -0,0 +1,153 @@
+import json
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from threading import Thread
+from time import perf_counter
+
+import pytest
+
+from bot.bot import Bot
+from bot.ratelimit import RateLimit, RateLimiter
+from bot.retry import Backoff, CircuitBreaker, CircuitOpenError, RetryPolicy
+
+TOKEN = "XXX.XXXXXXXXXX.XXXXXXXXXX:XXXXXXXXX"
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_backoff_is_jittered_and_capped():
+    backoff = Backoff(base=1, cap=5)
+
+    delays = [backoff.delay(attempt) for attempt in range(10) for _ in range(20)]
+    assert all(0 <= d <= 5 for d in delays)
+    assert len(set(delays)) > 1
+
+
+def test_retry_policy():
+    policy = RetryPolicy(retries=2)
+
+    assert policy.should_retry("chats/getInfo", 0, status_code=503)
+    assert policy.should_retry("events/get", 1)
+    assert not policy.should_retry("chats/getInfo", 2, status_code=503)
+    assert not policy.should_retry("chats/getInfo", 0, status_code=404)
+    assert not policy.should_retry("messages/sendText", 0, status_code=503)
+    assert not policy.should_retry("messages/sendText", 0)
+    assert policy.should_retry("messages/sendText", 0, connect_error=True)
+    assert policy.should_retry("messages/sendText", 0, status_code=429, retry_after=1)
+    assert not policy.should_retry("messages/sendText", 0, status_code=429, retry_after=3600)
+    assert not policy.should_retry("messages/sendText", 2, status_code=429)
+    assert policy.delay(0, retry_after=2) == 2
+
+
+def test_circuit_breaker():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+
+    breaker.record("chats/getInfo", success=False)
+    breaker.before("chats/getInfo")
+    breaker.record("chats/getInfo", success=False)
+    with pytest.raises(CircuitOpenError):
+        breaker.before("chats/getInfo")
+    breaker.before("self/get")
+
+    clock.now += 10
+    breaker.before("chats/getInfo")
+    with pytest.raises(CircuitOpenError):
+        breaker.before("chats/getInfo")
+    breaker.record("chats/getInfo", success=False)
+    with pytest.raises(CircuitOpenError):
+        breaker.before("chats/getInfo")
+
+    clock.now += 10
+    breaker.before("chats/getInfo")
+    breaker.record("chats/getInfo", success=True)
+    breaker.before("chats/getInfo")
+    assert breaker.stats() == {"open": [], "failing": {}, "rejected": 3}
+
+
+def test_circuit_breaker_trial_without_outcome():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record("chats/getInfo", success=False)
+
+    clock.now += 10
+    breaker.before("chats/getInfo")
+    breaker.release("chats/getInfo")
+    breaker.before("chats/getInfo")
+
+    # The trial is never recorded, another one is let through after the timeout.
+    with pytest.raises(CircuitOpenError):
+        breaker.before("chats/getInfo")
+    clock.now += 10
+    breaker.before("chats/getInfo")
+
+
+class FlakyServer(BaseHTTPRequestHandler):
+    (failures, status, requests) = (0, 503, 0)
+
+    def do_GET(self):
+        (FlakyServer.failures, FlakyServer.requests) = (FlakyServer.failures - 1, FlakyServer.requests + 1)
+        status = FlakyServer.status if FlakyServer.failures >= 0 else 200
+        body = json.dumps({"ok": status == 200}).encode("utf-8")
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0.1")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api_url():
+    web_server = HTTPServer(("localhost", 0), FlakyServer)
+    thread = Thread(target=web_server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    yield "http://localhost:{}".format(web_server.server_port)
+
+    (FlakyServer.failures, FlakyServer.status, FlakyServer.requests) = (0, 503, 0)
+
+    web_server.shutdown()
+    web_server.server_close()
+
+
+def test_adapter_retries_idempotent_requests(api_url):
+    bot = Bot(
+        token=TOKEN, api_url_base=api_url, name="test", retry_policy=RetryPolicy(retries=2, backoff=Backoff(base=0.01)),
+        circuit_breaker=CircuitBreaker(failure_threshold=3)
+    )
+
+    FlakyServer.failures = 2
+    assert bot.get_chat_info("c").status_code == 200
+
+    FlakyServer.failures = 1
+    assert bot.send_text("c", "hi").status_code == 503
+
+    FlakyServer.failures = 3
+    assert bot.get_chat_info("c").status_code == 503
+    with pytest.raises(CircuitOpenError):
+        bot.get_chat_info("c")
+
+
+def test_adapter_retries_throttled_requests(api_url):
+    bot = Bot(
+        token=TOKEN, api_url_base=api_url, name="test", retry_policy=RetryPolicy(retries=2, backoff=Backoff(base=10)),
+        circuit_breaker=CircuitBreaker(failure_threshold=1), rate_limiter=RateLimiter(chat_limit=RateLimit(100, 5))
+    )
+
+    (FlakyServer.failures, FlakyServer.status) = (1, 429)
+    started_at = perf_counter()
+    assert bot.send_text("c", "hi").status_code == 200
+    # Waited for the Retry-After, not for the backoff, and throttling doesn't open the circuit.
+    assert FlakyServer.requests == 2 and 0.1 <= perf_counter() - started_at < 5
+    assert bot.rate_limiter.stats()["throttled"] == 1 and bot.circuit_breaker.stats()["open"] == []
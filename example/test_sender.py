@@ -0,0 +1,77 @@
+from concurrent.futures import Future
+from threading import Lock
+from time import sleep
+
+from bot.bot import Bot
+
+TOKEN = "XXX.XXXXXXXXXX.XXXXXXXXXX:XXXXXXXXX"
+
+
+class RecordingSession(object):
+    def __init__(self):
+        self.lock = Lock()
+        self.sent = []
+
+    def get(self, url, params=None, timeout=None):
+        sleep(0.01)
+        with self.lock:
+            self.sent.append((url.rsplit("/", 1)[-1], params.get("chatId"), params.get("text")))
+        return len(self.sent)
+
+
+def test_send_queue_preserves_chat_order():
+    bot = Bot(token=TOKEN, name="test", send_workers=4)
+    bot.__dict__["http_session"] = session = RecordingSession()
+
+    futures = [bot.send_text(chat_id=str(i % 3), text=str(i)) for i in range(12)]
+    futures.append(bot.edit_text("0", "1", text="edited"))
+    futures.append(bot.answer_callback_query(query_id="q", text="ok"))
+    assert all(isinstance(f, Future) for f in futures)
+
+    bot.flush()
+    assert all(f.done() for f in futures)
+    for chat in "012":
+        texts = [text for (_, chat_id, text) in session.sent if chat_id == chat]
+        assert texts == [str(i) for i in range(12) if str(i % 3) == chat] + (["edited"] if chat == "0" else [])
+    assert bot.sender.stats()["completed"] == 14
+
+    bot.stop()
+
+
+def test_send_blocks_without_sender():
+    bot = Bot(token=TOKEN, name="test")
+    bot.__dict__["http_session"] = RecordingSession()
+
+    assert bot.send_text("c", "hi") == 1 and bot.delete_messages("c", msg_id="1") == 2
+
+
+def test_sessions_use_separate_pools():
+    from http.server import HTTPServer
+    from threading import Thread
+
+    from bot.bot import PoolConfig
+
+    import server
+
+    web_server = HTTPServer(("localhost", 0), server.MyServer)
+    thread = Thread(target=web_server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    try:
+        bot = Bot(
+            token=TOKEN, api_url_base="http://localhost:{}".format(web_server.server_port), name="test",
+            send_pool=PoolConfig(size=3)
+        )
+        bot.events_get(1, 0)
+        bot.get_chat_info("c")
+        bot.get_chat_info("c")
+
+        stats = bot.pool_stats()
+        assert bot.polling_session is not bot.http_session
+        assert set(stats) == {"polling_session", "http_session"}
+        assert stats["polling_session"]["size"] == 1 and stats["http_session"]["size"] == 3
+        assert stats["http_session"]["requests"] == 2 and stats["http_session"]["in_use"] == 0
+    finally:
+        web_server.shutdown()
+        web_server.server_close()
@@ -0,0 +1,59 @@
+import logging
+
+from requests import Request, Response
+from requests.adapters import HTTPAdapter
+
+from bot.bot import LoggingHTTPAdapter
+from bot.wirelog import WireLog
+
+URL = "https://api.icq.net/bot/v1/messages/sendText?token=001.123:456&chatId=c&text=hi"
+
+
+def test_sampling_and_endpoints():
+    every_third = WireLog(sample_every=3)
+    only_events = WireLog(endpoints={"events/get"})
+
+    assert [every_third.sampled(URL) for _ in range(6)] == [True, False, False, True, False, False]
+    assert not only_events.sampled(URL)
+    assert only_events.sampled("https://api.icq.net/bot/v1/events/get?token=t")
+    assert not WireLog(sample_rate=0).sampled(URL)
+
+
+def test_redaction_and_truncation():
+    wire_log = WireLog(max_body_bytes=8)
+
+    assert wire_log.text(URL) == "https://api.icq.net/bot/v1/messages/sendText?token=***&chatId=c&text=hi"
+    assert wire_log.body(b'{"ok": true, "events": []}') == u'{"ok": t... [26 bytes total]'
+    assert wire_log.body(u"тест".encode("utf-8")) == u"тест"
+    assert WireLog(redact=False).text(URL) == URL
+
+
+class _Transport(HTTPAdapter):
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        response = Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers["Content-Type"] = "application/json; charset=utf-8"
+        response._content = b'{"ok": true, "text": "' + b"x" * 100 + b'"}'
+        return response
+
+
+class _Adapter(LoggingHTTPAdapter, _Transport):
+    pass
+
+
+def test_adapter_logs_sampled_exchanges(caplog):
+    adapter = _Adapter(wire_log=WireLog(max_body_bytes=16))
+    request = Request(method="GET", url=URL).prepare()
+
+    with caplog.at_level(logging.DEBUG, logger="bot.bot"):
+        adapter.send(request)
+
+    (sent, received) = [r.getMessage() for r in caplog.records]
+    assert sent.startswith("GET https://api.icq.net/bot/v1/messages/sendText?token=***&")
+    assert received.endswith(u'{"ok": true, "te... [124 bytes total]')
+
+    caplog.clear()
+    with caplog.at_level(logging.INFO, logger="bot.bot"):
+        adapter.send(request)
+    assert not caplog.records
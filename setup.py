@@ -46,8 +46,9 @@ setup(
         "Operating System :: OS Independent"
     ],
     keywords="mailru im bot api",
-    packages=find_packages(exclude=["example"]),
+    packages=find_packages(exclude=["example", "benchmark", "benchmark.*"]),
     install_requires=requirements(),
+    extras_require={"async": ["aiohttp >= 3.7"]},
     python_requires=">= 2.7, != 3.0.*, != 3.1.*, != 3.2.*, != 3.3.*",
     include_package_data=True,
     zip_safe=False